@@ -3,5 +3,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'costest.settings')
+# Each ASGI request runs its ORM work on a fresh thread, so persistent connections
+# would never be reused and pile up; close them at the end of every request instead.
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -21,11 +21,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'estimator.middleware.ASGIFileStreamMiddleware',
+    'estimator.middleware.RequestBudgetMiddleware',
+    'estimator.invalidation.InvalidationBatchMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'estimator.middleware.RequestProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -50,17 +54,49 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'costest.wsgi.application'
 
-# --- Database - MYSQL ---
-DATABASES = {
-    'default': {
+# --- Database ---
+# DB_PROFILE picks a tuned backend profile: 'mysql' (default, production) or
+# 'sqlite' (single-node deployments and development).
+DB_PROFILE = os.environ.get('DB_PROFILE', 'mysql')
+DB_PROFILES = {
+    'mysql': {
         'ENGINE': 'django.db.backends.mysql',
         'NAME': os.environ.get('DB_NAME', 'costest_db'),
         'USER': os.environ.get('DB_USER', 'costestuser'),
         'PASSWORD': os.environ.get('DB_PASSWORD', 'SiuJing95'),
         'HOST': os.environ.get('DB_HOST', 'localhost'),
         'PORT': os.environ.get('DB_PORT', '3306'),
-    }
+        # Keep connections open across requests; health checks replace ones the server dropped.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 300)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'charset': 'utf8mb4',
+            # Fewer gap locks for the bulk upserts of actuals and price imports.
+            'isolation_level': 'read committed',
+            'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+        },
+    },
+    'sqlite': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', str(BASE_DIR / 'db.sqlite3')),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 300)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # WAL lets readers run alongside the single writer; NORMAL only syncs at checkpoints.
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=268435456;'   # 256 MB
+                'PRAGMA cache_size=-65536;'     # 64 MB
+                'PRAGMA temp_store=MEMORY;'
+            ),
+            # Take the write lock at BEGIN so concurrent writers wait (timeout) instead of failing.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+    },
 }
+DATABASES = {'default': DB_PROFILES[DB_PROFILE]}
 
 # --- Password validation ---
 AUTH_PASSWORD_VALIDATORS = [
@@ -85,9 +121,78 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# --- Generated report cache (under MEDIA_ROOT; see estimator/reports.py) ---
+REPORT_CACHE_DIR = 'reports'
+REPORT_CACHE_MAX_AGE_DAYS = int(os.environ.get('REPORT_CACHE_MAX_AGE_DAYS', 30))
+REPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_BYTES', 500 * 1024 * 1024))
+
+# --- Incremental dataset exports (see estimator.views.export_dataset) ---
+# The updated_at watermark trails the clock by this many seconds, so rows saved
+# by a transaction that has not committed yet are exported by the next sync.
+EXPORT_WATERMARK_LAG = int(os.environ.get('EXPORT_WATERMARK_LAG', 60))
+
+# --- Admin changelists (see estimator/admin.py) ---
+# Above this many rows the changelists stop counting exactly: unfiltered
+# tables use the database's row estimate, filtered ones stop paging here.
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
+# --- Avatar thumbnails (under MEDIA_ROOT; see estimator/avatars.py) ---
+AVATAR_THUMBNAIL_DIR = 'avatars/thumbs'
+AVATAR_THUMBNAIL_SIZES = (40, 80, 150, 300)
+
+# --- Profiling (see estimator/profiling.py) ---
+# `manage.py <command> --profile` writes to PROFILE_DIR; staff request profiles
+# (?_profile=1 or X-Profile: 1) are stored in PROFILE_STORAGE_DIR, which must stay
+# outside MEDIA_ROOT: they are only served through the staff-only profile views.
+PROFILE_DIR = BASE_DIR / 'profiles'
+PROFILE_STORAGE_DIR = BASE_DIR / 'var' / 'profiles'
+PROFILE_KEEP = 50
+PROFILE_SAMPLE_INTERVAL = 0.005
+
 # --- Custom data directory for CIDB Excel files ---
 DATA_DIR = BASE_DIR / 'data'
 
+# The actuals form posts two fields per BoQ line; Django's default of 1000
+# rejects projects with more than 500 lines.
+DATA_UPLOAD_MAX_NUMBER_FIELDS = 20000
+
+# --- Cache (dashboard data; invalidated by model signals) ---
+# File-based so invalidation is shared by every worker process.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / 'cache')),
+        'TIMEOUT': 300,
+    }
+}
+DASHBOARD_CACHE_TIMEOUT = 300
+
+# --- Request performance budgets (estimator.middleware.RequestBudgetMiddleware) ---
+# Per URL name; keys: queries, sql_ms, total_ms, peak_kb (None disables a check).
+PERF_BUDGETS = {
+    'default': {'queries': 50, 'sql_ms': 500, 'total_ms': 2000},
+    'dashboard': {'queries': 15, 'total_ms': 800},
+    'project_detail': {'queries': 15, 'total_ms': 1000},
+    'view_forecast': {'queries': 15, 'total_ms': 1000},
+    'project_breakdown_api': {'queries': 10, 'total_ms': 500},
+}
+PERF_TRACE_MEMORY = os.environ.get('PERF_TRACE_MEMORY', '') == '1'
+
+# --- Logging ---
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'estimator': {'handlers': ['console'], 'level': os.environ.get('ESTIMATOR_LOG_LEVEL', 'INFO')},
+    },
+}
+
 # --- Default primary key field type ---
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -1,17 +1,126 @@
 from django.contrib import admin
-from django.urls import path
+from django.contrib.admin.views.main import PAGE_VAR
+from django.urls import path, reverse
 from django.shortcuts import render, redirect
 from django.contrib import messages
+from django.conf import settings
 from django.core.management import call_command
-from django.db import models
+from django.core.paginator import Paginator
+from django.db import connection, models
+from django.utils.functional import cached_property
 import tempfile
 import os
 from .models import (
     MaterialPrice, LabourRate, UserProfile, Project, ProjectItem,
-    Forecast, Report, ActualItem, InflationRate
+    Forecast, Report, ActualItem, InflationRate, InflationScenario,
+    ProjectSummary, MonthlyCostRollup, ReportBatch
 )
+from . import reports
 from django.contrib.auth.models import User
 
+def table_row_estimate(model):
+    """The planner's row estimate for ``model``'s table, or None where the backend keeps none."""
+    if connection.vendor != 'mysql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return row[0] if row and row[0] is not None else None
+
+
+class AtLeast(int):
+    """A row count only known to be more than its value; renders as "N+"."""
+
+    def __str__(self):
+        return f'{int(self)}+'
+
+
+def estimated_count(queryset, at_least=0):
+    """Row count of ``queryset`` that never scans a large table.
+
+    Up to ADMIN_EXACT_COUNT_LIMIT rows (or ``at_least``, if larger) the count
+    is exact (a LIMITed subquery). Past it, an unfiltered table uses the
+    database's own estimate (InnoDB statistics on MySQL, the exact count
+    elsewhere). A filtered queryset has no estimate, so it gets an
+    ``AtLeast`` of the limit, shown as "10000+".
+    """
+    limit = max(getattr(settings, 'ADMIN_EXACT_COUNT_LIMIT', 10000), at_least)
+    queryset = queryset.order_by()
+    count = queryset[:limit + 1].count()
+    if count <= limit:
+        return count
+    if queryset.query.where:
+        return AtLeast(limit)
+    estimate = table_row_estimate(queryset.model)
+    return max(estimate, limit) if estimate is not None else queryset.count()
+
+
+class EstimatedCountPaginator(Paginator):
+    def __init__(self, *args, number=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.number = number
+
+    @cached_property
+    def count(self):
+        # Count one page past the requested one, so a capped count still links to the next page.
+        return estimated_count(self.object_list, at_least=(self.number + 1) * self.per_page)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist for tables that grow to millions of rows: no exact COUNT(*), no second unfiltered count."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        try:
+            number = max(int(request.GET.get(PAGE_VAR, 1)), 1)
+        except ValueError:
+            number = 1
+        return self.paginator(queryset, per_page, orphans, allow_empty_first_page, number=number)
+
+
+class QuarterFilter(admin.SimpleListFilter):
+    """Quarters are always Q1-Q4; the default filter would SELECT DISTINCT them from the whole table."""
+    title = 'quarter'
+    parameter_name = 'quarter'
+
+    def lookups(self, request, model_admin):
+        return [(q, q) for q in ('Q1', 'Q2', 'Q3', 'Q4')]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(quarter=self.value())
+
+
+class ProjectFilter(admin.SimpleListFilter):
+    """Projects by name, without rendering (and querying the uploader of) every Project."""
+    title = 'project'
+    parameter_name = 'project__id__exact'
+
+    def lookups(self, request, model_admin):
+        return Project.objects.order_by('name').values_list('pk', 'name')
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(project_id=self.value())
+
+
+class UploaderFilter(admin.SimpleListFilter):
+    title = 'uploaded by'
+    parameter_name = 'uploaded_by__id__exact'
+
+    def lookups(self, request, model_admin):
+        return UserProfile.objects.filter(project__isnull=False).distinct().order_by(
+            'user__username').values_list('pk', 'user__username')
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(uploaded_by_id=self.value())
+
+
 @admin.action(description='Import CIDB data from selected files')
 def import_cidb_data(modeladmin, request, queryset):
     """Admin action to import CIDB data"""
@@ -22,6 +131,20 @@ def import_cidb_data(modeladmin, request, queryset):
     except Exception as e:
         messages.error(request, f"Import failed: {str(e)}")
 
+@admin.action(description='Generate PDF + Excel report pack for selected projects')
+def generate_report_pack(modeladmin, request, queryset):
+    """Queue a ReportBatch for ``generate_reports --pending`` to build outside the web worker"""
+    batch = ReportBatch.objects.create(
+        created_by=getattr(request.user, 'userprofile', None),
+        project_ids=list(queryset.order_by('pk').values_list('pk', flat=True)),
+        formats=list(reports.REPORT_FORMATS),
+    )
+    messages.success(
+        request,
+        f"Report pack {batch.pk} queued for {len(batch.project_ids)} project(s). "
+        f"Progress: {reverse('report_batch_status', args=[batch.pk])}",
+    )
+
 class CIDBUpload(models.Model):
     """Dummy model for CIDB upload interface"""
     class Meta:
@@ -93,8 +216,8 @@ class CIDBUploadAdmin(admin.ModelAdmin):
             
             return redirect('admin:upload_cidb')
         
-        material_count = MaterialPrice.objects.count()
-        labour_count = LabourRate.objects.count()
+        material_count = estimated_count(MaterialPrice.objects.all())
+        labour_count = estimated_count(LabourRate.objects.all())
         material_quarters = MaterialPrice.objects.values('quarter', 'year').distinct().count()
         labour_quarters = LabourRate.objects.values('quarter', 'year').distinct().count()
         
@@ -132,64 +255,100 @@ class CustomUserAdmin(admin.ModelAdmin):
             UserProfile.objects.create(user=obj, role='admin' if obj.is_staff else 'contractor')
 
 @admin.register(MaterialPrice)
-class MaterialPriceAdmin(admin.ModelAdmin):
+class MaterialPriceAdmin(LargeTableAdmin):
     list_display = ('quarter', 'year', 'section', 'sn', 'description', 'rate', 'unit')
-    search_fields = ('section', 'description')
-    list_filter = ('quarter', 'year', 'section')
+    search_fields = ('^description', '^section')
+    list_filter = (QuarterFilter, 'year', 'section')
     list_per_page = 20
     actions = [import_cidb_data]
 
 @admin.register(LabourRate)
-class LabourRateAdmin(admin.ModelAdmin):
+class LabourRateAdmin(LargeTableAdmin):
     list_display = ('quarter', 'year', 'section', 'sn', 'description', 'rate', 'unit')
-    search_fields = ('section', 'description')
-    list_filter = ('quarter', 'year', 'section')
+    search_fields = ('^description', '^section')
+    list_filter = (QuarterFilter, 'year', 'section')
     list_per_page = 20
     actions = [import_cidb_data]
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'role', 'company', 'phone')
+    list_select_related = ('user',)
     list_filter = ('role',)
     search_fields = ('user__username', 'company')
 
 @admin.register(Project)
 class ProjectAdmin(admin.ModelAdmin):
     list_display = ('name', 'uploaded_by', 'upload_date', 'estimated_cost', 'cidb_cost', 'actual_cost')
-    list_filter = ('upload_date', 'uploaded_by')
-    search_fields = ('name', 'uploaded_by__user__username')
+    list_filter = ('upload_date', UploaderFilter)
+    list_select_related = ('uploaded_by__user',)
+    search_fields = ('^name', '^uploaded_by__user__username')
     readonly_fields = ('upload_date',)
     list_per_page = 20
+    actions = [generate_report_pack]
+
+@admin.register(ProjectSummary)
+class ProjectSummaryAdmin(admin.ModelAdmin):
+    list_display = ('project', 'estimated_cost', 'cidb_cost', 'actual_cost', 'item_count', 'stale', 'updated_at')
+    list_filter = ('stale',)
+    list_select_related = ('project__uploaded_by__user',)
+    readonly_fields = ('updated_at',)
+
+@admin.register(MonthlyCostRollup)
+class MonthlyCostRollupAdmin(admin.ModelAdmin):
+    list_display = ('month', 'uploaded_by', 'estimated_cost', 'cidb_cost', 'actual_cost', 'project_count', 'updated_at')
+    list_filter = ('month',)
+    list_select_related = ('uploaded_by__user',)
+    readonly_fields = ('updated_at',)
 
 @admin.register(ProjectItem)
-class ProjectItemAdmin(admin.ModelAdmin):
+class ProjectItemAdmin(LargeTableAdmin):
     list_display = ('project', 'section', 'description', 'quantity', 'rate', 'amount')
-    search_fields = ('description', 'project__name')
-    list_filter = ('section',)
+    list_select_related = ('project__uploaded_by__user',)
+    search_fields = ('^description', '^project__name')
+    list_filter = ('section', ProjectFilter)
     list_per_page = 30
 
 @admin.register(Forecast)
-class ForecastAdmin(admin.ModelAdmin):
-    list_display = ('material_description', 'model_type', 'quarter', 'year', 'forecasted_price', 'project')
-    list_filter = ('model_type', 'quarter', 'year', 'project')
-    search_fields = ('material_description',)
+class ForecastAdmin(LargeTableAdmin):
+    list_display = ('material_description', 'source_kind', 'model_type', 'quarter', 'year', 'forecasted_price', 'project')
+    list_filter = ('model_type', 'source_kind', QuarterFilter, 'year', ProjectFilter)
+    list_select_related = ('project__uploaded_by__user',)
+    raw_id_fields = ('project_item',)
+    search_fields = ('^material_description',)
     list_per_page = 20
 
 @admin.register(Report)
 class ReportAdmin(admin.ModelAdmin):
-    list_display = ('project', 'generated_by', 'generated_at', 'report_type')
+    list_display = ('project', 'generated_by', 'generated_at', 'report_type', 'size', 'last_accessed')
     list_filter = ('report_type', 'generated_at')
-    readonly_fields = ('generated_at',)
+    list_select_related = ('project__uploaded_by__user', 'generated_by__user')
+    readonly_fields = ('generated_at', 'content_hash', 'size', 'last_accessed')
+
+@admin.register(ReportBatch)
+class ReportBatchAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'created_by', 'created_at', 'status', 'completed', 'total', 'finished_at')
+    list_filter = ('status', 'created_at')
+    list_select_related = ('created_by__user',)
+    readonly_fields = ('created_at', 'finished_at', 'total', 'completed', 'archive_path', 'error')
 
 @admin.register(ActualItem)
-class ActualItemAdmin(admin.ModelAdmin):
+class ActualItemAdmin(LargeTableAdmin):
     list_display = ('project_item', 'quantity_actual', 'rate_actual', 'amount_actual')
-    search_fields = ('project_item__description',)
+    list_select_related = ('project_item',)
+    search_fields = ('^project_item__description',)
 
 @admin.register(InflationRate)
 class InflationRateAdmin(admin.ModelAdmin):
     list_display = ('project', 'rate', 'applied', 'applied_at')
     list_filter = ('applied', 'applied_at')
+    list_select_related = ('project__uploaded_by__user',)
+
+@admin.register(InflationScenario)
+class InflationScenarioAdmin(admin.ModelAdmin):
+    list_display = ('project', 'name', 'rate', 'created_at')
+    list_select_related = ('project__uploaded_by__user',)
+    search_fields = ('^name', '^project__name')
 
 admin.site.register(CIDBUpload, CIDBUploadAdmin)
 
@@ -0,0 +1,98 @@
+"""Avatar thumbnails, rendered off the request path and cached by content hash.
+
+``UserProfile.save`` only downsizes a newly uploaded avatar; the thumbnails
+in ``AVATAR_THUMBNAIL_SIZES`` are rendered by a background thread once the
+save has committed. They are stored under
+``AVATAR_THUMBNAIL_DIR/<sha256 of the avatar>/<size>.webp``, so an image
+that was already processed (re-uploaded, or shared by several users) reuses
+the existing files. ``UserProfile.avatar_hash`` is set when the set is
+complete; until then templates fall back to the original avatar.
+
+``manage.py avatar_thumbnails`` renders whatever is missing, e.g. after a
+deploy or for avatars uploaded before thumbnails existed.
+"""
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# One worker: thumbnails are cheap, and requests should not compete with them for CPU.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='avatar-thumbnails')
+
+
+def thumbnail_sizes():
+    return tuple(getattr(settings, 'AVATAR_THUMBNAIL_SIZES', (40, 80, 150, 300)))
+
+
+def thumbnail_path(content_hash, size):
+    return f"{getattr(settings, 'AVATAR_THUMBNAIL_DIR', 'avatars/thumbs')}/{content_hash}/{size}.webp"
+
+
+def thumbnail_url(profile, size):
+    """URL of the smallest thumbnail covering ``size`` px, or of the original avatar while none exist."""
+    if not profile.avatar:
+        return None
+    if not profile.avatar_hash:
+        return profile.avatar.url
+    sizes = sorted(thumbnail_sizes())
+    best = next((s for s in sizes if s >= size), sizes[-1])
+    return default_storage.url(thumbnail_path(profile.avatar_hash, best))
+
+
+def render(data, size):
+    """WEBP bytes of the image ``data`` scaled to fit ``size`` x ``size`` (never enlarged)."""
+    img = Image.open(io.BytesIO(data))
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'PA') else 'RGB')
+    img.thumbnail((size, size))
+    buffer = io.BytesIO()
+    img.save(buffer, format='WEBP', quality=85)
+    return buffer.getvalue()
+
+
+def generate(profile):
+    """Render the missing thumbnails of ``profile``'s avatar and publish its hash.
+
+    Returns the content hash, or None if the profile has no avatar.
+    """
+    from .models import UserProfile
+
+    if not profile.avatar:
+        return None
+    with profile.avatar.open('rb') as f:
+        data = f.read()
+    content_hash = hashlib.sha256(data).hexdigest()
+    for size in thumbnail_sizes():
+        path = thumbnail_path(content_hash, size)
+        if not default_storage.exists(path):
+            default_storage.save(path, ContentFile(render(data, size)))
+    # Only if the avatar was not replaced meanwhile; update() also keeps this out of the model signals.
+    UserProfile.objects.filter(pk=profile.pk, avatar=profile.avatar.name).update(avatar_hash=content_hash)
+    return content_hash
+
+
+def schedule(profile_id):
+    """Render the thumbnails of a profile's avatar in the background."""
+    _executor.submit(_generate_by_id, profile_id)
+
+
+def _generate_by_id(profile_id):
+    from .models import UserProfile
+
+    try:
+        profile = UserProfile.objects.filter(pk=profile_id).first()
+        if profile is not None:
+            generate(profile)
+    except Exception:
+        logger.exception("Avatar thumbnails failed for profile %s", profile_id)
+    finally:
+        # The worker thread has its own connection; don't leave it open between jobs.
+        connections.close_all()
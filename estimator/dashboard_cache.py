@@ -0,0 +1,51 @@
+"""Per-user cache of computed dashboard data.
+
+Entries are keyed by user, filter, search and page, and tagged with a global
+generation token. Model signals replace the token, so every cached dashboard
+goes stale at once; a hit costs a single ``get_many`` round trip. The signals
+call ``invalidate_on_commit``, so a request or transaction writing many rows
+replaces the token once, after commit.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import invalidation
+
+GENERATION_KEY = 'dashboard:generation'
+
+
+def key(user_id, project_filter, search, page):
+    raw = f'{user_id}|{project_filter}|{search}|{page}'
+    return 'dashboard:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def get(cache_key):
+    """Return (data or None, current generation)."""
+    values = cache.get_many([GENERATION_KEY, cache_key])
+    generation = values.get(GENERATION_KEY)
+    if generation is None:
+        generation = invalidate()
+    entry = values.get(cache_key)
+    if entry and entry['generation'] == generation:
+        return entry['data'], generation
+    return None, generation
+
+
+def store(cache_key, data, generation):
+    timeout = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300)
+    cache.set(cache_key, {'generation': generation, 'data': data}, timeout)
+
+
+def invalidate():
+    """Start a new generation; entries written under older ones are ignored."""
+    generation = uuid.uuid4().hex
+    cache.set(GENERATION_KEY, generation, None)
+    return generation
+
+
+def invalidate_on_commit():
+    """``invalidate`` once for the current request or transaction, after it commits."""
+    invalidation.defer('dashboard', invalidate)
@@ -0,0 +1,277 @@
+"""Bounded-memory exports.
+
+Spreadsheets: rows are pulled from ``.iterator()`` querysets into an openpyxl
+write-only workbook, which spools each sheet to disk instead of building cells
+in memory. The finished file is streamed back in chunks by ``FileResponse``.
+This bounds memory, not time to first byte: an XLSX is a zip whose sheets
+openpyxl only archives on save, so nothing can be sent before every row has
+been written.
+
+Datasets: flat CSV (streamed row by row) and Parquet (written one row group per
+chunk with ``pyarrow``) for analytics consumers. Every exported model has an
+``updated_at`` column that incremental exports use as their watermark; writes
+that bypass save() (``update()``, upserts) must set it themselves.
+
+Deletes can't show up in an ``updated_at`` feed, so deleting a row from any
+exported model records an ``ExportTombstone``; the ``deletions`` dataset lists
+them with the same watermark. Consumers apply those alongside the changed rows,
+or re-sync from a full snapshot (an export without ``since``) at any time.
+
+Under ASGI, bodies must be async iterators or Django buffers them whole: CSV
+rows then come from ``aiterator()`` and files are read by ``aread_chunks``.
+"""
+import csv
+import re
+import tempfile
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import models, transaction
+from django.http import FileResponse, StreamingHttpResponse
+
+from . import lazy
+from .metrics import EXPORT_BYTES
+from .models import Project, ProjectItem, ActualItem, Forecast, MaterialPrice, LabourRate, ExportTombstone
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+ITERATOR_CHUNK_SIZE = 2000
+
+ITEM_HEADERS = [
+    'Section', 'Description', 'Qty', 'Unit', 'Rate (RM)', 'Amount (RM)', 'CIDB Rate', 'CIDB Amount', 'Variance',
+]
+FORECAST_HEADERS = [
+    'Project', 'Section', 'Material/Labour', 'Source', 'Model', 'Quarter', 'Year',
+    'Current Price (RM)', 'Forecasted Price (RM)',
+]
+
+
+def sheet_title(name, used, fallback):
+    """Excel-safe, unique sheet title (max 31 chars, no []:*?/\\)."""
+    title = re.sub(r'[\\/*?:[\]]', '', name or '')[:31].strip() or fallback[:31]
+    candidate, n = title, 2
+    while candidate.lower() in used:
+        suffix = f' ({n})'
+        candidate = title[:31 - len(suffix)] + suffix
+        n += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def xlsx_response(filename, write):
+    """Build a write-only workbook with ``write(workbook)`` in a temp file and stream it.
+
+    Memory stays flat however many rows ``write`` adds, but the response only
+    starts once the whole workbook is saved (see the module docstring).
+    """
+    workbook = lazy.workbook(write_only=True)
+    write(workbook)
+    handle = tempfile.TemporaryFile()
+    workbook.save(handle)
+    EXPORT_BYTES.labels(format='xlsx').inc(handle.tell())
+    handle.seek(0)
+    return FileResponse(handle, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+def item_row(section, description, quantity, unit, rate, amount, cidb_rate, cidb_amount):
+    return [
+        section, description, quantity, unit, rate, amount,
+        cidb_rate or '', cidb_amount or '',
+        (amount - (cidb_amount or 0)) if cidb_amount else '',
+    ]
+
+
+def write_project_sheets(workbook, projects, items):
+    """One sheet of BoQ lines per project.
+
+    ``items`` must be ordered by project in the same order as ``projects``;
+    both are walked once, so only the current row is held in memory.
+    """
+    used = set()
+    rows = items.values_list(
+        'project_id', 'section', 'description', 'quantity', 'unit', 'rate', 'amount', 'cidb_rate', 'cidb_amount',
+    ).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    pending = next(rows, None)
+    for project_id, name in projects.values_list('pk', 'name').iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        sheet = workbook.create_sheet(sheet_title(name, used, f'Project_{project_id}'))
+        sheet.append(ITEM_HEADERS)
+        while pending is not None and pending[0] == project_id:
+            sheet.append(item_row(*pending[1:]))
+            pending = next(rows, None)
+    if not used:
+        # A workbook needs at least one sheet.
+        workbook.create_sheet('Projects').append(ITEM_HEADERS)
+
+
+def write_forecast_sheet(workbook, title, forecasts, prices):
+    """Forecast rows with their current CIDB price; the sheet is only created if there are rows."""
+    sheet = None
+    for f in forecasts.select_related('project', 'project_item').iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        if sheet is None:
+            sheet = workbook.create_sheet(title)
+            sheet.append(FORECAST_HEADERS)
+        current = prices.get((f.source_kind, f.source_description))
+        sheet.append([
+            f.project.name if f.project else 'N/A',
+            f.project_item.section if f.project_item else '',
+            f.material_description,
+            f.get_source_kind_display(),
+            f.get_model_type_display(),
+            f.quarter,
+            f.year,
+            current['rate'] if current else None,
+            f.forecasted_price,
+        ])
+
+
+# name -> (model, lookup to the owning project or None for shared data, exported columns)
+DATASETS = {
+    'projects': (Project, 'pk', [
+        'id', 'name', 'uploaded_by_id', 'upload_date', 'start_date', 'end_date', 'duration_months',
+        'estimated_cost', 'cidb_cost', 'actual_cost', 'inflation_quarter', 'inflation_year', 'inflation_multiplier',
+        'updated_at',
+    ]),
+    'items': (ProjectItem, 'project', [
+        'id', 'project_id', 'section', 'description', 'quantity', 'unit', 'rate', 'original_rate', 'amount',
+        'cidb_rate', 'cidb_amount', 'updated_at',
+    ]),
+    'actuals': (ActualItem, 'project_item__project', [
+        'id', 'project_item_id', 'quantity_actual', 'rate_actual', 'amount_actual', 'updated_at',
+    ]),
+    'forecasts': (Forecast, 'project', [
+        'id', 'project_id', 'project_item_id', 'material_description', 'source_kind', 'source_description',
+        'model_type', 'quarter', 'year', 'forecasted_price', 'updated_at',
+    ]),
+    'material_prices': (MaterialPrice, None, [
+        'id', 'quarter', 'year', 'section', 'sn', 'description', 'rate', 'unit', 'remarks', 'updated_at',
+    ]),
+    'labour_rates': (LabourRate, None, [
+        'id', 'quarter', 'year', 'section', 'sn', 'description', 'rate', 'unit', 'remarks', 'updated_at',
+    ]),
+    # Only the dataset and id of each deleted row, so it isn't scoped to the user's projects.
+    'deletions': (ExportTombstone, None, ['id', 'dataset', 'object_id', 'updated_at']),
+}
+TOMBSTONE_DATASETS = {model: name for name, (model, _, _) in DATASETS.items() if model is not ExportTombstone}
+
+
+class _Tombstones:
+    """on_commit callback writing the tombstones recorded at one savepoint level in one batch."""
+
+    def __init__(self):
+        self.rows = []
+
+    def __call__(self):
+        ExportTombstone.objects.bulk_create(
+            ExportTombstone(dataset=dataset, object_id=object_id) for dataset, object_id in self.rows
+        )
+
+
+def record_deletion(model, object_id):
+    """Record that ``model`` row ``object_id`` was deleted, once the current transaction commits.
+
+    Deletes fire post_delete per row; the rows are gathered into one pending
+    callback per savepoint level, so rolling a savepoint back drops its rows.
+    """
+    connection = transaction.get_connection()
+    savepoints = set(connection.savepoint_ids)
+    for callback_savepoints, func, _ in connection.run_on_commit:
+        if isinstance(func, _Tombstones) and callback_savepoints == savepoints:
+            func.rows.append((TOMBSTONE_DATASETS[model], object_id))
+            return
+    callback = _Tombstones()
+    callback.rows.append((TOMBSTONE_DATASETS[model], object_id))
+    transaction.on_commit(callback)
+
+
+class Echo:
+    """File-like object whose write() hands the row straight back to the generator."""
+
+    def write(self, value):
+        return value
+
+
+def is_asgi(request):
+    return isinstance(request, ASGIRequest)
+
+
+async def aread_chunks(handle, chunk_size):
+    """Read ``handle`` chunk by chunk off the event loop, closing it at the end."""
+    read = sync_to_async(handle.read, thread_sensitive=False)
+    try:
+        while chunk := await read(chunk_size):
+            yield chunk
+    finally:
+        await sync_to_async(handle.close, thread_sensitive=False)()
+
+
+def csv_response(filename, columns, rows):
+    """Stream ``rows`` as CSV; ``rows`` may be a sync or an async iterable."""
+    writer = csv.writer(Echo())
+    written = 0
+
+    def line(row):
+        nonlocal written
+        text = writer.writerow(row)
+        written += len(text)
+        return text
+
+    def stream():
+        try:
+            yield line(columns)
+            for row in rows:
+                yield line(row)
+        finally:
+            EXPORT_BYTES.labels(format='csv').inc(written)
+
+    async def astream():
+        try:
+            yield line(columns)
+            async for row in rows:
+                yield line(row)
+        finally:
+            EXPORT_BYTES.labels(format='csv').inc(written)
+
+    content = astream() if hasattr(rows, '__aiter__') else stream()
+    response = StreamingHttpResponse(content, content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def arrow_type(field):
+    import pyarrow as pa
+
+    if isinstance(field, models.DecimalField):
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, (models.IntegerField, models.AutoField, models.ForeignKey)):
+        return pa.int64()
+    return pa.string()
+
+
+def parquet_response(filename, model, columns, rows):
+    """Write ``rows`` to a Parquet file one row group per chunk and stream it.
+
+    Raises ImportError when pyarrow is not installed.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(name, arrow_type(model._meta.get_field(name))) for name in columns])
+    handle = tempfile.TemporaryFile()
+    with pq.ParquetWriter(handle, schema) as writer:
+        while True:
+            chunk = list(islice(rows, ITERATOR_CHUNK_SIZE))
+            if not chunk:
+                break
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*chunk), schema)],
+                schema=schema,
+            ))
+    EXPORT_BYTES.labels(format='parquet').inc(handle.tell())
+    handle.seek(0)
+    return FileResponse(handle, as_attachment=True, filename=filename, content_type='application/vnd.apache.parquet')
@@ -37,4 +37,8 @@ class ProjectEditForm(forms.ModelForm):
         end = cleaned_data.get('end_date')
         if start and end and end < start:
             raise ValidationError("End date cannot be before start date.")
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+
+class InflationRateForm(forms.Form):
+    """An inflation percentage that fits InflationRate/InflationScenario.rate: finite, at most ±999.99."""
+    rate = forms.DecimalField(max_digits=5, decimal_places=2)
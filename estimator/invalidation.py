@@ -0,0 +1,109 @@
+"""Deferred, de-duplicated cache invalidation.
+
+Model signals fire once per saved row, so a BoQ upload used to mark the same
+ProjectSummary stale and replace the dashboard generation once per line.
+Handlers call ``defer(key, callback)`` instead: each ``key`` runs at most
+once per transaction, after it commits (right away in autocommit), and not at
+all if it rolls back.
+
+``InvalidationBatchMiddleware`` widens that to the whole request, so views
+writing row by row in autocommit still invalidate once, when they return.
+Code that refreshes a cache itself right after writing wraps the writes in
+``suppress(key)`` so their signals don't throw the fresh copy away again.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import transaction
+
+_batch = ContextVar('estimator_invalidation_batch', default=None)
+_suppressed = ContextVar('estimator_invalidation_suppressed', default=frozenset())
+
+
+class _Callback:
+    def __init__(self, key, callback):
+        self.key = key
+        self.callback = callback
+
+    def __call__(self):
+        self.callback()
+
+
+def defer(key, callback):
+    """Run ``callback`` once for ``key`` when the current batch or transaction ends."""
+    if key in _suppressed.get():
+        return
+    pending = _batch.get()
+    if pending is not None:
+        pending.setdefault(key, callback)
+    else:
+        _on_commit_once(key, callback)
+
+
+def _on_commit_once(key, callback):
+    connection = transaction.get_connection()
+    # Rolled-back savepoints drop their callbacks, so the pending list is the source of truth.
+    if connection.in_atomic_block and any(
+        getattr(func, 'key', None) == key for _, func, _ in connection.run_on_commit
+    ):
+        return
+    transaction.on_commit(_Callback(key, callback))
+
+
+@contextmanager
+def suppress(key):
+    """Ignore ``defer`` calls for ``key`` inside the block; the caller refreshes that cache itself."""
+    token = _suppressed.set(_suppressed.get() | {key})
+    try:
+        yield
+    finally:
+        _suppressed.reset(token)
+
+
+def begin():
+    """Start collecting deferred invalidations; returns the token for ``end``."""
+    return _batch.set({})
+
+
+def end(token):
+    """Schedule everything collected since ``begin`` (once per key)."""
+    pending = _batch.get()
+    _batch.reset(token)
+    _run_pending(pending)
+
+
+def _run_pending(pending):
+    for key, callback in pending.items():
+        _on_commit_once(key, callback)
+
+
+class InvalidationBatchMiddleware:
+    """Collect the invalidations of one request and run each once when it returns."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = begin()
+        try:
+            return self.get_response(request)
+        finally:
+            end(token)
+
+    async def __acall__(self, request):
+        token = begin()
+        try:
+            return await self.get_response(request)
+        finally:
+            # The callbacks touch the database and the cache.
+            pending = _batch.get()
+            _batch.reset(token)
+            await sync_to_async(_run_pending)(pending)
@@ -0,0 +1,42 @@
+"""Accessors for the heavy libraries, imported on first use.
+
+pandas alone adds about half a second and tens of MB to every process that
+imports it. Web workers mostly serve pages that never touch it, so modules
+loaded at startup (views, reports, exports, ...) call these helpers where
+the library is needed instead of importing it at the top. After the first
+call the module comes straight from ``sys.modules``.
+
+``manage.py import_report`` checks that none of HEAVY_MODULES is loaded by
+a freshly started worker.
+"""
+import importlib
+
+HEAVY_MODULES = ('pandas', 'numpy', 'sklearn', 'reportlab', 'openpyxl', 'pyarrow')
+
+
+def pandas():
+    return importlib.import_module('pandas')
+
+
+def numpy():
+    return importlib.import_module('numpy')
+
+
+def reportlab():
+    """The reportlab package with the submodules the PDF reports use loaded."""
+    for name in ('lib.colors', 'lib.pagesizes', 'lib.styles', 'lib.units', 'platypus'):
+        importlib.import_module(f'reportlab.{name}')
+    return importlib.import_module('reportlab')
+
+
+def sklearn_regressors():
+    """(LinearRegression, RandomForestRegressor)"""
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.linear_model import LinearRegression
+    return LinearRegression, RandomForestRegressor
+
+
+def workbook(**kwargs):
+    """A new openpyxl Workbook."""
+    from openpyxl import Workbook
+    return Workbook(**kwargs)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from estimator import avatars
+from estimator.models import UserProfile
+from estimator.profiling import ProfiledCommand
+
+
+class Command(ProfiledCommand, BaseCommand):
+    help = "Render the avatar thumbnails that are missing (avatars uploaded before thumbnails, or not yet processed)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help="Check every avatar, not only those without thumbnails")
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.exclude(avatar='').exclude(avatar__isnull=True).select_related('user')
+        if not options['all']:
+            profiles = profiles.filter(avatar_hash='')
+        done = failed = 0
+        for profile in profiles.iterator():
+            try:
+                avatars.generate(profile)
+            except (OSError, ValueError) as e:
+                failed += 1
+                self.stderr.write(self.style.WARNING(f"{profile.user.username}: {e}"))
+            else:
+                done += 1
+        self.stdout.write(self.style.SUCCESS(f"Thumbnails ready for {done} avatar(s), {failed} failed"))
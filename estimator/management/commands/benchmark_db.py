@@ -0,0 +1,177 @@
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+from copy import deepcopy
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import DatabaseError, connections, transaction
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+from estimator.profiling import ProfiledCommand
+
+SCRATCH_TABLE = 'estimator_benchmark_db_item'
+SCRATCH_DDL = {
+    'sqlite': 'CREATE TABLE {table} (id INTEGER PRIMARY KEY, project_id INTEGER NOT NULL, amount NUMERIC NOT NULL)',
+    'mysql': 'CREATE TABLE {table} (id INTEGER AUTO_INCREMENT PRIMARY KEY, project_id INTEGER NOT NULL, '
+             'amount DECIMAL(12, 2) NOT NULL)',
+}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+class Command(ProfiledCommand, BaseCommand):
+    help = (
+        "Compare request throughput of the tuned DATABASES profile against an untuned baseline "
+        "(no persistent connections, no OPTIONS). Each simulated request opens/reuses a connection the "
+        "way Django does, reads a BoQ-sized scratch table and commits a small write. SQLite runs against "
+        "fresh temporary files; MySQL uses a scratch table in the configured database that is dropped afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Simulated requests per thread (default: 500)")
+        parser.add_argument('--threads', type=int, default=4, help="Concurrent threads (default: 4)")
+        parser.add_argument('--rows', type=int, default=20000, help="Rows in the scratch table (default: 20000)")
+        parser.add_argument('--output', help="Write the JSON results to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        tuned = connections.settings['default']
+        vendor = tuned['ENGINE'].rsplit('.', 1)[-1].replace('sqlite3', 'sqlite')
+        if vendor not in SCRATCH_DDL:
+            raise CommandError(f"Unsupported database engine {tuned['ENGINE']}")
+
+        baseline = deepcopy(tuned)
+        baseline.update({'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}})
+        variants = {'baseline': baseline, 'tuned': deepcopy(tuned)}
+
+        results = {}
+        with tempfile.TemporaryDirectory() as scratch_dir:
+            for name, config in variants.items():
+                alias = f'benchmark_{name}'
+                if vendor == 'sqlite':
+                    config['NAME'] = os.path.join(scratch_dir, f'{name}.sqlite3')
+                connections.settings[alias] = config
+                try:
+                    self.create_scratch(alias, vendor, options['rows'])
+                    results[name] = self.run_variant(alias, options)
+                finally:
+                    self.drop_scratch(alias)
+                    connections[alias].close()
+                    del connections[alias]
+                    del connections.settings[alias]
+                self.stderr.write(
+                    f"  {name:9s} {results[name]['requests_per_s']} req/s "
+                    f"p95={results[name]['p95_ms']}ms connections={results[name]['connections_opened']} "
+                    f"errors={results[name]['errors']}"
+                )
+
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'profile': getattr(settings, 'DB_PROFILE', None),
+            'vendor': vendor,
+            'options': {key: options[key] for key in ('requests', 'threads', 'rows')},
+            'variants': results,
+            'speedup': round(results['tuned']['requests_per_s'] / results['baseline']['requests_per_s'], 2)
+            if results['baseline']['requests_per_s'] else None,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def create_scratch(self, alias, vendor, rows):
+        rng = random.Random(0)
+        with connections[alias].cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {SCRATCH_TABLE}')
+            cursor.execute(SCRATCH_DDL[vendor].format(table=SCRATCH_TABLE))
+            cursor.execute(f'CREATE INDEX {SCRATCH_TABLE}_project ON {SCRATCH_TABLE} (project_id)')
+            with transaction.atomic(using=alias):
+                cursor.executemany(
+                    f'INSERT INTO {SCRATCH_TABLE} (project_id, amount) VALUES (%s, %s)',
+                    [(n % 100, Decimal(rng.randint(100, 100000)) / 100) for n in range(rows)],
+                )
+
+    def drop_scratch(self, alias):
+        with connections[alias].cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {SCRATCH_TABLE}')
+
+    def run_variant(self, alias, options):
+        opened = []
+        errors = []
+        timings = []
+        lock = threading.Lock()
+
+        def count_connection(sender, connection, **kwargs):
+            if connection.alias == alias:
+                with lock:
+                    opened.append(1)
+
+        def worker(seed):
+            rng = random.Random(seed)
+            local_timings = []
+            for _ in range(options['requests']):
+                request_started.send(sender=self.__class__)
+                start = time.perf_counter()
+                try:
+                    self.simulate_request(alias, rng)
+                except DatabaseError as e:
+                    with lock:
+                        errors.append(str(e))
+                finally:
+                    local_timings.append(time.perf_counter() - start)
+                    # close_old_connections: closes unless CONN_MAX_AGE keeps the connection.
+                    request_finished.send(sender=self.__class__)
+            connections[alias].close()
+            with lock:
+                timings.extend(local_timings)
+
+        connection_created.connect(count_connection)
+        try:
+            threads = [threading.Thread(target=worker, args=(n,)) for n in range(options['threads'])]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(count_connection)
+
+        total = len(timings)
+        return {
+            'requests': total,
+            'elapsed_s': round(elapsed, 2),
+            'requests_per_s': round(total / elapsed, 1) if elapsed else None,
+            'p50_ms': round(percentile(timings, 50) * 1000, 2),
+            'p95_ms': round(percentile(timings, 95) * 1000, 2),
+            'connections_opened': len(opened),
+            'errors': len(errors),
+            'first_error': errors[0] if errors else None,
+        }
+
+    def simulate_request(self, alias, rng):
+        """What a typical view does: a point lookup, a project aggregate and one small committed write."""
+        project_id = rng.randrange(100)
+        with connections[alias].cursor() as cursor:
+            cursor.execute(f'SELECT project_id, amount FROM {SCRATCH_TABLE} WHERE id = %s', [rng.randrange(1, 1000)])
+            cursor.fetchone()
+            cursor.execute(f'SELECT SUM(amount), COUNT(*) FROM {SCRATCH_TABLE} WHERE project_id = %s', [project_id])
+            cursor.fetchone()
+            with transaction.atomic(using=alias):
+                cursor.execute(
+                    f'UPDATE {SCRATCH_TABLE} SET amount = amount + 1 WHERE id = %s', [rng.randrange(1, 1000)],
+                )
@@ -0,0 +1,281 @@
+import json
+import math
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+from decimal import Decimal
+from io import BytesIO
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import Workbook
+
+from estimator.exports import XLSX_CONTENT_TYPE
+from estimator.models import (
+    Project, ProjectItem, ActualItem, Forecast, MaterialPrice, LabourRate, Report,
+)
+from estimator.profiling import ProfiledCommand
+
+BENCHMARK_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'}}
+QUARTERS = ['Q1', 'Q2', 'Q3', 'Q4']
+BOQ_COLUMNS = ['Section', 'Description', 'Quantity', 'Unit', 'Rate (RM)', 'Amount (RM)']
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+class Command(ProfiledCommand, BaseCommand):
+    help = (
+        "Seed a synthetic dataset and time the main views through the test client. "
+        "Everything runs in one transaction that is rolled back, with a throwaway MEDIA_ROOT "
+        "and cache, so the database is left untouched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=3, help="QS users to create (default: 3)")
+        parser.add_argument('--projects', type=int, default=5, help="Projects per user (default: 5)")
+        parser.add_argument('--items', type=int, default=200, help="BoQ lines per project (default: 200)")
+        parser.add_argument('--actuals', type=float, default=0.5,
+                            help="Fraction of BoQ lines with actual costs (default: 0.5)")
+        parser.add_argument('--quarters', type=int, default=8, help="Quarters of CIDB price history (default: 8)")
+        parser.add_argument('--descriptions', type=int, default=100,
+                            help="Distinct CIDB material/labour descriptions (default: 100)")
+        parser.add_argument('--iterations', type=int, default=10, help="Requests per view (default: 10)")
+        parser.add_argument('--cold', action='store_true',
+                            help="Clear the dashboard cache and cached reports before every request")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for the synthetic data")
+        parser.add_argument('--output', help="Write the JSON results to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['projects'] < 1 or options['items'] < 1 or options['iterations'] < 1:
+            raise CommandError("--users, --projects, --items and --iterations must be at least 1")
+        self.random = random.Random(options['seed'])
+
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root, CACHES=BENCHMARK_CACHES, ALLOWED_HOSTS=['*']):
+            with transaction.atomic():
+                started = time.perf_counter()
+                users, target = self.seed(options)
+                self.stderr.write(f"Seeded data in {time.perf_counter() - started:.1f}s; running views...")
+                results = self.run_views(users[0], target, options)
+                transaction.set_rollback(True)
+
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'options': {key: options[key] for key in (
+                'users', 'projects', 'items', 'actuals', 'quarters', 'descriptions', 'iterations', 'cold', 'seed',
+            )},
+            'views': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    # ------------------------------------------------------------------
+    # Seeding
+    # ------------------------------------------------------------------
+    def seed(self, options):
+        rng = self.random
+        descriptions = [f"Benchmark item {n}" for n in range(options['descriptions'])]
+        labour = [f"Benchmark labour {n}" for n in range(max(options['descriptions'] // 4, 1))]
+
+        now = timezone.now()
+        periods = []
+        year, quarter = now.year, (now.month - 1) // 3
+        for _ in range(options['quarters']):
+            periods.append((QUARTERS[quarter], year))
+            quarter -= 1
+            if quarter < 0:
+                quarter, year = 3, year - 1
+
+        MaterialPrice.objects.bulk_create(
+            MaterialPrice(quarter=q, year=y, section='Benchmark', sn=n, description=desc,
+                          rate=Decimal(rng.randint(1000, 50000)) / 100, unit='m3')
+            for q, y in periods for n, desc in enumerate(descriptions)
+        )
+        LabourRate.objects.bulk_create(
+            LabourRate(quarter=q, year=y, section='Benchmark', sn=n, description=desc,
+                       rate=Decimal(rng.randint(5000, 30000)) / 100, unit='day')
+            for q, y in periods for n, desc in enumerate(labour)
+        )
+
+        next_q, next_y = QUARTERS[(now.month - 1) // 3], now.year
+        users = []
+        target = None
+        for u in range(options['users']):
+            user = User(username=f'benchmark_user_{u}')
+            user.set_unusable_password()
+            user.save()
+            profile = user.userprofile
+            profile.role = 'qs'
+            profile.save()
+            users.append(user)
+
+            for n in range(options['projects']):
+                project = self.seed_project(profile, f"Benchmark {u}-{n}", options, descriptions, labour)
+                target = target or project
+                Forecast.objects.bulk_create(
+                    Forecast(project=project, project_item=item, material_description=f"{kind.upper()}: {item.description}",
+                             source_kind=kind, source_description=item.description, model_type=model_type,
+                             quarter=next_q, year=next_y, forecasted_price=item.rate)
+                    for item in project.estimate_items.all()[::4]
+                    for kind in ['labour' if item.section == 'Labour' else 'material']
+                    for model_type in ('linear', 'random_forest')
+                )
+        return users, target
+
+    def seed_project(self, profile, name, options, descriptions, labour):
+        rng = self.random
+        project = Project.objects.create(name=name, uploaded_by=profile, file='projects/benchmark.xlsx')
+        # (project, section, description) is unique, so walk the pools in a shuffled order and
+        # suffix descriptions once a pool is exhausted (those lines have no CIDB history).
+        pools = {True: rng.sample(labour, len(labour)), False: rng.sample(descriptions, len(descriptions))}
+        used = {True: 0, False: 0}
+        items = []
+        for n in range(options['items']):
+            is_labour = n % 5 == 0
+            pool, k = pools[is_labour], used[is_labour]
+            used[is_labour] += 1
+            description = pool[k % len(pool)] + (f" #{k // len(pool)}" if k >= len(pool) else '')
+            qty = Decimal(rng.randint(1, 500))
+            rate = Decimal(rng.randint(1000, 50000)) / 100
+            cidb_rate = rate * Decimal('0.95')
+            items.append(ProjectItem(
+                project=project, section='Labour' if is_labour else 'Benchmark',
+                description=description,
+                quantity=qty, unit='day' if is_labour else 'm3', rate=rate, original_rate=rate,
+                amount=qty * rate, cidb_rate=cidb_rate, cidb_amount=qty * cidb_rate,
+            ))
+        items = ProjectItem.objects.bulk_create(items)
+        actuals = [
+            ActualItem(project_item=item, quantity_actual=item.quantity, rate_actual=item.rate * Decimal('1.05'),
+                       amount_actual=item.amount * Decimal('1.05'))
+            for item in items if rng.random() < options['actuals']
+        ]
+        ActualItem.objects.bulk_create(actuals)
+
+        project.estimated_cost = sum(item.amount for item in items)
+        project.cidb_cost = sum(item.cidb_amount for item in items)
+        project.actual_cost = sum(actual.amount_actual for actual in actuals) or Decimal('0')
+        project.save()
+        return project
+
+    def boq_upload(self, rows):
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(BOQ_COLUMNS)
+        for item in rows:
+            sheet.append([item.section, item.description, float(item.quantity), item.unit,
+                          float(item.rate), float(item.amount)])
+        buffer = BytesIO()
+        workbook.save(buffer)
+        return buffer.getvalue()
+
+    # ------------------------------------------------------------------
+    # Views
+    # ------------------------------------------------------------------
+    def scenarios(self, target):
+        items = list(target.estimate_items.order_by('pk'))
+        boq = self.boq_upload(items)
+
+        def upload(i):
+            return {
+                'name': f"Benchmark upload {i}",
+                'file': SimpleUploadedFile('boq.xlsx', boq, content_type=XLSX_CONTENT_TYPE),
+            }
+
+        def actuals(i):
+            # Alternate the rate so every save actually writes rows.
+            factor = Decimal('1.10') if i % 2 else Decimal('1.20')
+            data = {}
+            for item in items:
+                data[f'item_{item.pk}_qty'] = str(item.quantity)
+                data[f'item_{item.pk}_rate'] = str(item.rate * factor)
+            return data
+
+        return [
+            ('dashboard', 'get', reverse('dashboard'), None),
+            ('project_detail', 'get', reverse('project_detail', args=[target.pk]), None),
+            ('view_forecast', 'get', reverse('view_forecast', args=[target.pk]), None),
+            ('edit_actuals', 'get', reverse('edit_actuals', args=[target.pk]), None),
+            ('edit_actuals [POST]', 'post', reverse('edit_actuals', args=[target.pk]), actuals),
+            ('upload_project [POST]', 'post', reverse('upload_project'), upload),
+            ('export_all', 'get', reverse('export_all'), None),
+            ('export_report [pdf]', 'get', reverse('export_single', args=[target.pk, 'pdf']), None),
+            ('export_report [excel]', 'get', reverse('export_single', args=[target.pk, 'excel']), None),
+        ]
+
+    def run_views(self, user, target, options):
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+
+        results = {}
+        try:
+            for label, method, url, data in self.scenarios(target):
+                timings, queries, peaks, statuses = [], [], [], set()
+                for i in range(options['iterations']):
+                    if options['cold']:
+                        cache.clear()
+                        Report.objects.all().delete()
+                    payload = data(i) if data else {}
+                    tracemalloc.reset_peak()
+                    baseline = tracemalloc.get_traced_memory()[0]
+                    with CaptureQueriesContext(connection) as ctx:
+                        start = time.perf_counter()
+                        # Everything runs in one rolled-back transaction; run the on_commit
+                        # invalidations a real commit would trigger, inside the measurement.
+                        with TestCase.captureOnCommitCallbacks(execute=True):
+                            response = getattr(client, method)(url, payload)
+                        if response.streaming:
+                            # Exhausting the stream also closes the response (and any temp file).
+                            for _ in response.streaming_content:
+                                pass
+                        elapsed = time.perf_counter() - start
+                    peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+                    timings.append(elapsed * 1000)
+                    queries.append(len(ctx))
+                    statuses.add(response.status_code)
+
+                results[label] = {
+                    'method': method.upper(),
+                    'url': url,
+                    'status': sorted(statuses),
+                    'iterations': len(timings),
+                    'p50_ms': round(percentile(timings, 50), 1),
+                    'p95_ms': round(percentile(timings, 95), 1),
+                    'max_ms': round(max(timings), 1),
+                    'queries_min': min(queries),
+                    'queries_max': max(queries),
+                    'peak_kb': round(max(peaks) / 1024),
+                }
+                self.stderr.write(
+                    f"  {label:24s} p50={results[label]['p50_ms']}ms p95={results[label]['p95_ms']}ms "
+                    f"queries={results[label]['queries_max']}"
+                )
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+        return results
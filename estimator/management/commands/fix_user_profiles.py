@@ -1,8 +1,9 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
 from estimator.models import UserProfile
+from estimator.profiling import ProfiledCommand
 
-class Command(BaseCommand):
+class Command(ProfiledCommand, BaseCommand):
     help = 'Create UserProfile for users that dont have one'
 
     def handle(self, *args, **options):
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from estimator.models import Project, ReportBatch
+from estimator.reports import REPORT_FORMATS, build_batch, claim_pending, evict
+from estimator.profiling import ProfiledCommand
+
+
+class Command(ProfiledCommand, BaseCommand):
+    help = "Render PDF/Excel reports for many projects in a process pool and bundle them into a ZIP"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--projects', nargs='+', type=int, help="Project ids (default: all projects)")
+        parser.add_argument('--formats', nargs='+', choices=list(REPORT_FORMATS), default=list(REPORT_FORMATS))
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+        parser.add_argument('--batch', type=int, help="Run an existing ReportBatch, e.g. one queued from the admin")
+        parser.add_argument('--pending', action='store_true',
+                            help="Run every batch queued from the admin (run periodically, e.g. from cron)")
+        parser.add_argument('--evict', action='store_true',
+                            help="Only evict expired/least recently used cached reports (run periodically, e.g. from cron)")
+
+    def handle(self, *args, **options):
+        if options['evict']:
+            self.stdout.write(self.style.SUCCESS(f"Evicted {evict()} cached report(s)/pack(s)"))
+            return
+
+        if options['pending']:
+            for batch in claim_pending():
+                self.run_batch(batch, options['workers'])
+            return
+
+        if options['batch']:
+            try:
+                batch = ReportBatch.objects.get(pk=options['batch'])
+            except ReportBatch.DoesNotExist:
+                raise CommandError(f"Report batch {options['batch']} does not exist")
+        else:
+            project_ids = options['projects'] or list(Project.objects.order_by('pk').values_list('pk', flat=True))
+            batch = ReportBatch.objects.create(project_ids=project_ids, formats=options['formats'])
+        self.run_batch(batch, options['workers'])
+
+    def run_batch(self, batch, workers):
+        self.stdout.write(f"Generating {len(batch.project_ids) * len(batch.formats)} report(s) for batch {batch.pk}...")
+        try:
+            batch = build_batch(batch, workers=workers)
+        except Exception as e:
+            ReportBatch.objects.filter(pk=batch.pk).update(status='failed', error=str(e), finished_at=timezone.now())
+            raise CommandError(f"Batch {batch.pk} failed: {e}")
+
+        if batch.error:
+            self.stderr.write(batch.error)
+        style = self.style.SUCCESS if batch.status == 'done' else self.style.ERROR
+        self.stdout.write(style(f"Batch {batch.pk} {batch.status}: {batch.archive_path}"))
@@ -1,11 +1,13 @@
 from django.core.management.base import BaseCommand
 from estimator.models import MaterialPrice, LabourRate
+from estimator.metrics import CIDB_ROWS_IMPORTED
+from estimator.profiling import ProfiledCommand
 import pandas as pd
 import os
 import re
 from pathlib import Path  
 
-class Command(BaseCommand):
+class Command(ProfiledCommand, BaseCommand):
     help = "Import material and labour prices from Excel files"
 
     def add_arguments(self, parser):
@@ -130,6 +132,7 @@ class Command(BaseCommand):
                 )
                 if created:
                     count += 1
+                CIDB_ROWS_IMPORTED.labels(kind='material', result='created' if created else 'updated').inc()
             self.stdout.write(self.style.SUCCESS(f"✅ Imported {count} new MaterialPrice records from {filepath.name}"))
             return True
         except Exception as e:
@@ -158,6 +161,7 @@ class Command(BaseCommand):
                 )
                 if created:
                     count += 1
+                CIDB_ROWS_IMPORTED.labels(kind='labour', result='created' if created else 'updated').inc()
             self.stdout.write(self.style.SUCCESS(f"✅ Imported {count} new LabourRate records from {filepath.name}"))
             return True
         except Exception as e:
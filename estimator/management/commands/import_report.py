@@ -0,0 +1,129 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from estimator.lazy import HEAVY_MODULES
+
+# Runs in a fresh interpreter: what a web worker does before serving its first request.
+WORKER_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns  # imports every view module the URLconf references
+elapsed = time.perf_counter() - start
+{rss}
+print(json.dumps({{'startup_ms': round(elapsed * 1000, 1), 'rss_kb': rss_kb(),
+                  'modules': sorted(name for name in sys.modules if '.' not in name)}}))
+"""
+MODULE_PROBE = """
+import json, sys, time
+{rss}
+before = rss_kb()
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'import_ms': round(elapsed * 1000, 1), 'rss_kb': rss_kb() - before}}))
+"""
+RSS_HELPER = """
+def rss_kb():
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Report cold-start time, resident memory and the slowest imports of a fresh web worker, "
+        "plus what each heavy library would add if it were imported at startup"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help="Slowest top-level packages to list (default: 15)")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+        parser.add_argument('--check', action='store_true',
+                            help="Exit with an error if a worker imports any heavy module at startup")
+
+    def handle(self, *args, **options):
+        worker, importtime = self.probe(WORKER_PROBE.format(rss=RSS_HELPER), importtime=True)
+        loaded = [name for name in HEAVY_MODULES if name in worker['modules']]
+        heavy = {}
+        for name in HEAVY_MODULES:
+            try:
+                heavy[name] = self.probe(MODULE_PROBE.format(rss=RSS_HELPER, module=name))[0]
+            except CommandError:
+                heavy[name] = None  # not installed
+            else:
+                heavy[name]['loaded_at_startup'] = name in loaded
+
+        report = {
+            'settings': settings.SETTINGS_MODULE,
+            'startup_ms': worker['startup_ms'],
+            'rss_mb': round(worker['rss_kb'] / 1024, 1),
+            'heavy_loaded_at_startup': loaded,
+            'slowest_packages_ms': dict(importtime[:options['top']]),
+            'heavy_modules': heavy,
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.write_table(report)
+
+        if options['check'] and loaded:
+            raise CommandError(f"Heavy modules imported at worker startup: {', '.join(loaded)}")
+
+    def probe(self, code, importtime=False):
+        """Run ``code`` in a fresh interpreter; return its JSON output and, optionally,
+        the per-package self import time in ms, slowest first."""
+        command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        result = subprocess.run(command, capture_output=True, text=True, cwd=settings.BASE_DIR, env=env)
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'probe failed')
+        output = json.loads(result.stdout.strip().splitlines()[-1])
+
+        packages = {}
+        for line in result.stderr.splitlines():
+            # "import time:       self [us] |  cumulative | imported package"
+            if not line.startswith('import time:') or 'imported package' in line:
+                continue
+            self_us, _, name = line[len('import time:'):].split('|')
+            root = name.strip().split('.')[0]
+            packages[root] = packages.get(root, 0) + int(self_us)
+        slowest = sorted(((name, round(us / 1000, 1)) for name, us in packages.items()), key=lambda p: -p[1])
+        return output, slowest
+
+    def write_table(self, report):
+        self.stdout.write(f"Worker startup ({report['settings']}): "
+                          f"{report['startup_ms']} ms, {report['rss_mb']} MB resident")
+        if report['heavy_loaded_at_startup']:
+            self.stdout.write(self.style.WARNING(
+                f"Heavy modules loaded at startup: {', '.join(report['heavy_loaded_at_startup'])}"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("No heavy modules loaded at startup"))
+
+        self.stdout.write("\nSlowest packages (self import time):")
+        for name, ms in report['slowest_packages_ms'].items():
+            self.stdout.write(f"  {name:30s} {ms:8.1f} ms")
+
+        self.stdout.write("\nHeavy modules (cost when imported on their own):")
+        for name, cost in report['heavy_modules'].items():
+            if cost is None:
+                self.stdout.write(f"  {name:30s} not installed")
+                continue
+            where = 'at startup' if cost['loaded_at_startup'] else 'lazy'
+            self.stdout.write(f"  {name:30s} {cost['import_ms']:8.1f} ms {cost['rss_kb'] / 1024:7.1f} MB  ({where})")
@@ -1,15 +1,16 @@
-import pandas as pd
 from django.core.management.base import BaseCommand
 from estimator.models import MaterialPrice, Forecast
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor
-import numpy as np
+from estimator.metrics import MODELS_FITTED
+from estimator.profiling import ProfiledCommand
+from estimator import lazy
 
 
-class Command(BaseCommand):
+class Command(ProfiledCommand, BaseCommand):
     help = "Train models and forecast next quarter"
 
     def handle(self, *args, **options):
+        pd = lazy.pandas()
+        LinearRegression, RandomForestRegressor = lazy.sklearn_regressors()
         next_q, next_y = MaterialPrice.next_quarter()
         Forecast.objects.filter(quarter=next_q, year=next_y).delete()
 
@@ -28,15 +29,19 @@ class Command(BaseCommand):
 
             # Linear
             lr = LinearRegression().fit(X, y)
+            MODELS_FITTED.labels(model='linear').inc()
             next_time = (next_y * 4) + {'Q1':1, 'Q2':2, 'Q3':3, 'Q4':4}[next_q]
             pred_lr = max(0, lr.predict([[next_time]])[0])
 
             # RF
             rf = RandomForestRegressor(n_estimators=10).fit(X, y)
+            MODELS_FITTED.labels(model='random_forest').inc()
             pred_rf = max(0, rf.predict([[next_time]])[0])
 
             Forecast.objects.create(
                 material_description=desc,
+                source_kind='material',
+                source_description=desc,
                 model_type='linear',
                 quarter=next_q,
                 year=next_y,
@@ -44,6 +49,8 @@ class Command(BaseCommand):
             )
             Forecast.objects.create(
                 material_description=desc,
+                source_kind='material',
+                source_description=desc,
                 model_type='random_forest',
                 quarter=next_q,
                 year=next_y,
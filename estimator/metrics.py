@@ -0,0 +1,178 @@
+"""In-process metrics registry rendered in the Prometheus text format.
+
+Counters and histograms live in module globals of the serving process, so
+each worker process reports its own values (scrape every worker, or sum them
+in Prometheus). Exposed at ``/metrics/`` for staff users.
+"""
+import threading
+import time
+from contextlib import ContextDecorator
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for metric in self.metrics:
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def _label_text(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        registry.register(self)
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with registry.lock:
+            child = self.children.get(key)
+            if child is None:
+                child = self.children[key] = self.new_child()
+        return child
+
+    def default(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} needs labels: {', '.join(self.labelnames)}")
+        return self.labels()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key, child in sorted(self.children.items()):
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+class _CounterValue:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        with registry.lock:
+            self.value += amount
+
+    def render(self, name, labelnames, key):
+        return [f'{name}{_label_text(labelnames, key)} {self.value}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self.default().inc(amount)
+
+
+class _Timer(ContextDecorator):
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def _recreate_cm(self):
+        # A fresh timer per decorated call, so concurrent calls don't share a start time.
+        return _Timer(self.histogram)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        with registry.lock:
+            self.count += 1
+            self.sum += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+
+    def time(self):
+        return _Timer(self)
+
+    def render(self, name, labelnames, key):
+        lines = [
+            f'{name}_bucket{_label_text(labelnames, key, [("le", bound)])} {count}'
+            for bound, count in zip(self.buckets, self.counts)
+        ]
+        lines.append(f'{name}_bucket{_label_text(labelnames, key, [("le", "+Inf")])} {self.count}')
+        lines.append(f'{name}_sum{_label_text(labelnames, key)} {self.sum}')
+        lines.append(f'{name}_count{_label_text(labelnames, key)} {self.count}')
+        return lines
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.default().observe(value)
+
+    def time(self):
+        return _Timer(self.default())
+
+
+CIDB_ROWS_IMPORTED = Counter(
+    'estimator_cidb_rows_imported_total', 'CIDB price rows imported.', ['kind', 'result'],
+)
+ITEMS_MATCHED = Counter(
+    'estimator_items_matched_total', 'BoQ rows matched (or not) against CIDB prices or project items.',
+    ['stage', 'result'],
+)
+MODELS_FITTED = Counter(
+    'estimator_forecast_models_fitted_total', 'Forecast models fitted.', ['model'],
+)
+FORECAST_DURATION = Histogram(
+    'estimator_forecast_duration_seconds', 'Time to run a project forecast.',
+)
+BOQ_UPLOAD_DURATION = Histogram(
+    'estimator_boq_upload_duration_seconds', 'Time to parse and store an uploaded BoQ.',
+)
+EXPORT_BYTES = Counter(
+    'estimator_export_bytes_total', 'Bytes produced by exports and reports.', ['format'],
+)
@@ -0,0 +1,231 @@
+import json
+import logging
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import FileResponse
+from django.urls import reverse
+
+from . import profiling
+from .exports import aread_chunks
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGET = {'queries': 50, 'sql_ms': 500, 'total_ms': 2000, 'peak_kb': None}
+
+
+class QueryRecorder:
+    """``execute_wrapper`` hook counting and timing every SQL statement."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+class RequestBudgetMiddleware:
+    """Measure SQL count/time, total time and peak allocations per request.
+
+    Numbers go out as a ``Server-Timing`` header. Requests over the budget for
+    their URL name (``PERF_BUDGETS``, falling back to ``'default'``) are logged
+    as a JSON record on the ``estimator.middleware`` logger. Peak memory is only
+    traced when ``PERF_TRACE_MEMORY`` is on, since tracemalloc slows every
+    allocation; it is process-wide, so concurrent requests share the peak.
+
+    Under ASGI the query hook is installed from the request's sync thread,
+    which is where Django runs the ORM for both sync and async views.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.budgets = getattr(settings, 'PERF_BUDGETS', {})
+        self.trace_memory = getattr(settings, 'PERF_TRACE_MEMORY', False)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder, hooks, start = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            hooks.close()
+        return self.finish(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        recorder, hooks, start = await sync_to_async(self.start)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(hooks.close)()
+        return self.finish(request, response, recorder, start)
+
+    def start(self):
+        recorder = QueryRecorder()
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        hooks = ExitStack()
+        for connection in connections.all():
+            hooks.enter_context(connection.execute_wrapper(recorder))
+        return recorder, hooks, time.perf_counter()
+
+    def finish(self, request, response, recorder, start):
+        total = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if self.trace_memory else None
+
+        metrics = {
+            'queries': recorder.count,
+            'sql_ms': round(recorder.seconds * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+            'peak_kb': round(peak / 1024) if peak is not None else None,
+        }
+        response['Server-Timing'] = self.server_timing(metrics)
+
+        url_name = request.resolver_match.url_name if request.resolver_match else None
+        over = self.over_budget(url_name, metrics)
+        if over:
+            record = {
+                'event': 'perf_budget_exceeded',
+                'url_name': url_name,
+                'path': request.path,
+                'method': request.method,
+                'status': response.status_code,
+                'over': over,
+                **metrics,
+            }
+            logger.warning(json.dumps(record), extra={'perf': record})
+        return response
+
+    def budget_for(self, url_name):
+        budget = dict(DEFAULT_BUDGET)
+        budget.update(self.budgets.get('default', {}))
+        if url_name:
+            budget.update(self.budgets.get(url_name, {}))
+        return budget
+
+    def over_budget(self, url_name, metrics):
+        """Names of the metrics that exceed their budget."""
+        budget = self.budget_for(url_name)
+        return [
+            key for key, limit in budget.items()
+            if limit is not None and metrics.get(key) is not None and metrics[key] > limit
+        ]
+
+    @staticmethod
+    def server_timing(metrics):
+        parts = [
+            f'db;dur={metrics["sql_ms"]};desc="{metrics["queries"]} queries"',
+            f'total;dur={metrics["total_ms"]}',
+        ]
+        if metrics['peak_kb'] is not None:
+            parts.append(f'mem;desc="peak {metrics["peak_kb"]} KB"')
+        return ', '.join(parts)
+
+
+class RequestProfileMiddleware:
+    """Run one request under cProfile when a staff user asks for it.
+
+    Add ``?_profile=1`` to the URL or send an ``X-Profile: 1`` header. The
+    artifacts are stored under ``PROFILE_STORAGE_DIR`` (outside MEDIA_ROOT,
+    served only by the staff profile views) and the response gets
+    ``X-Profile-Id`` plus ``X-Profile-Url`` pointing at the text summary.
+    Must come after AuthenticationMiddleware. Only the view and the
+    middlewares below this one are profiled; for streaming responses that
+    excludes producing the body. Under ASGI the profiler runs in the
+    request's sync thread, so it sees sync views and ORM work but not
+    coroutine code.
+    """
+
+    QUERY_PARAM = '_profile'
+    HEADER = 'X-Profile'
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not (self.flagged(request) and request.user.is_staff):
+            return self.get_response(request)
+
+        capture = profiling.Capture()
+        capture.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            capture.stop()
+        return self.attach(response, profiling.store(capture))
+
+    async def __acall__(self, request):
+        if not (self.flagged(request) and (await request.auser()).is_staff):
+            return await self.get_response(request)
+
+        # Created in the sync thread so the sampler watches that thread.
+        capture = await sync_to_async(profiling.Capture)()
+        await sync_to_async(capture.start)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(capture.stop)()
+        return self.attach(response, await sync_to_async(profiling.store)(capture))
+
+    def flagged(self, request):
+        flag = request.GET.get(self.QUERY_PARAM) or request.headers.get(self.HEADER)
+        return bool(flag) and flag.lower() not in ('0', 'false', 'no')
+
+    @staticmethod
+    def attach(response, profile_id):
+        response['X-Profile-Id'] = profile_id
+        response['X-Profile-Url'] = reverse('profile_download', args=[profile_id, 'txt'])
+        return response
+
+
+class ASGIFileStreamMiddleware:
+    """Stream file responses chunk by chunk under ASGI.
+
+    Django's ASGI handler reads a synchronous streaming body into a list
+    before sending it, which would hold whole exports and report packs in
+    memory. Under ASGI, ``FileResponse`` bodies are swapped for an async
+    reader; under WSGI the middleware does nothing.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if isinstance(response, FileResponse) and not response.is_async and response.file_to_stream is not None:
+            # Headers (length, disposition) were set from the file already; only the body changes.
+            response.streaming_content = aread_chunks(response.file_to_stream, response.block_size)
+        return response
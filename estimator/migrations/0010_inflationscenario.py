@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 03:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estimator', '0009_cidbupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InflationScenario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inflation_scenarios', to='estimator.project')),
+            ],
+            options={
+                'ordering': ['rate', 'name'],
+                'unique_together': {('project', 'name')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-19 03:49
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estimator', '0010_inflationscenario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectSummary',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='estimator.project')),
+                ('estimated_cost', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('original_estimated_cost', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('cidb_cost', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('actual_cost', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('sections', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('stale', models.BooleanField(db_index=True, default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,93 @@
+from django.db import migrations
+
+# The DDL is inlined rather than imported from estimator.search, so later
+# changes there cannot alter this migration.
+ITEM_FTS_TABLE = 'estimator_projectitem_fts'
+PROJECT_FTS_TABLE = 'estimator_project_fts'
+
+SQLITE_FTS_SQL = [
+    f"CREATE VIRTUAL TABLE {ITEM_FTS_TABLE} USING fts5("
+    "section, description, content='estimator_projectitem', content_rowid='id')",
+    f"CREATE TRIGGER estimator_projectitem_fts_ai AFTER INSERT ON estimator_projectitem BEGIN "
+    f"INSERT INTO {ITEM_FTS_TABLE}(rowid, section, description) VALUES (new.id, new.section, new.description); END",
+    f"CREATE TRIGGER estimator_projectitem_fts_ad AFTER DELETE ON estimator_projectitem BEGIN "
+    f"INSERT INTO {ITEM_FTS_TABLE}({ITEM_FTS_TABLE}, rowid, section, description) "
+    f"VALUES ('delete', old.id, old.section, old.description); END",
+    f"CREATE TRIGGER estimator_projectitem_fts_au AFTER UPDATE OF section, description ON estimator_projectitem BEGIN "
+    f"INSERT INTO {ITEM_FTS_TABLE}({ITEM_FTS_TABLE}, rowid, section, description) "
+    f"VALUES ('delete', old.id, old.section, old.description); "
+    f"INSERT INTO {ITEM_FTS_TABLE}(rowid, section, description) VALUES (new.id, new.section, new.description); END",
+    f"INSERT INTO {ITEM_FTS_TABLE}({ITEM_FTS_TABLE}) VALUES ('rebuild')",
+
+    f"CREATE VIRTUAL TABLE {PROJECT_FTS_TABLE} USING fts5(name, content='estimator_project', content_rowid='id')",
+    f"CREATE TRIGGER estimator_project_fts_ai AFTER INSERT ON estimator_project BEGIN "
+    f"INSERT INTO {PROJECT_FTS_TABLE}(rowid, name) VALUES (new.id, new.name); END",
+    f"CREATE TRIGGER estimator_project_fts_ad AFTER DELETE ON estimator_project BEGIN "
+    f"INSERT INTO {PROJECT_FTS_TABLE}({PROJECT_FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name); END",
+    f"CREATE TRIGGER estimator_project_fts_au AFTER UPDATE OF name ON estimator_project BEGIN "
+    f"INSERT INTO {PROJECT_FTS_TABLE}({PROJECT_FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name); "
+    f"INSERT INTO {PROJECT_FTS_TABLE}(rowid, name) VALUES (new.id, new.name); END",
+    f"INSERT INTO {PROJECT_FTS_TABLE}({PROJECT_FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_FTS_DROP_SQL = [
+    "DROP TRIGGER IF EXISTS estimator_projectitem_fts_ai",
+    "DROP TRIGGER IF EXISTS estimator_projectitem_fts_ad",
+    "DROP TRIGGER IF EXISTS estimator_projectitem_fts_au",
+    f"DROP TABLE IF EXISTS {ITEM_FTS_TABLE}",
+    "DROP TRIGGER IF EXISTS estimator_project_fts_ai",
+    "DROP TRIGGER IF EXISTS estimator_project_fts_ad",
+    "DROP TRIGGER IF EXISTS estimator_project_fts_au",
+    f"DROP TABLE IF EXISTS {PROJECT_FTS_TABLE}",
+]
+
+MYSQL_FTS_SQL = [
+    "ALTER TABLE estimator_projectitem ADD FULLTEXT INDEX estimator_projectitem_ft (section, description)",
+    "ALTER TABLE estimator_project ADD FULLTEXT INDEX estimator_project_ft (name)",
+]
+
+MYSQL_FTS_DROP_SQL = [
+    "ALTER TABLE estimator_projectitem DROP INDEX estimator_projectitem_ft",
+    "ALTER TABLE estimator_project DROP INDEX estimator_project_ft",
+]
+
+
+def sqlite_has_fts5(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return any('FTS5' in row[0] for row in cursor.fetchall())
+
+
+def create_fulltext_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite' and sqlite_has_fts5(schema_editor.connection):
+        statements = SQLITE_FTS_SQL
+    elif vendor == 'mysql':
+        statements = MYSQL_FTS_SQL
+    else:
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_fulltext_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements = SQLITE_FTS_DROP_SQL
+    elif vendor == 'mysql':
+        statements = MYSQL_FTS_DROP_SQL
+    else:
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estimator', '0011_projectsummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_indexes, drop_fulltext_indexes),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.7 on 2026-10-19 03:57
+
+import django.db.models.deletion
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def backfill_rollups(apps, schema_editor):
+    Project = apps.get_model('estimator', 'Project')
+    MonthlyCostRollup = apps.get_model('estimator', 'MonthlyCostRollup')
+    buckets = (
+        Project.objects.annotate(month=TruncMonth('upload_date'))
+        .values('month', 'uploaded_by_id')
+        .annotate(
+            project_count=Count('pk'),
+            estimated_cost=Sum('estimated_cost'),
+            cidb_cost=Sum('cidb_cost'),
+            actual_cost=Sum('actual_cost'),
+        )
+        .order_by()
+    )
+    MonthlyCostRollup.objects.bulk_create([
+        MonthlyCostRollup(
+            month=bucket['month'].date(),
+            uploaded_by_id=bucket['uploaded_by_id'],
+            project_count=bucket['project_count'],
+            estimated_cost=bucket['estimated_cost'] or Decimal('0'),
+            cidb_cost=bucket['cidb_cost'] or Decimal('0'),
+            actual_cost=bucket['actual_cost'] or Decimal('0'),
+        )
+        for bucket in buckets
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estimator', '0012_fulltext_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyCostRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the upload month')),
+                ('estimated_cost', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('cidb_cost', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('actual_cost', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('project_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('uploaded_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_rollups', to='estimator.userprofile')),
+            ],
+            options={
+                'ordering': ['month'],
+                'unique_together': {('month', 'uploaded_by')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
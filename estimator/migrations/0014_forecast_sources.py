@@ -0,0 +1,90 @@
+# Generated by Django 5.2.7 on 2026-10-19 03:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+PREFIXES = (('MATERIAL: ', 'material'), ('LABOUR: ', 'labour'))
+
+
+def backfill_forecast_sources(apps, schema_editor):
+    """Parse 'MATERIAL: <desc>' / 'LABOUR: <desc>' labels into item and price series references."""
+    Forecast = apps.get_model('estimator', 'Forecast')
+    ProjectItem = apps.get_model('estimator', 'ProjectItem')
+    series = {
+        'material': apps.get_model('estimator', 'MaterialPrice'),
+        'labour': apps.get_model('estimator', 'LabourRate'),
+    }
+    # Lower-cased description -> description as stored in the price table.
+    descriptions = {
+        kind: {d.lower(): d for d in model.objects.exclude(description=None).values_list('description', flat=True).distinct()}
+        for kind, model in series.items()
+    }
+    items_project_id, items = None, {}
+
+    batch = []
+    for forecast in Forecast.objects.order_by('project_id', 'pk').iterator():
+        label = forecast.material_description
+        # train_forecast stores bare material descriptions without a prefix.
+        kind, description = 'material', label
+        for prefix, prefix_kind in PREFIXES:
+            if label.startswith(prefix):
+                kind, description = prefix_kind, label[len(prefix):]
+                break
+        key = description.lower()
+        forecast.source_kind = kind
+        forecast.source_description = descriptions[kind].get(key, description)[:255]
+
+        if forecast.project_id:
+            if forecast.project_id != items_project_id:
+                items_project_id, items = forecast.project_id, {}
+                for pk, item_description in (
+                    ProjectItem.objects.filter(project_id=forecast.project_id)
+                    .order_by('pk').values_list('pk', 'description')
+                ):
+                    items.setdefault(item_description.lower(), pk)
+            forecast.project_item_id = items.get(key)
+
+        batch.append(forecast)
+        if len(batch) >= 1000:
+            Forecast.objects.bulk_update(batch, ['source_kind', 'source_description', 'project_item'])
+            batch = []
+    if batch:
+        Forecast.objects.bulk_update(batch, ['source_kind', 'source_description', 'project_item'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estimator', '0013_monthlycostrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forecast',
+            name='project_item',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='forecasts', to='estimator.projectitem'),
+        ),
+        migrations.AddField(
+            model_name='forecast',
+            name='source_description',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='forecast',
+            name='source_kind',
+            field=models.CharField(blank=True, choices=[('material', 'Material'), ('labour', 'Labour')], max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='forecast',
+            index=models.Index(fields=['source_kind', 'source_description'], name='estimator_f_source__3ffffb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labourrate',
+            index=models.Index(fields=['description', 'year', 'quarter'], name='estimator_l_descrip_53e716_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materialprice',
+            index=models.Index(fields=['description', 'year', 'quarter'], name='estimator_m_descrip_bb3e0d_idx'),
+        ),
+        migrations.RunPython(backfill_forecast_sources, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estimator', '0014_forecast_sources'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, help_text='Hash of the project data the file was built from', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='last_accessed',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='size',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
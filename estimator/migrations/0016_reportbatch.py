@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estimator', '0015_report_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('project_ids', models.JSONField(default=list)),
+                ('formats', models.JSONField(default=list)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('completed', models.PositiveIntegerField(default=0)),
+                ('archive_path', models.CharField(blank=True, max_length=255)),
+                ('error', models.TextField(blank=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='estimator.userprofile')),
+            ],
+            options={
+                'verbose_name_plural': 'Report batches',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
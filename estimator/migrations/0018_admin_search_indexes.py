@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estimator', '0017_userprofile_avatar_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='forecast',
+            index=models.Index(fields=['material_description'], name='estimator_f_materia_3e283b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='forecast',
+            index=models.Index(fields=['year', 'quarter'], name='estimator_f_year_734ff6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labourrate',
+            index=models.Index(fields=['section'], name='estimator_l_section_6878bc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labourrate',
+            index=models.Index(fields=['year', 'quarter'], name='estimator_l_year_18952e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materialprice',
+            index=models.Index(fields=['section'], name='estimator_m_section_cad4a3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materialprice',
+            index=models.Index(fields=['year', 'quarter'], name='estimator_m_year_e49029_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['name'], name='estimator_p_name_a4cf4c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projectitem',
+            index=models.Index(fields=['description'], name='estimator_p_descrip_a9febe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projectitem',
+            index=models.Index(fields=['section'], name='estimator_p_section_314466_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:49
+
+from django.db import migrations, models
+
+
+def drop_duplicate_reports(apps, schema_editor):
+    """Keep the newest row of each (project, report_type, content_hash) before it becomes unique."""
+    Report = apps.get_model('estimator', 'Report')
+    seen = set()
+    duplicates = []
+    rows = Report.objects.order_by('-generated_at', '-pk').values_list('pk', 'project_id', 'report_type', 'content_hash')
+    for pk, *key in rows.iterator():
+        if tuple(key) in seen:
+            duplicates.append(pk)
+        seen.add(tuple(key))
+    Report.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estimator', '0019_dataset_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='report',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, help_text='Hash of the project and summary versions the file was built from', max_length=64),
+        ),
+        migrations.RunPython(drop_duplicate_reports, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='report',
+            constraint=models.UniqueConstraint(fields=('project', 'report_type', 'content_hash'), name='estimator_report_version_unique'),
+        ),
+    ]
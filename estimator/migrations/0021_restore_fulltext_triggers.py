@@ -0,0 +1,55 @@
+from django.db import migrations
+
+# On SQLite, 0019 added columns to estimator_project and estimator_projectitem by
+# rebuilding both tables, which silently dropped the FTS5 sync triggers of 0012.
+# Recreate them and rebuild the indexes from the tables. Inlined like 0012.
+ITEM_FTS_TABLE = 'estimator_projectitem_fts'
+PROJECT_FTS_TABLE = 'estimator_project_fts'
+
+SQLITE_TRIGGER_SQL = [
+    "DROP TRIGGER IF EXISTS estimator_projectitem_fts_ai",
+    "DROP TRIGGER IF EXISTS estimator_projectitem_fts_ad",
+    "DROP TRIGGER IF EXISTS estimator_projectitem_fts_au",
+    f"CREATE TRIGGER estimator_projectitem_fts_ai AFTER INSERT ON estimator_projectitem BEGIN "
+    f"INSERT INTO {ITEM_FTS_TABLE}(rowid, section, description) VALUES (new.id, new.section, new.description); END",
+    f"CREATE TRIGGER estimator_projectitem_fts_ad AFTER DELETE ON estimator_projectitem BEGIN "
+    f"INSERT INTO {ITEM_FTS_TABLE}({ITEM_FTS_TABLE}, rowid, section, description) "
+    f"VALUES ('delete', old.id, old.section, old.description); END",
+    f"CREATE TRIGGER estimator_projectitem_fts_au AFTER UPDATE OF section, description ON estimator_projectitem BEGIN "
+    f"INSERT INTO {ITEM_FTS_TABLE}({ITEM_FTS_TABLE}, rowid, section, description) "
+    f"VALUES ('delete', old.id, old.section, old.description); "
+    f"INSERT INTO {ITEM_FTS_TABLE}(rowid, section, description) VALUES (new.id, new.section, new.description); END",
+    f"INSERT INTO {ITEM_FTS_TABLE}({ITEM_FTS_TABLE}) VALUES ('rebuild')",
+
+    "DROP TRIGGER IF EXISTS estimator_project_fts_ai",
+    "DROP TRIGGER IF EXISTS estimator_project_fts_ad",
+    "DROP TRIGGER IF EXISTS estimator_project_fts_au",
+    f"CREATE TRIGGER estimator_project_fts_ai AFTER INSERT ON estimator_project BEGIN "
+    f"INSERT INTO {PROJECT_FTS_TABLE}(rowid, name) VALUES (new.id, new.name); END",
+    f"CREATE TRIGGER estimator_project_fts_ad AFTER DELETE ON estimator_project BEGIN "
+    f"INSERT INTO {PROJECT_FTS_TABLE}({PROJECT_FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name); END",
+    f"CREATE TRIGGER estimator_project_fts_au AFTER UPDATE OF name ON estimator_project BEGIN "
+    f"INSERT INTO {PROJECT_FTS_TABLE}({PROJECT_FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name); "
+    f"INSERT INTO {PROJECT_FTS_TABLE}(rowid, name) VALUES (new.id, new.name); END",
+    f"INSERT INTO {PROJECT_FTS_TABLE}({PROJECT_FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def restore_fulltext_triggers(apps, schema_editor):
+    connection = schema_editor.connection
+    # Nothing to restore where 0012 created no FTS5 tables (other backends, SQLite without FTS5).
+    if connection.vendor != 'sqlite' or ITEM_FTS_TABLE not in connection.introspection.table_names():
+        return
+    for sql in SQLITE_TRIGGER_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estimator', '0020_report_version_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(restore_fulltext_triggers, migrations.RunPython.noop),
+    ]
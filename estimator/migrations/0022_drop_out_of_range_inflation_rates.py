@@ -0,0 +1,26 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Q
+
+# SQLite doesn't enforce max_digits, so before the project page validated rates it could store
+# NaN or values beyond ±999.99, which then fail to load and break the project page.
+# (A text 'NaN' compares greater than any number in SQLite, so the range filter catches it too.)
+LIMIT = Decimal('999.99')
+
+
+def drop_out_of_range_rates(apps, schema_editor):
+    out_of_range = Q(rate__gt=LIMIT) | Q(rate__lt=-LIMIT)
+    for model_name in ('InflationScenario', 'InflationRate'):
+        apps.get_model('estimator', model_name).objects.filter(out_of_range).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estimator', '0021_restore_fulltext_triggers'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_out_of_range_rates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:18
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estimator', '0022_drop_out_of_range_inflation_rates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dataset', models.CharField(help_text='Key of exports.DATASETS the row belonged to', max_length=30)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('updated_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, help_text='When the row was deleted')),
+            ],
+        ),
+    ]
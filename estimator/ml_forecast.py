@@ -1,14 +1,36 @@
-import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor
 from django.db import transaction
 from .models import ProjectItem, Forecast, MaterialPrice, LabourRate, Project
-import numpy as np
+from .metrics import FORECAST_DURATION, MODELS_FITTED
+from . import lazy
 import logging
 
 logger = logging.getLogger(__name__)
 
+def training_series(history, description):
+    """Pick the one price series to fit from ``history`` (a price queryset).
+
+    The icontains strategies can match several descriptions ("Cement" also
+    finds "Cement mortar"); mixing them would fit a meaningless curve and make
+    the stored source_description arbitrary. Rows are grouped by description,
+    case-insensitively, and the group equal to ``description`` wins, else the
+    longest. Returns (the series' latest description, its rows).
+    """
+    groups = {}
+    for row in history.values('quarter', 'year', 'rate', 'description'):
+        groups.setdefault((row['description'] or '').casefold(), []).append(row)
+    if not groups:
+        return description, []
+    key = description.casefold()
+    if key not in groups:
+        key = max(groups, key=lambda k: len(groups[k]))
+    rows = groups[key]
+    return rows[-1]['description'] or description, rows
+
+
+@FORECAST_DURATION.time()
 def run_forecast(project_id):
+    np = lazy.numpy()
+    LinearRegression, RandomForestRegressor = lazy.sklearn_regressors()
     project = Project.objects.get(pk=project_id)
     items = ProjectItem.objects.filter(project=project)
     forecasts = []
@@ -16,9 +38,10 @@ def run_forecast(project_id):
     material_next_q, material_next_y = MaterialPrice.next_quarter()
     labour_next_q, labour_next_y = LabourRate.next_quarter()
     
-    print(f"🔮 Forecasting materials for {material_next_q} {material_next_y}")
-    print(f"🔮 Forecasting labour for {labour_next_q} {labour_next_y}")
-    print(f"📋 Processing {items.count()} project items")
+    logger.info(
+        "Forecasting project %s: materials for %s %s, labour for %s %s",
+        project_id, material_next_q, material_next_y, labour_next_q, labour_next_y,
+    )
 
     Forecast.objects.filter(project=project).delete()
 
@@ -26,7 +49,7 @@ def run_forecast(project_id):
     labour_processed = 0
     
     for item in items:
-        print(f"🔍 Processing: {item.description} (Section: {item.section})")
+        logger.debug("Processing: %s (Section: %s)", item.description, item.section)
         
         material_history = None
         labour_history = None
@@ -63,39 +86,23 @@ def run_forecast(project_id):
             ).order_by('year', 'quarter'),
         ]
         
-        material_exact = MaterialPrice.objects.filter(
-            section=item.section,
-            description__iexact=item.description
-        )
-        labour_exact = LabourRate.objects.filter(
-            section=item.section,
-            description__iexact=item.description
-        )
-        
-        print(f"   🔎 Material exact match: {material_exact.count()} records")
-        print(f"   🔎 Labour exact match: {labour_exact.count()} records")
-        
         for i, strategy in enumerate(material_strategies):
-            potential_history = strategy()
-            if potential_history.count() >= 2:
+            source_description, potential_history = training_series(strategy(), item.description)
+            if len(potential_history) >= 2:
                 material_history = potential_history
-                print(f"   ✅ Found {material_history.count()} MATERIAL records using strategy {i+1}")
+                logger.debug("Found MATERIAL history for %s using strategy %s", item.description, i + 1)
                 break
         
         if not material_history:
             for i, strategy in enumerate(labour_strategies):
-                potential_history = strategy()
-                if potential_history.count() >= 2:
+                source_description, potential_history = training_series(strategy(), item.description)
+                if len(potential_history) >= 2:
                     labour_history = potential_history
-                    print(f"   ✅ Found {labour_history.count()} LABOUR records using strategy {i+1}")
+                    logger.debug("Found LABOUR history for %s using strategy %s", item.description, i + 1)
                     break
         
         if not material_history and not labour_history:
-            print(f"   ❌ No historical data found for: {item.description}")
-            material_any = MaterialPrice.objects.filter(description__icontains=item.description)
-            labour_any = LabourRate.objects.filter(description__icontains=item.description)
-            print(f"   🔍 Material any match: {material_any.count()} records")
-            print(f"   🔍 Labour any match: {labour_any.count()} records")
+            logger.debug("No historical data found for: %s", item.description)
             continue
 
         history = material_history or labour_history
@@ -104,13 +111,9 @@ def run_forecast(project_id):
         next_y = material_next_y if material_history else labour_next_y
 
         try:
-            df = pd.DataFrame(list(history.values('quarter', 'year', 'rate')))
-            
-            df = df.sort_values(['year', 'quarter'])
-            df['time_index'] = range(len(df))
-            
-            X = df[['time_index']].values
-            y = df['rate'].values
+            # The strategies already order the rows by (year, quarter).
+            y = np.array([float(row['rate']) for row in history])
+            X = np.arange(len(y)).reshape(-1, 1)
 
             if len(X) < 3:
                 X_train, y_train = X, y
@@ -129,11 +132,13 @@ def run_forecast(project_id):
                 # Linear Regression
                 lr = LinearRegression()
                 lr.fit(X_train, y_train)
+                MODELS_FITTED.labels(model='linear').inc()
                 lr_pred = max(0, float(lr.predict([[len(X)]])[0]))
                 
                 # Random Forest
                 rf = RandomForestRegressor(n_estimators=10, random_state=42)
                 rf.fit(X_train, y_train)
+                MODELS_FITTED.labels(model='random_forest').inc()
                 rf_pred = max(0, float(rf.predict([[len(X)]])[0]))
 
             reasonable_range = (0.1, 1000000)
@@ -141,7 +146,10 @@ def run_forecast(project_id):
             if reasonable_range[0] <= lr_pred <= reasonable_range[1]:
                 forecasts.append(Forecast(
                     project=project,
+                    project_item=item,
                     material_description=f"{forecast_type.upper()}: {item.description}",
+                    source_kind=forecast_type,
+                    source_description=source_description,
                     model_type='linear',
                     quarter=next_q,
                     year=next_y,
@@ -151,13 +159,16 @@ def run_forecast(project_id):
                     materials_processed += 1
                 else:
                     labour_processed += 1
-                print(f"   📈 Linear forecast: RM{lr_pred:.2f} ({forecast_type})")
+                logger.debug("Linear forecast for %s: RM%.2f (%s)", item.description, lr_pred, forecast_type)
 
             if reasonable_range[0] <= rf_pred <= reasonable_range[1]:
                 forecasts.append(Forecast(
                     project=project,
+                    project_item=item,
                     material_description=f"{forecast_type.upper()}: {item.description}",
-                    model_type='random_forest', 
+                    source_kind=forecast_type,
+                    source_description=source_description,
+                    model_type='random_forest',
                     quarter=next_q,
                     year=next_y,
                     forecasted_price=round(rf_pred, 2)
@@ -166,16 +177,19 @@ def run_forecast(project_id):
                     materials_processed += 1
                 else:
                     labour_processed += 1
-                print(f"   🌲 Random Forest forecast: RM{rf_pred:.2f} ({forecast_type})")
+                logger.debug("Random Forest forecast for %s: RM%.2f (%s)", item.description, rf_pred, forecast_type)
 
         except Exception as e:
-            print(f"   ❌ Error forecasting {item.description}: {str(e)}")
+            logger.warning("Error forecasting %s: %s", item.description, e)
             continue
 
     if forecasts:
         Forecast.objects.bulk_create(forecasts)
-        print(f"🎯 Created {len(forecasts)} forecasts for {materials_processed} materials and {labour_processed} labour items")
+        logger.info(
+            "Created %s forecasts for %s materials and %s labour items",
+            len(forecasts), materials_processed, labour_processed,
+        )
     else:
-        print("⚠️  No forecasts created")
+        logger.warning("No forecasts created for project %s", project_id)
 
     return len(forecasts)
\ No newline at end of file
@@ -1,5 +1,8 @@
-from django.db import models
+from django.db import models, connection
+from django.db.models import Sum, Count, F, Q, Value, ExpressionWrapper
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 from django.utils import timezone
@@ -7,6 +10,7 @@ from django.core.files.uploadedfile import InMemoryUploadedFile
 from PIL import Image
 import io
 import decimal
+import datetime
 
 
 class MaterialPrice(models.Model):
@@ -18,9 +22,17 @@ class MaterialPrice(models.Model):
     rate = models.DecimalField(max_digits=10, decimal_places=2)
     unit = models.CharField(max_length=20)
     remarks = models.TextField(blank=True, null=True)
+    # Watermark for incremental dataset exports (exports.DATASETS).
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ('quarter', 'year', 'section', 'sn', 'description')
+        indexes = [
+            models.Index(fields=['description', 'year', 'quarter']),
+            # Admin: prefix search on section, year/section filters.
+            models.Index(fields=['section']),
+            models.Index(fields=['year', 'quarter']),
+        ]
 
     def __str__(self):
         return f"{self.section} - {self.description} ({self.quarter} {self.year})"
@@ -45,9 +57,16 @@ class LabourRate(models.Model):
     rate = models.DecimalField(max_digits=10, decimal_places=2)
     unit = models.CharField(max_length=20)
     remarks = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ('quarter', 'year', 'section', 'sn', 'description')
+        indexes = [
+            models.Index(fields=['description', 'year', 'quarter']),
+            # Admin: prefix search on section, year/section filters.
+            models.Index(fields=['section']),
+            models.Index(fields=['year', 'quarter']),
+        ]
 
     def __str__(self):
         return f"{self.section} - {self.description} ({self.quarter} {self.year})"
@@ -76,9 +95,15 @@ class UserProfile(models.Model):
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
     phone = models.CharField(max_length=15, blank=True)
     company = models.CharField(max_length=100, blank=True)
+    # sha256 of the avatar, set once its thumbnails exist (see estimator/avatars.py).
+    avatar_hash = models.CharField(max_length=64, blank=True, editable=False)
 
     def save(self, *args, **kwargs):
-        if self.avatar:
+        # Only a newly assigned upload is uncommitted; re-saving a stored avatar must not decode it.
+        self.avatar_changed = bool(self.avatar) and not self.avatar._committed
+        if self.avatar_changed or not self.avatar:
+            self.avatar_hash = ''
+        if self.avatar_changed:
             img = Image.open(self.avatar)
             if img.height > 300 or img.width > 300:
                 img.thumbnail((300, 300))
@@ -115,6 +140,10 @@ class Project(models.Model):
     inflation_quarter = models.CharField(max_length=10, blank=True, null=True)
     inflation_year = models.IntegerField(blank=True, null=True)
     inflation_multiplier = models.DecimalField(max_digits=5, decimal_places=3, default=Decimal('1.000'))
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['name'])]
 
     def save(self, *args, **kwargs):
         if self.start_date and self.end_date:
@@ -142,6 +171,18 @@ class Project(models.Model):
         return f"{self.name} ({self.uploaded_by.user.username})"
 
 
+class ProjectItemQuerySet(models.QuerySet):
+    def with_costs(self):
+        """Annotate est_cost, original_est_cost, cidb_cost and variance for each line."""
+        money = models.DecimalField(max_digits=15, decimal_places=2)
+        zero = Value(Decimal('0'), output_field=money)
+        return self.annotate(
+            est_cost=ExpressionWrapper(F('quantity') * F('rate'), output_field=money),
+            original_est_cost=ExpressionWrapper(F('quantity') * Coalesce('original_rate', 'rate'), output_field=money),
+            cidb_cost=ExpressionWrapper(F('quantity') * Coalesce('cidb_rate', zero), output_field=money),
+        ).annotate(variance=ExpressionWrapper(F('est_cost') - F('cidb_cost'), output_field=money))
+
+
 class ProjectItem(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='estimate_items')
     section = models.CharField(max_length=100)
@@ -153,6 +194,9 @@ class ProjectItem(models.Model):
     amount = models.DecimalField(max_digits=15, decimal_places=2)
     cidb_rate = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     cidb_amount = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = ProjectItemQuerySet.as_manager()
 
     def save(self, *args, **kwargs):
         if self.cidb_amount is None:
@@ -165,6 +209,8 @@ class ProjectItem(models.Model):
             
     class Meta:
         unique_together = ('project', 'section', 'description')
+        # Admin: prefix search on description (also ActualItem's), section filter.
+        indexes = [models.Index(fields=['description']), models.Index(fields=['section'])]
 
     def __str__(self):
         return f"{self.section} – {self.description}"
@@ -175,20 +221,248 @@ class ActualItem(models.Model):
     quantity_actual = models.DecimalField(max_digits=12, decimal_places=3, null=True, blank=True)
     rate_actual = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     amount_actual = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def compute_amount(self, project_item):
+        """Actual quantity x rate, falling back to the estimate for whichever is blank."""
+        qty = self.quantity_actual if self.quantity_actual is not None else project_item.quantity
+        rate = self.rate_actual if self.rate_actual is not None else project_item.rate
+        return round(qty * rate, 2)
 
     def save(self, *args, **kwargs):
-        qty = self.quantity_actual if self.quantity_actual is not None else self.project_item.quantity
-        rate = self.rate_actual if self.rate_actual is not None else self.project_item.rate
-        self.amount_actual = round(qty * rate, 2)
+        self.amount_actual = self.compute_amount(self.project_item)
         super().save(*args, **kwargs)
 
+    @classmethod
+    def bulk_upsert(cls, actuals, batch_size=1000):
+        """Insert or update ``actuals`` keyed on project_item in batched INSERT ... ON CONFLICT statements.
+
+        Bypasses save() and signals: callers must set amount_actual and invalidate
+        the ProjectSummary themselves. updated_at is stamped by bulk_create.
+        """
+        if not actuals:
+            return
+        # MySQL upserts on any unique key and rejects an explicit conflict target.
+        unique_fields = ['project_item'] if connection.features.supports_update_conflicts_with_target else None
+        cls.objects.bulk_create(
+            actuals,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=['quantity_actual', 'rate_actual', 'amount_actual', 'updated_at'],
+        )
+
     def __str__(self):
         return f"Actual: {self.project_item}"
 
 
+class ProjectSummary(models.Model):
+    """Cached cost totals and section subtotals for a project.
+
+    Signals mark the row stale whenever items, actuals or inflation change
+    (once per project, after the request/transaction commits; bulk writers
+    call ``invalidate`` themselves); ``for_project`` rebuilds it on the next
+    read, so totals cost a single-row read until the project is edited again.
+    """
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    estimated_cost = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    original_estimated_cost = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    cidb_cost = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    actual_cost = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    sections = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    stale = models.BooleanField(default=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def invalidate(cls, project_id):
+        cls.objects.filter(project_id=project_id).update(stale=True)
+
+    @classmethod
+    def for_project(cls, project):
+        summary = cls.objects.filter(project=project, stale=False).first()
+        if summary is None:
+            summary = cls.rebuild(project)
+        return summary
+
+    @classmethod
+    def refresh_stale(cls, projects):
+        """Rebuild the summaries of every project in ``projects`` that is missing or stale."""
+        for project in projects.filter(Q(summary__isnull=True) | Q(summary__stale=True)).order_by():
+            cls.rebuild(project)
+
+    @classmethod
+    def rebuild(cls, project):
+        rows = (
+            ProjectItem.objects.filter(project=project).with_costs()
+            .values('section')
+            .annotate(
+                estimated=Sum('est_cost'),
+                original_estimated=Sum('original_est_cost'),
+                cidb=Sum('cidb_cost'),
+                actual_amount=Sum('actual__amount_actual'),
+                actual_lines=Count('actual'),
+                items=Count('id'),
+            )
+            .order_by('section')
+        )
+        sections = []
+        totals = dict.fromkeys(['estimated', 'original_estimated', 'cidb', 'actual'], Decimal('0'))
+        item_count = actual_lines = 0
+        for row in rows:
+            row['actual'] = row.pop('actual_amount')
+            section = {key: Decimal(row[key] or 0).quantize(Decimal('0.01')) for key in totals}
+            section['section'] = row['section']
+            section['item_count'] = row['items']
+            section['variance'] = section['estimated'] - section['cidb']
+            sections.append(section)
+            for key in totals:
+                totals[key] += section[key]
+            item_count += row['items']
+            actual_lines += row['actual_lines']
+
+        # Projects without line-level actuals keep the lump-sum actual cost on Project.
+        actual_cost = totals['actual'] if actual_lines else (project.actual_cost or Decimal('0'))
+        values = {
+            'estimated_cost': totals['estimated'],
+            'original_estimated_cost': totals['original_estimated'],
+            'cidb_cost': totals['cidb'],
+            'actual_cost': actual_cost,
+            'item_count': item_count,
+            'sections': sections,
+            'stale': False,
+            'updated_at': timezone.now(),
+        }
+        # A plain UPDATE when the row exists (the usual case) instead of update_or_create's
+        # savepoint + SELECT ... FOR UPDATE + UPDATE; this runs inside GET requests.
+        if cls.objects.filter(project=project).update(**values):
+            summary = cls(project=project, **values)
+        else:
+            summary, _ = cls.objects.update_or_create(project=project, defaults=values)
+
+        # Keep the denormalized Project columns from drifting away from the items.
+        synced = {
+            'estimated_cost': summary.estimated_cost,
+            'cidb_cost': summary.cidb_cost,
+            'actual_cost': summary.actual_cost,
+        }
+        if any(getattr(project, field) != value for field, value in synced.items()):
+            synced['updated_at'] = timezone.now()
+            Project.objects.filter(pk=project.pk).update(**synced)
+            for field, value in synced.items():
+                setattr(project, field, value)
+            MonthlyCostRollup.refresh_for(project)
+        return summary
+
+    def section(self, name):
+        return next((s for s in self.sections if s['section'] == name), None)
+
+    def variance(self):
+        return round(self.estimated_cost - self.cidb_cost, 2)
+
+    def variance_actual_est(self):
+        if self.actual_cost:
+            return round(self.actual_cost - self.estimated_cost, 2)
+        return None
+
+    def profitability(self):
+        if self.actual_cost and self.estimated_cost:
+            return round((self.estimated_cost - self.actual_cost) / self.estimated_cost * 100, 2)
+        return None
+
+    def __str__(self):
+        return f"Summary: {self.project.name}"
+
+
+class MonthlyCostRollup(models.Model):
+    """Portfolio cost totals per upload month and uploader.
+
+    Refreshed one bucket at a time whenever a project in it is saved, deleted
+    or has its costs synced by ``ProjectSummary.rebuild``, so trend charts
+    read one row per month instead of scanning projects.
+    """
+    month = models.DateField(help_text="First day of the upload month")
+    uploaded_by = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='monthly_rollups')
+    estimated_cost = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    cidb_cost = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    actual_cost = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    project_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('month', 'uploaded_by')
+        ordering = ['month']
+
+    @staticmethod
+    def month_of(moment):
+        return timezone.localtime(moment).date().replace(day=1)
+
+    @classmethod
+    def refresh(cls, month, uploaded_by_id):
+        """Recompute a single (month, uploader) bucket from its projects."""
+        start = timezone.make_aware(datetime.datetime(month.year, month.month, 1))
+        if month.month == 12:
+            end = start.replace(year=month.year + 1, month=1)
+        else:
+            end = start.replace(month=month.month + 1)
+        zero = Value(Decimal('0'), output_field=models.DecimalField(max_digits=15, decimal_places=2))
+        totals = Project.objects.filter(
+            uploaded_by_id=uploaded_by_id, upload_date__gte=start, upload_date__lt=end,
+        ).aggregate(
+            project_count=Count('pk'),
+            estimated_cost=Coalesce(Sum('estimated_cost'), zero),
+            cidb_cost=Coalesce(Sum('cidb_cost'), zero),
+            actual_cost=Coalesce(Sum('actual_cost'), zero),
+        )
+        rollups = cls.objects.filter(month=month, uploaded_by_id=uploaded_by_id)
+        if not totals['project_count']:
+            rollups.delete()
+            return
+        totals['updated_at'] = timezone.now()
+        # Same single-UPDATE fast path as ProjectSummary.rebuild.
+        if not rollups.update(**totals):
+            cls.objects.update_or_create(month=month, uploaded_by_id=uploaded_by_id, defaults=totals)
+
+    @classmethod
+    def refresh_for(cls, project):
+        if project.upload_date and project.uploaded_by_id:
+            cls.refresh(cls.month_of(project.upload_date), project.uploaded_by_id)
+
+    @classmethod
+    def series(cls, uploaded_by=None):
+        """Monthly totals, oldest first, summed across uploaders unless one is given."""
+        rollups = cls.objects.all()
+        if uploaded_by is not None:
+            rollups = rollups.filter(uploaded_by=uploaded_by)
+        return (
+            rollups.values('month')
+            .annotate(
+                estimated=Sum('estimated_cost'),
+                cidb=Sum('cidb_cost'),
+                actual=Sum('actual_cost'),
+                projects=Sum('project_count'),
+            )
+            .order_by('month')
+        )
+
+    def __str__(self):
+        return f"{self.uploaded_by} {self.month:%Y-%m}"
+
+
 class Forecast(models.Model):
+    SOURCE_KINDS = [
+        ('material', 'Material'),
+        ('labour', 'Labour'),
+    ]
+
     project = models.ForeignKey(Project, on_delete=models.CASCADE, null=True, blank=True)  # ADD THIS FIELD
+    project_item = models.ForeignKey(
+        ProjectItem, on_delete=models.SET_NULL, null=True, blank=True, related_name='forecasts'
+    )
     material_description = models.CharField(max_length=255)
+    # The CIDB price series the forecast was fitted on: MaterialPrice or LabourRate rows with this description.
+    source_kind = models.CharField(max_length=10, choices=SOURCE_KINDS, blank=True)
+    source_description = models.CharField(max_length=255, blank=True)
     model_type = models.CharField(max_length=50, choices=[
         ('linear', 'Linear Regression'),
         ('random_forest', 'Random Forest'),
@@ -196,6 +470,18 @@ class Forecast(models.Model):
     quarter = models.CharField(max_length=10)
     year = models.IntegerField()
     forecasted_price = models.DecimalField(max_digits=10, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['source_kind', 'source_description']),
+            # Admin: prefix search on material_description, year filter.
+            models.Index(fields=['material_description']),
+            models.Index(fields=['year', 'quarter']),
+        ]
+
+    def source_model(self):
+        return {'material': MaterialPrice, 'labour': LabourRate}.get(self.source_kind)
 
     def __str__(self):
         return f"{self.material_description} - {self.model_type} ({self.quarter} {self.year})"
@@ -211,12 +497,81 @@ class InflationRate(models.Model):
         return f"{self.project.name} - {self.rate}%"
 
 
+class InflationScenario(models.Model):
+    """What-if inflation rate for a project; totals are computed on the fly, never written to items."""
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='inflation_scenarios')
+    name = models.CharField(max_length=100)
+    rate = models.DecimalField(max_digits=5, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('project', 'name')
+        ordering = ['rate', 'name']
+
+    def __str__(self):
+        return f"{self.project.name} - {self.name} ({self.rate}%)"
+
+
 class Report(models.Model):
+    """A generated report file cached on disk (see estimator.reports)."""
     project = models.ForeignKey(Project, on_delete=models.CASCADE)
     generated_by = models.ForeignKey(UserProfile, on_delete=models.SET_NULL, null=True)
     generated_at = models.DateTimeField(auto_now_add=True)
     file_path = models.CharField(max_length=255)
     report_type = models.CharField(max_length=50, choices=[('pdf', 'PDF'), ('excel', 'Excel')])
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True,
+                                    help_text="Hash of the project and summary versions the file was built from")
+    size = models.PositiveBigIntegerField(default=0)
+    last_accessed = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'report_type', 'content_hash'], name='estimator_report_version_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.project.name} ({self.report_type})"
+
+class ReportBatch(models.Model):
+    """A ZIP pack of reports for several projects, built by the generate_reports command."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    created_by = models.ForeignKey(UserProfile, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    project_ids = models.JSONField(default=list)
+    formats = models.JSONField(default=list)
+    total = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    archive_path = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = "Report batches"
+
+    def progress(self):
+        return round(self.completed * 100 / self.total) if self.total else 0
+
+    def __str__(self):
+        return f"Report batch {self.pk} ({self.status})"
+
+
+class ExportTombstone(models.Model):
+    """A row deleted from an exported dataset, so incremental (``since``) exports can propagate deletes.
+
+    Written in one batch when the deleting transaction commits (see ``exports.record_deletion``).
+    """
+    dataset = models.CharField(max_length=30, help_text="Key of exports.DATASETS the row belonged to")
+    object_id = models.PositiveBigIntegerField()
+    # Named like the exported models' column so export_dataset watermarks it the same way.
+    updated_at = models.DateTimeField(default=timezone.now, db_index=True, help_text="When the row was deleted")
 
     def __str__(self):
-        return f"{self.project.name} ({self.report_type})"
\ No newline at end of file
+        return f"{self.dataset} {self.object_id} deleted"
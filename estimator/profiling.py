@@ -0,0 +1,189 @@
+"""cProfile capture for management commands and single requests.
+
+Every capture produces three artifacts:
+
+* ``.pstats`` - cProfile data (``python -m pstats``, snakeviz, ...)
+* ``.collapsed`` - sampled call stacks in the collapsed format read by
+  flamegraph.pl / speedscope, one ``frame;frame;frame count`` line per stack
+* ``.txt`` - the top functions by cumulative time, for a quick look
+
+cProfile only records caller/callee pairs, so full stacks come from a
+sampler thread that snapshots the profiled thread every
+``PROFILE_SAMPLE_INTERVAL`` seconds.
+"""
+import cProfile
+import io
+import marshal
+import pstats
+import sys
+import threading
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+
+PROFILE_FORMATS = {
+    'pstats': 'application/octet-stream',
+    'collapsed': 'text/plain; charset=utf-8',
+    'txt': 'text/plain; charset=utf-8',
+}
+SUMMARY_LINES = 60
+
+
+class StackSampler(threading.Thread):
+    """Counts the collapsed call stacks of one thread, sampled at a fixed interval."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.finished = threading.Event()
+
+    def run(self):
+        while not self.finished.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def stop(self):
+        self.finished.set()
+        self.join()
+
+
+def collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Capture:
+    """Profile the current thread between start() and stop(), then render the artifacts."""
+
+    def __init__(self, interval=None):
+        self.interval = interval or getattr(settings, 'PROFILE_SAMPLE_INTERVAL', 0.005)
+        self.profiler = cProfile.Profile()
+        self.sampler = StackSampler(threading.get_ident(), self.interval)
+
+    def start(self):
+        self.sampler.start()
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+        self.sampler.stop()
+
+    def artifacts(self):
+        """{format: bytes} for every entry of PROFILE_FORMATS."""
+        self.profiler.create_stats()
+        raw = marshal.dumps(self.profiler.stats)
+        summary = io.StringIO()
+        # Stats() takes the profiler's data over, so it is serialised first.
+        pstats.Stats(self.profiler, stream=summary).sort_stats('cumulative').print_stats(SUMMARY_LINES)
+        collapsed = ''.join(f'{stack} {count}\n' for stack, count in self.sampler.stacks.most_common())
+        return {
+            'pstats': raw,
+            'collapsed': collapsed.encode(),
+            'txt': summary.getvalue().encode(),
+        }
+
+
+@contextmanager
+def profile_to_directory(directory, name):
+    """Profile the block and write ``<name>-<timestamp>.<format>`` files into ``directory``.
+
+    Yields a list that is filled with the written paths on exit.
+    """
+    capture = Capture()
+    written = []
+    capture.start()
+    try:
+        yield written
+    finally:
+        capture.stop()
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        stem = f"{name}-{datetime.now():%Y%m%d-%H%M%S}"
+        for fmt, content in capture.artifacts().items():
+            path = directory / f'{stem}.{fmt}'
+            path.write_bytes(content)
+            written.append(path)
+
+
+# ----------------------------------------------------------------------
+# Stored request profiles (see RequestProfileMiddleware)
+# ----------------------------------------------------------------------
+def storage():
+    """Storage for request profiles: outside MEDIA_ROOT, so only the staff views serve them."""
+    return FileSystemStorage(location=getattr(settings, 'PROFILE_STORAGE_DIR', settings.BASE_DIR / 'var' / 'profiles'))
+
+
+def profile_path(profile_id, fmt):
+    return f'{profile_id}.{fmt}'
+
+
+def stored_ids():
+    """Ids of the stored profiles, oldest first (ids start with a timestamp)."""
+    try:
+        _, files = storage().listdir('')
+    except FileNotFoundError:
+        return []
+    return sorted({name.rsplit('.', 1)[0] for name in files})
+
+
+def store(capture):
+    """Save the artifacts of ``capture`` and return the new profile id."""
+    profile_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+    target = storage()
+    for fmt, content in capture.artifacts().items():
+        target.save(profile_path(profile_id, fmt), ContentFile(content))
+    prune()
+    return profile_id
+
+
+def prune(keep=None):
+    """Keep only the newest ``PROFILE_KEEP`` stored profiles."""
+    if keep is None:
+        keep = getattr(settings, 'PROFILE_KEEP', 50)
+    ids = stored_ids()
+    target = storage()
+    for profile_id in ids[:max(len(ids) - keep, 0)]:
+        for fmt in PROFILE_FORMATS:
+            path = profile_path(profile_id, fmt)
+            if target.exists(path):
+                target.delete(path)
+
+
+class ProfiledCommand:
+    """Management command mixin adding ``--profile [DIR]``.
+
+    The whole command runs under cProfile; the artifacts land in DIR
+    (default ``PROFILE_DIR``) as ``<command>-<timestamp>.pstats/.collapsed/.txt``.
+    """
+
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        parser.add_argument(
+            '--profile', nargs='?', const=str(getattr(settings, 'PROFILE_DIR', 'profiles')), metavar='DIR',
+            help="Run under cProfile and write pstats, collapsed stacks and a text summary to DIR",
+        )
+        return parser
+
+    def execute(self, *args, **options):
+        directory = options.get('profile')
+        if not directory:
+            return super().execute(*args, **options)
+        name = self.__module__.rsplit('.', 1)[-1]
+        with profile_to_directory(directory, name) as written:
+            result = super().execute(*args, **options)
+        for path in written:
+            self.stderr.write(f"Profile written to {path}")
+        return result
@@ -0,0 +1,32 @@
+"""Process-pool entry points for bulk report generation.
+
+Kept free of model imports at module level so that workers started with the
+``spawn``/``forkserver`` methods can configure Django before touching the ORM.
+"""
+import os
+import time
+
+# SQLite allows one writer at a time; a worker that loses the race retries.
+LOCK_RETRIES = 3
+
+
+def init(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def render(project_id, report_type):
+    """Build (or reuse from the report cache) one report; returns (file_path, project name)."""
+    from django.db import OperationalError
+    from .models import Project
+    from .reports import get_report
+
+    project = Project.objects.get(pk=project_id)
+    for attempt in range(LOCK_RETRIES):
+        try:
+            return get_report(project, report_type).file_path, project.name
+        except OperationalError as e:
+            if 'locked' not in str(e) or attempt == LOCK_RETRIES - 1:
+                raise
+            time.sleep(0.5 * (attempt + 1))
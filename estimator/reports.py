@@ -0,0 +1,290 @@
+"""Cache of generated project reports.
+
+A report is keyed by a SHA-256 of the versions it is rendered from: the
+project row's and its ProjectSummary's ``updated_at``. Every item, actual or
+inflation change marks the summary stale and its rebuild moves
+``updated_at``, so a download costs two single-row reads instead of a pass
+over the items. Files live under
+``MEDIA_ROOT/<REPORT_CACHE_DIR>/<project>/<hash>.<ext>`` and are recorded in
+``Report`` (one row per project, format and hash); an unchanged project is
+served the stored file without touching ReportLab or pandas. Entries are
+evicted by age and by total size (least recently used first) by
+``manage.py generate_reports``, not on the request path.
+
+Report packs (``ReportBatch``) render many projects in a process pool and
+bundle the files into one ZIP archive. The admin only queues them;
+``manage.py generate_reports --pending`` (run periodically) builds them.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Sum, F
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from . import lazy
+from . import report_worker
+from .models import Project, ProjectSummary, Report, ReportBatch
+
+# Bump when the rendered layout changes so old files are not served.
+REPORT_VERSION = 1
+
+REPORT_FORMATS = {
+    'pdf': ('application/pdf', 'pdf'),
+    'excel': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+
+def cache_dir():
+    return getattr(settings, 'REPORT_CACHE_DIR', 'reports')
+
+
+def content_hash(project, report_type):
+    """Hash of the project and summary versions a report of ``report_type`` is rendered from."""
+    summary = ProjectSummary.for_project(project)
+    key = (REPORT_VERSION, report_type, project.pk, project.updated_at, summary.updated_at)
+    return hashlib.sha256(repr(key).encode()).hexdigest()
+
+
+def render_excel(project, out):
+    items = project.estimate_items.all()
+    data = [{'Section': i.section, 'Description': i.description, 'Qty': i.quantity, 'Unit': i.unit,
+             'Rate (RM)': i.rate, 'Amount (RM)': i.amount, 'CIDB Rate': i.cidb_rate or '',
+             'CIDB Amount': i.cidb_amount or '', 'Variance': (i.amount - (i.cidb_amount or 0)) if i.cidb_amount else ''} for i in items]
+    df = lazy.pandas().DataFrame(data)
+    df.to_excel(out, index=False)
+
+
+def render_pdf(project, out):
+    rl = lazy.reportlab()
+    letter, landscape = rl.lib.pagesizes.letter, rl.lib.pagesizes.landscape
+    SimpleDocTemplate, Table, TableStyle = rl.platypus.SimpleDocTemplate, rl.platypus.Table, rl.platypus.TableStyle
+    Paragraph, Spacer = rl.platypus.Paragraph, rl.platypus.Spacer
+    colors = rl.lib.colors
+    getSampleStyleSheet, ParagraphStyle = rl.lib.styles.getSampleStyleSheet, rl.lib.styles.ParagraphStyle
+    inch = rl.lib.units.inch
+
+    items = project.estimate_items.all()
+    doc = SimpleDocTemplate(out, pagesize=landscape(letter))
+    elements = []
+    styles = getSampleStyleSheet()
+
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=16,
+        spaceAfter=30,
+        alignment=1,
+    )
+
+    summary = ProjectSummary.for_project(project)
+    elements.append(Paragraph(f"Project Report: {project.name}", title_style))
+    elements.append(Spacer(1, 0.2*inch))
+
+    summary_data = [
+        [Paragraph(f"<b>Estimated Cost:</b> RM {summary.estimated_cost:,.2f}", styles['Normal']),
+         Paragraph(f"<b>CIDB Benchmark:</b> RM {summary.cidb_cost:,.2f}", styles['Normal'])],
+        [Paragraph(f"<b>Variance:</b> RM {summary.variance():,.2f}", styles['Normal']),
+         Paragraph(f"<b>Upload Date:</b> {project.upload_date.strftime('%d/%m/%Y')}", styles['Normal'])]
+    ]
+
+    if summary.actual_cost:
+        summary_data.append([
+            Paragraph(f"<b>Actual Cost:</b> RM {summary.actual_cost:,.2f}", styles['Normal']),
+            Paragraph(f"<b>Profitability:</b> {summary.profitability()}%", styles['Normal'])
+        ])
+
+    summary_table = Table(summary_data, colWidths=[3.5*inch, 3.5*inch])
+    summary_table.setStyle(TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 10),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 10),
+    ]))
+    elements.append(summary_table)
+    elements.append(Spacer(1, 0.3*inch))
+
+    table_data = [['Section', 'Description', 'Qty', 'Unit', 'Rate (RM)', 'Amount (RM)',
+                  'CIDB Rate', 'CIDB Amount', 'Variance']]
+
+    for i in items:
+        section_text = i.section[:15] + '...' if len(i.section) > 15 else i.section
+        desc_text = i.description[:20] + '...' if len(i.description) > 20 else i.description
+
+        table_data.append([
+            section_text,
+            desc_text,
+            f"{i.quantity:,.3f}",
+            i.unit,
+            f"{i.rate:,.2f}",
+            f"{i.amount:,.2f}",
+            f"{i.cidb_rate:,.2f}" if i.cidb_rate else '-',
+            f"{i.cidb_amount:,.2f}" if i.cidb_amount else '-',
+            f"{(i.amount - (i.cidb_amount or 0)):,.2f}" if i.cidb_amount else '-',
+        ])
+
+    col_widths = [0.8*inch, 1.5*inch, 0.5*inch, 0.5*inch, 0.7*inch, 0.8*inch, 0.7*inch, 0.8*inch, 0.7*inch]
+    t = Table(table_data, colWidths=col_widths, repeatRows=1)
+
+    t.setStyle(TableStyle([
+        # Header
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 7),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+
+        # Data rows
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 6),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8f9fa')),
+        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+        ('ALIGN', (0, 1), (-1, -1), 'CENTER'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+
+        # Grid and text wrapping
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#dee2e6')),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('WORDWRAP', (0, 0), (-1, -1), True),
+    ]))
+
+    elements.append(t)
+    doc.build(elements)
+
+
+RENDERERS = {'pdf': render_pdf, 'excel': render_excel}
+
+
+def get_report(project, report_type, generated_by=None):
+    """Return a ``Report`` whose file matches the project's current state, building it if needed."""
+    digest = content_hash(project, report_type)
+    lookup = {'project': project, 'report_type': report_type, 'content_hash': digest}
+    report = Report.objects.filter(**lookup).first()
+    if report and default_storage.exists(report.file_path):
+        Report.objects.filter(pk=report.pk).update(last_accessed=timezone.now())
+        return report
+    if report:
+        report.delete()  # row outlived its file
+
+    extension = REPORT_FORMATS[report_type][1]
+    with tempfile.TemporaryFile() as scratch:
+        RENDERERS[report_type](project, scratch)
+        scratch.seek(0)
+        # The storage picks a free name, so a concurrent render of the same version keeps its file.
+        file_path = default_storage.save(f"{cache_dir()}/{project.pk}/{digest}.{extension}", File(scratch))
+        size = default_storage.size(file_path)
+
+    try:
+        with transaction.atomic():
+            report, created = Report.objects.get_or_create(**lookup, defaults={
+                'generated_by': generated_by, 'file_path': file_path, 'size': size,
+            })
+    except IntegrityError:
+        # Lost the race between get_or_create's read and insert.
+        report, created = Report.objects.get(**lookup), False
+    if not created:
+        delete_file(file_path)
+        return report
+
+    # Older versions of this report can no longer be hit.
+    for stale in Report.objects.filter(project=project, report_type=report_type).exclude(content_hash=digest):
+        stale.delete()
+    return report
+
+
+def open_report(report):
+    return default_storage.open(report.file_path, 'rb')
+
+
+def evict(max_age=None, max_bytes=None):
+    """Drop reports older than ``max_age`` and least recently used ones beyond ``max_bytes``."""
+    if max_age is None:
+        max_age = timedelta(days=getattr(settings, 'REPORT_CACHE_MAX_AGE_DAYS', 30))
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'REPORT_CACHE_MAX_BYTES', 500 * 1024 * 1024)
+
+    evicted = 0
+    cutoff = timezone.now() - max_age
+    for report in Report.objects.filter(generated_at__lt=cutoff):
+        report.delete()
+        evicted += 1
+    for batch in ReportBatch.objects.filter(created_at__lt=cutoff).exclude(status='running'):
+        batch.delete()
+        evicted += 1
+
+    total = Report.objects.aggregate(total=Sum('size'))['total'] or 0
+    if total > max_bytes:
+        for report in Report.objects.order_by('last_accessed').only('pk', 'file_path', 'size'):
+            if total <= max_bytes:
+                break
+            total -= report.size
+            report.delete()
+            evicted += 1
+    return evicted
+
+
+def delete_file(path):
+    if path and default_storage.exists(path):
+        default_storage.delete(path)
+
+
+def claim_pending():
+    """Yield each pending ``ReportBatch`` after marking it running, so two workers never build the same one."""
+    for pk in ReportBatch.objects.filter(status='pending').order_by('created_at').values_list('pk', flat=True):
+        if ReportBatch.objects.filter(pk=pk, status='pending').update(status='running'):
+            yield ReportBatch.objects.get(pk=pk)
+
+
+def build_batch(batch, workers=None):
+    """Render every (project, format) of ``batch`` in a process pool and ZIP the results."""
+    jobs = [(project_id, report_type) for project_id in batch.project_ids for report_type in batch.formats]
+    ReportBatch.objects.filter(pk=batch.pk).update(status='running', total=len(jobs), completed=0, error='')
+    failures = []
+    # Rebuild stale summaries up front so workers only read them.
+    ProjectSummary.refresh_stale(Project.objects.filter(pk__in=batch.project_ids))
+
+    # Workers must open their own connections rather than share the parent's sockets.
+    connections.close_all()
+    pool = ProcessPoolExecutor(
+        max_workers=workers, initializer=report_worker.init, initargs=(os.environ['DJANGO_SETTINGS_MODULE'],),
+    )
+    with tempfile.TemporaryFile() as scratch:
+        with pool, zipfile.ZipFile(scratch, 'w', zipfile.ZIP_DEFLATED) as archive:
+            futures = {
+                pool.submit(report_worker.render, project_id, report_type): (project_id, report_type)
+                for project_id, report_type in jobs
+            }
+            for future in as_completed(futures):
+                project_id, report_type = futures[future]
+                try:
+                    file_path, project_name = future.result()
+                    extension = REPORT_FORMATS[report_type][1]
+                    arcname = get_valid_filename(f"{project_name}_{project_id}_report.{extension}")
+                    with default_storage.open(file_path, 'rb') as source, archive.open(arcname, 'w') as target:
+                        shutil.copyfileobj(source, target)
+                except Exception as e:
+                    failures.append(f"Project {project_id} ({report_type}): {e}")
+                ReportBatch.objects.filter(pk=batch.pk).update(completed=F('completed') + 1)
+
+        scratch.seek(0)
+        name = f"{cache_dir()}/batches/report_pack_{batch.pk}.zip"
+        delete_file(name)
+        archive_path = default_storage.save(name, File(scratch))
+
+    evict()
+    batch.refresh_from_db()
+    batch.archive_path = archive_path
+    batch.status = 'failed' if jobs and len(failures) == len(jobs) else 'done'
+    batch.error = '\n'.join(failures)
+    batch.finished_at = timezone.now()
+    batch.save(update_fields=['archive_path', 'status', 'error', 'finished_at'])
+    return batch
@@ -0,0 +1,204 @@
+"""Full-text search over project names and BoQ item sections/descriptions.
+
+SQLite uses FTS5 external-content tables kept in sync by triggers, MySQL uses
+InnoDB FULLTEXT indexes (both created in migration 0012). Any other backend,
+a SQLite build without FTS5, or FTS tables whose sync triggers are missing
+(a table rebuild by a later migration drops them) falls back to ``icontains``
+scans.
+
+InnoDB does not index stopwords or words shorter than
+``innodb_ft_min_token_size``, so a required ``+word*`` term made of one of
+them matches nothing. Those words are left out of the MySQL query, and a
+query made only of them falls back to ``icontains``.
+"""
+import logging
+import re
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import Q, Exists, OuterRef
+from django.db.models.expressions import RawSQL
+
+from .models import ProjectItem
+
+ITEM_FTS_TABLE = 'estimator_projectitem_fts'
+PROJECT_FTS_TABLE = 'estimator_project_fts'
+SQLITE_FTS_TRIGGERS = frozenset(
+    f'{table}_fts_{event}' for table in ('estimator_projectitem', 'estimator_project') for event in ('ai', 'ad', 'au')
+)
+
+logger = logging.getLogger(__name__)
+
+# INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD
+MYSQL_STOPWORDS = frozenset(
+    'a about an are as at be by com de en for from how i in is it la of on or '
+    'that the this to was what when where who will with und www'.split()
+)
+
+
+@lru_cache(maxsize=None)
+def backend():
+    """'sqlite', 'mysql' or None when only the icontains fallback is available."""
+    if connection.vendor == 'mysql':
+        return 'mysql'
+    if connection.vendor == 'sqlite' and sqlite_fts_in_sync():
+        return 'sqlite'
+    return None
+
+
+def sqlite_fts_in_sync():
+    """True if both FTS5 tables exist along with every trigger that keeps them current."""
+    tables = connection.introspection.table_names()
+    if ITEM_FTS_TABLE not in tables or PROJECT_FTS_TABLE not in tables:
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        missing = SQLITE_FTS_TRIGGERS - {name for name, in cursor.fetchall()}
+    if missing:
+        logger.warning("Full-text search disabled, FTS sync triggers missing: %s", ', '.join(sorted(missing)))
+        return False
+    return True
+
+
+@lru_cache(maxsize=None)
+def mysql_min_token_size():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT @@innodb_ft_min_token_size")
+        row = cursor.fetchone()
+    return int(row[0]) if row else 3
+
+
+def tokens(query):
+    return re.findall(r'\w+', query)
+
+
+def fulltext_words(query):
+    """The words of ``query`` the full-text index can match."""
+    words = tokens(query)
+    if backend() == 'mysql':
+        min_size = mysql_min_token_size()
+        words = [w for w in words if len(w) >= min_size and w.lower() not in MYSQL_STOPWORDS]
+    return words
+
+
+def engine(query):
+    """Backend to run ``query`` on: backend(), or None to use the icontains fallback."""
+    return backend() if fulltext_words(query) else None
+
+
+def match_expression(query):
+    """Turn free text into an all-terms, prefix-matching query for the active backend."""
+    words = fulltext_words(query)
+    if backend() == 'mysql':
+        return ' '.join(f'+{word}*' for word in words)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def project_filter(query):
+    """Q matching projects whose name, or any item section/description, matches ``query``."""
+    if not tokens(query):
+        return Q(pk__in=[])
+    match = match_expression(query)
+    using = engine(query)
+    if using == 'sqlite':
+        item_ids = RawSQL(
+            f"SELECT i.project_id FROM {ITEM_FTS_TABLE} f "
+            f"JOIN estimator_projectitem i ON i.id = f.rowid WHERE {ITEM_FTS_TABLE} MATCH %s",
+            [match],
+        )
+        name_ids = RawSQL(f"SELECT rowid FROM {PROJECT_FTS_TABLE} WHERE {PROJECT_FTS_TABLE} MATCH %s", [match])
+        return Q(pk__in=name_ids) | Q(pk__in=item_ids)
+    if using == 'mysql':
+        item_ids = RawSQL(
+            "SELECT project_id FROM estimator_projectitem "
+            "WHERE MATCH(section, description) AGAINST (%s IN BOOLEAN MODE)",
+            [match],
+        )
+        name_ids = RawSQL("SELECT id FROM estimator_project WHERE MATCH(name) AGAINST (%s IN BOOLEAN MODE)", [match])
+        return Q(pk__in=name_ids) | Q(pk__in=item_ids)
+    item_match = ProjectItem.objects.filter(project=OuterRef('pk'), description__icontains=query)
+    return Q(name__icontains=query) | Exists(item_match)
+
+
+def _visible(projects):
+    sql, params = projects.order_by().values('pk').query.sql_with_params()
+    return sql, list(params)
+
+
+def search_projects(query, projects, limit=20):
+    """Best-ranked projects by name among ``projects``: list of dicts with id, name, score."""
+    if not tokens(query):
+        return []
+    visible_sql, visible_params = _visible(projects)
+    match = match_expression(query)
+    using = engine(query)
+    if using == 'sqlite':
+        sql = (
+            f"SELECT p.id, p.name, bm25({PROJECT_FTS_TABLE}) AS score FROM {PROJECT_FTS_TABLE} "
+            f"JOIN estimator_project p ON p.id = {PROJECT_FTS_TABLE}.rowid "
+            f"WHERE {PROJECT_FTS_TABLE} MATCH %s AND p.id IN ({visible_sql}) ORDER BY score LIMIT %s"
+        )
+        params = [match, *visible_params, limit]
+    elif using == 'mysql':
+        sql = (
+            "SELECT p.id, p.name, MATCH(p.name) AGAINST (%s IN BOOLEAN MODE) AS score FROM estimator_project p "
+            f"WHERE MATCH(p.name) AGAINST (%s IN BOOLEAN MODE) AND p.id IN ({visible_sql}) "
+            "ORDER BY score DESC LIMIT %s"
+        )
+        params = [match, match, *visible_params, limit]
+    else:
+        rows = projects.filter(name__icontains=query).order_by('name').values_list('id', 'name')[:limit]
+        return [{'id': pk, 'name': name, 'score': None} for pk, name in rows]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [{'id': pk, 'name': name, 'score': score} for pk, name, score in cursor.fetchall()]
+
+
+def search_items(query, projects, limit=50):
+    """Best-ranked BoQ items among ``projects``: list of dicts with item, project and score."""
+    if not tokens(query):
+        return []
+    visible_sql, visible_params = _visible(projects)
+    match = match_expression(query)
+    using = engine(query)
+    columns = "i.id, i.project_id, p.name, i.section, i.description"
+    if using == 'sqlite':
+        sql = (
+            f"SELECT {columns}, bm25({ITEM_FTS_TABLE}) AS score FROM {ITEM_FTS_TABLE} "
+            f"JOIN estimator_projectitem i ON i.id = {ITEM_FTS_TABLE}.rowid "
+            "JOIN estimator_project p ON p.id = i.project_id "
+            f"WHERE {ITEM_FTS_TABLE} MATCH %s AND i.project_id IN ({visible_sql}) ORDER BY score LIMIT %s"
+        )
+        params = [match, *visible_params, limit]
+    elif using == 'mysql':
+        sql = (
+            f"SELECT {columns}, MATCH(i.section, i.description) AGAINST (%s IN BOOLEAN MODE) AS score "
+            "FROM estimator_projectitem i JOIN estimator_project p ON p.id = i.project_id "
+            f"WHERE MATCH(i.section, i.description) AGAINST (%s IN BOOLEAN MODE) AND i.project_id IN ({visible_sql}) "
+            "ORDER BY score DESC LIMIT %s"
+        )
+        params = [match, match, *visible_params, limit]
+    else:
+        rows = (
+            ProjectItem.objects.filter(project__in=projects)
+            .filter(Q(description__icontains=query) | Q(section__icontains=query))
+            .values_list('id', 'project_id', 'project__name', 'section', 'description')[:limit]
+        )
+        return [_item_hit(row + (None,)) for row in rows]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [_item_hit(row) for row in cursor.fetchall()]
+
+
+def _item_hit(row):
+    item_id, project_id, project_name, section, description, score = row
+    return {
+        'id': item_id,
+        'project_id': project_id,
+        'project_name': project_name,
+        'section': section,
+        'description': description,
+        'score': score,
+    }
@@ -1,7 +1,12 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .models import (
+    UserProfile, Project, ProjectItem, ActualItem, InflationRate, ProjectSummary, MonthlyCostRollup, Report, ReportBatch,
+    Forecast, MaterialPrice, LabourRate,
+)
+from . import avatars, dashboard_cache, exports, invalidation, reports
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -11,10 +16,72 @@ def create_user_profile(sender, instance, created, **kwargs):
         UserProfile.objects.get_or_create(user=instance, defaults={'role': default_role})
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+def save_user_profile(sender, instance, update_fields=None, **kwargs):
     """Ensure UserProfile is saved when User is saved"""
+    # A login only updates last_login; the profile has nothing to do with it.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
     try:
         instance.userprofile.save()
     except UserProfile.DoesNotExist:
         default_role = 'admin' if instance.is_staff else 'contractor'
-        UserProfile.objects.create(user=instance, role=default_role)
\ No newline at end of file
+        UserProfile.objects.create(user=instance, role=default_role)
+
+@receiver(post_save, sender=UserProfile)
+def schedule_avatar_thumbnails(sender, instance, **kwargs):
+    """Render thumbnails for a newly uploaded avatar once the save has committed"""
+    if getattr(instance, 'avatar_changed', False):
+        instance.avatar_changed = False
+        transaction.on_commit(lambda: avatars.schedule(instance.pk))
+
+@receiver([post_save, post_delete], sender=ProjectItem)
+@receiver([post_save, post_delete], sender=InflationRate)
+def invalidate_summary_for_project(sender, instance, **kwargs):
+    """Mark the cached ProjectSummary stale when items or inflation change, once per project and request/transaction"""
+    project_id = instance.project_id
+    invalidation.defer(('summary', project_id), lambda: ProjectSummary.invalidate(project_id))
+
+@receiver([post_save, post_delete], sender=ActualItem)
+def invalidate_summary_for_actual(sender, instance, **kwargs):
+    """Mark the cached ProjectSummary stale when an actual changes, without loading the item"""
+    item_id = instance.project_item_id
+    invalidation.defer(
+        ('summary-item', item_id),
+        lambda: ProjectSummary.objects.filter(project__estimate_items=item_id).update(stale=True),
+    )
+
+@receiver([post_save, post_delete], sender=Project)
+def refresh_monthly_rollup(sender, instance, **kwargs):
+    """Recompute the project's (month, uploader) cost rollup bucket"""
+    MonthlyCostRollup.refresh_for(instance)
+
+@receiver([post_save, post_delete], sender=Project)
+@receiver([post_save, post_delete], sender=ProjectItem)
+@receiver([post_save, post_delete], sender=ActualItem)
+@receiver([post_save, post_delete], sender=InflationRate)
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_dashboard_cache(sender, instance, **kwargs):
+    """Drop every cached dashboard when project data or a user's role changes, once per request/transaction"""
+    # ProjectSummary is left out: summaries are rebuilt while computing a dashboard, and the
+    # item/actual/inflation changes that make them stale already start a new generation.
+    dashboard_cache.invalidate_on_commit()
+
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=ProjectItem)
+@receiver(post_delete, sender=ActualItem)
+@receiver(post_delete, sender=Forecast)
+@receiver(post_delete, sender=MaterialPrice)
+@receiver(post_delete, sender=LabourRate)
+def record_export_tombstone(sender, instance, **kwargs):
+    """Let incremental dataset exports propagate the delete"""
+    exports.record_deletion(sender, instance.pk)
+
+@receiver(post_delete, sender=Report)
+def delete_report_file(sender, instance, **kwargs):
+    """Remove the cached report file along with its Report row"""
+    reports.delete_file(instance.file_path)
+
+@receiver(post_delete, sender=ReportBatch)
+def delete_report_batch_archive(sender, instance, **kwargs):
+    """Remove a report pack's ZIP archive along with its row"""
+    reports.delete_file(instance.archive_path)
@@ -0,0 +1,12 @@
+from django import template
+from django.templatetags.static import static
+
+from estimator import avatars
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar_url(profile, size=150):
+    """URL of ``profile``'s avatar thumbnail for ``size`` px, or the default avatar."""
+    return avatars.thumbnail_url(profile, size) or static('img/avatar.png')
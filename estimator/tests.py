@@ -0,0 +1,942 @@
+"""Query-count regression tests, plus behavioural tests of the optimized paths.
+
+Each view is requested against fixtures of growing size; the number of SQL
+queries must not grow with it. A view that starts issuing a query per BoQ
+line, actual or forecast (an N+1) fails here.
+
+The other test cases check that the set-based and cached code paths still
+return what the row-by-row code they replaced did.
+"""
+import csv
+import io
+import json
+import re
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import avatars, lazy, metrics, middleware, ml_forecast, profiling, reports, search
+from .models import (
+    Project, ProjectItem, ActualItem, Forecast, MaterialPrice, LabourRate, ProjectSummary, Report, ReportBatch,
+    UserProfile, MonthlyCostRollup, InflationRate, ExportTombstone,
+)
+from .views import apply_inflation_rate, revert_inflation_rate, import_actuals, latest_prices, history_counts
+
+SIZES = (10, 100, 1000)
+MEDIA_ROOT = tempfile.mkdtemp(prefix='estimator-tests-')
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'estimator-tests'}}
+
+
+def make_user(username, role='qs', **extra):
+    user = User.objects.create_user(username, password='pw', **extra)
+    user.userprofile.role = role
+    user.userprofile.save()
+    return user
+
+
+def make_project(owner, size, name=None):
+    """A project with ``size`` BoQ lines, actuals on every other line and forecasts on every fourth."""
+    project = Project.objects.create(
+        name=name or f'Project {owner.username} {size}', uploaded_by=owner.userprofile, file='projects/test.xlsx',
+    )
+    items = ProjectItem.objects.bulk_create(
+        ProjectItem(
+            project=project,
+            section='Labour' if n % 5 == 0 else 'Concrete',
+            description=f'Labour {n // 5}' if n % 5 == 0 and n < 50 else f'Item {n}',
+            quantity=Decimal(2), unit='m3', rate=Decimal(12), original_rate=Decimal(12), amount=Decimal(24),
+            cidb_rate=Decimal(11), cidb_amount=Decimal(22),
+        )
+        for n in range(size)
+    )
+    ActualItem.objects.bulk_create(
+        ActualItem(project_item=item, quantity_actual=Decimal(2), rate_actual=Decimal(13), amount_actual=Decimal(26))
+        for item in items[::2]
+    )
+    Forecast.objects.bulk_create(
+        Forecast(
+            project=project, project_item=item, material_description=f'{kind.upper()}: {item.description}',
+            source_kind=kind, source_description=item.description, model_type=model_type,
+            quarter='Q4', year=2025, forecasted_price=Decimal(14),
+        )
+        for item in items[::4]
+        for kind in ['labour' if item.section == 'Labour' else 'material']
+        for model_type in ('linear', 'random_forest')
+    )
+    # bulk_create skips the signals; build the summary now so views see the steady state
+    # instead of paying for the one-off lazy rebuild.
+    ProjectSummary.rebuild(project)
+    return project
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=TEST_CACHES, ALLOWED_HOSTS=['testserver'])
+class QueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for year in (2024, 2025):
+            for quarter in ('Q1', 'Q2', 'Q3'):
+                MaterialPrice.objects.bulk_create(
+                    MaterialPrice(quarter=quarter, year=year, section='Concrete', sn=n, description=f'Item {n}',
+                                  rate=Decimal(10 + n % 7), unit='m3')
+                    for n in range(200)
+                )
+                LabourRate.objects.bulk_create(
+                    LabourRate(quarter=quarter, year=year, section='Labour', sn=n, description=f'Labour {n}',
+                               rate=Decimal(50 + n), unit='day')
+                    for n in range(10)
+                )
+        # One owner per size, so list views (dashboard, export_all) only see that owner's project.
+        cls.fixtures = {}
+        for size in SIZES:
+            owner = make_user(f'qs{size}')
+            cls.fixtures[size] = (owner, make_project(owner, size))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.logged_in = None
+
+    def capture(self, user, method, url, data=None):
+        """Run one request as ``user`` and return the SQL it issued."""
+        if self.logged_in != user:
+            # Logging in saves last_login, which fires model signals; keep it out of the measurement.
+            self.client.force_login(user)
+            self.logged_in = user
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, data or {})
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, f'{method.upper()} {url} returned {response.status_code}')
+        return [query['sql'] for query in ctx.captured_queries]
+
+    def count_queries(self, user, method, url, data=None):
+        return len(self.capture(user, method, url, data))
+
+    def assertConstantQueries(self, request_for, batched_inserts=False, user=None):
+        """``request_for(owner, project, size)`` -> (method, url, data); the count must match across SIZES.
+
+        Requests run as each fixture's owner unless ``user`` is given.
+
+        With ``batched_inserts`` the multi-row INSERTs of a bulk write are counted
+        separately: the backend splits them by its parameter limit, so they may
+        grow with size, but must stay far below one statement per row.
+        """
+        counts = {}
+        for size in SIZES:
+            owner, project = self.fixtures[size]
+            cache.clear()
+            queries = self.capture(user or owner, *request_for(owner, project, size))
+            if batched_inserts:
+                inserts = [sql for sql in queries if sql.lstrip().upper().startswith('INSERT')]
+                self.assertLessEqual(len(inserts), max(size // 100, 1), f'{len(inserts)} INSERTs for {size} items')
+                queries = [sql for sql in queries if sql not in inserts]
+            counts[size] = len(queries)
+        self.assertEqual(
+            len(set(counts.values())), 1,
+            f'Query count grows with fixture size (items -> queries): {counts}',
+        )
+        return counts
+
+    def test_project_detail(self):
+        self.assertConstantQueries(lambda owner, project, size: (
+            'get', reverse('project_detail', args=[project.pk]), None,
+        ))
+
+    def test_project_breakdown_api(self):
+        self.assertConstantQueries(lambda owner, project, size: (
+            'get', reverse('project_breakdown_api', args=[project.pk]), None,
+        ))
+
+    def test_project_breakdown_api_after_edit(self):
+        """The first page after an edit rebuilds the summary, and must still fit the view's budget."""
+        owner, project = self.fixtures[SIZES[-1]]
+        url = reverse('project_breakdown_api', args=[project.pk])
+        self.count_queries(owner, 'get', url)
+        ProjectItem.objects.filter(project=project).update(rate=F('rate') + 1)
+        ProjectSummary.invalidate(project.pk)
+        self.assertLessEqual(
+            self.count_queries(owner, 'get', url), settings.PERF_BUDGETS['project_breakdown_api']['queries'],
+        )
+
+    def test_view_forecast(self):
+        self.assertConstantQueries(lambda owner, project, size: (
+            'get', reverse('view_forecast', args=[project.pk]), None,
+        ))
+
+    def test_edit_actuals(self):
+        self.assertConstantQueries(lambda owner, project, size: (
+            'get', reverse('edit_actuals', args=[project.pk]), None,
+        ))
+
+    def test_edit_actuals_save(self):
+        def request_for(owner, project, size):
+            data = {}
+            for pk in project.estimate_items.values_list('pk', flat=True):
+                data[f'item_{pk}_qty'] = '3'
+                data[f'item_{pk}_rate'] = '15'
+            return 'post', reverse('edit_actuals', args=[project.pk]), data
+
+        self.assertConstantQueries(request_for, batched_inserts=True)
+
+    def test_dashboard(self):
+        self.assertConstantQueries(lambda owner, project, size: ('get', reverse('dashboard'), None))
+
+    def test_dashboard_project_count(self):
+        owner = make_user('growing')
+        for n in range(2):
+            make_project(owner, 10, name=f'Growing {n}')
+        cache.clear()
+        few = self.count_queries(owner, 'get', reverse('dashboard'))
+        for n in range(2, 12):
+            make_project(owner, 10, name=f'Growing {n}')
+        cache.clear()
+        self.assertEqual(self.count_queries(owner, 'get', reverse('dashboard')), few)
+
+    def test_dashboard_admin(self):
+        admin = make_user('admin', role='admin', is_staff=True)
+        cache.clear()
+        few = self.count_queries(admin, 'get', reverse('dashboard'))
+        make_project(make_user('extra'), 1000)
+        cache.clear()
+        self.assertEqual(self.count_queries(admin, 'get', reverse('dashboard')), few)
+
+    def test_dashboard_cached(self):
+        owner, project = self.fixtures[SIZES[-1]]
+        self.count_queries(owner, 'get', reverse('dashboard'))
+        # Session + user; the page itself comes from the cache.
+        self.assertLessEqual(self.count_queries(owner, 'get', reverse('dashboard')), 2)
+
+    def test_export_all(self):
+        self.assertConstantQueries(lambda owner, project, size: ('get', reverse('export_all'), None))
+
+    def test_export_forecast(self):
+        self.assertConstantQueries(lambda owner, project, size: ('get', reverse('export_forecast'), None))
+
+    def test_export_report_pdf(self):
+        self.assertConstantQueries(lambda owner, project, size: (
+            'get', reverse('export_single', args=[project.pk, 'pdf']), None,
+        ))
+
+    def test_export_report_excel(self):
+        self.assertConstantQueries(lambda owner, project, size: (
+            'get', reverse('export_single', args=[project.pk, 'excel']), None,
+        ))
+
+    def test_export_dataset_csv(self):
+        for dataset in ('items', 'actuals', 'forecasts'):
+            with self.subTest(dataset=dataset):
+                self.assertConstantQueries(lambda owner, project, size: (
+                    'get', reverse('export_dataset', args=[dataset, 'csv']), None,
+                ))
+
+    def test_admin_changelists(self):
+        superuser = make_user('superuser', role='admin', is_staff=True, is_superuser=True)
+        for model in (ProjectItem, Forecast):
+            url = reverse(f'admin:estimator_{model._meta.model_name}_changelist')
+            with self.subTest(model=model.__name__):
+                self.assertConstantQueries(lambda owner, project, size: (
+                    'get', url, {'project__id__exact': project.pk},
+                ), user=superuser)
+
+
+def make_items(project, *rows):
+    """ProjectItems from (section, description, quantity, rate) tuples.
+
+    bulk_create skips the signals: a deferred invalidation left pending in the
+    test's transaction would swallow the ones the test itself triggers.
+    """
+    return ProjectItem.objects.bulk_create(
+        ProjectItem(
+            project=project, section=section, description=description, quantity=Decimal(quantity), unit='m3',
+            rate=Decimal(rate), amount=(Decimal(quantity) * Decimal(rate)).quantize(Decimal('0.01')),
+        )
+        for section, description, quantity, rate in rows
+    )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=TEST_CACHES, ALLOWED_HOSTS=['testserver'])
+class ProjectDataTests(TestCase):
+    """Inflation, the breakdown API and the actual-cost writers."""
+
+    def setUp(self):
+        cache.clear()
+        self.owner = make_user('owner')
+        self.project = Project.objects.create(name='Tower', uploaded_by=self.owner.userprofile, file='projects/t.xlsx')
+        self.client.force_login(self.owner)
+
+    def test_inflation_apply_and_revert_restore_original_rate(self):
+        item, = make_items(self.project, ('Concrete', 'Grade 30', '3', '10.01'))
+        apply_inflation_rate(self.project, Decimal('3.3'))
+        item.refresh_from_db()
+        self.assertEqual((item.original_rate, item.rate, item.amount),
+                         (Decimal('10.01'), Decimal('10.34'), Decimal('31.02')))
+
+        # A second rate applies to the original, not on top of the first.
+        apply_inflation_rate(self.project, Decimal('5'))
+        item.refresh_from_db()
+        self.assertEqual((item.rate, item.amount), (Decimal('10.51'), Decimal('31.53')))
+
+        revert_inflation_rate(self.project)
+        item.refresh_from_db()
+        self.assertEqual((item.original_rate, item.rate, item.amount),
+                         (Decimal('10.01'), Decimal('10.01'), Decimal('30.03')))
+        self.assertEqual(ProjectSummary.for_project(self.project).estimated_cost, Decimal('30.03'))
+
+    def test_inflation_leaves_the_rebuilt_summary_fresh(self):
+        item, = make_items(self.project, ('Concrete', 'Grade 30', '3', '10'))
+        for change in (lambda: apply_inflation_rate(self.project, Decimal('10')),
+                       lambda: revert_inflation_rate(self.project)):
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            summary = ProjectSummary.objects.get(project=self.project)
+            self.assertFalse(summary.stale)
+            self.assertEqual(summary.estimated_cost, ProjectItem.objects.get(pk=item.pk).amount)
+
+        # Other writes to the project still mark it stale.
+        with self.captureOnCommitCallbacks(execute=True):
+            InflationRate.objects.create(project=self.project, rate=Decimal('1'))
+        self.assertTrue(ProjectSummary.objects.get(project=self.project).stale)
+
+    def test_breakdown_cursor_pages_cover_every_row_once(self):
+        # Mostly ties on est_cost, so the cursor has to break them on id.
+        rows = [('Concrete', f'Item {n}', '2', '5') for n in range(7)]
+        rows += [('Labour', f'Labour {n}', '1', str(3 + n)) for n in range(4)]
+        expected = sorted(item.pk for item in make_items(self.project, *rows))
+        url = reverse('project_breakdown_api', args=[self.project.pk])
+        for sort in ('section', 'amount', '-amount', 'variance', '-variance'):
+            with self.subTest(sort=sort):
+                seen, cursor = [], None
+                while True:
+                    params = {'sort': sort, 'limit': 3, **({'cursor': cursor} if cursor else {})}
+                    data = self.client.get(url, params).json()
+                    seen += [row['id'] for row in data['results']]
+                    cursor = data['next_cursor']
+                    if not cursor:
+                        break
+                self.assertEqual(len(seen), len(expected))
+                self.assertEqual(sorted(seen), expected)
+
+    def test_inflation_rates_must_fit_the_rate_columns(self):
+        make_items(self.project, ('Concrete', 'Grade 30', '3', '10'))
+        url = reverse('project_detail', args=[self.project.pk])
+        for rate in ('NaN', 'Infinity', '12345', '1000', '2.505', 'ten', ''):
+            with self.subTest(rate=rate):
+                response = self.client.post(url, {'add_scenario': '1', 'scenario_name': 'Bad', 'scenario_rate': rate},
+                                            follow=True)
+                self.assertContains(response, "Scenario needs a name and a valid inflation rate.")
+                response = self.client.post(url, {'apply_inflation': '1', 'inflation_rate': rate}, follow=True)
+                self.assertContains(response, "Invalid inflation rate.")
+        self.assertFalse(self.project.inflation_scenarios.exists())
+        self.assertFalse(InflationRate.objects.filter(project=self.project).exists())
+
+        self.client.post(url, {'add_scenario': '1', 'scenario_name': 'High', 'scenario_rate': '-999.99'})
+        scenario = self.project.inflation_scenarios.get()
+        self.assertEqual(scenario.rate, Decimal('-999.99'))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_out_of_range_rates_are_dropped_by_migration(self):
+        from importlib import import_module
+        from django.apps import apps
+
+        migration = import_module('estimator.migrations.0022_drop_out_of_range_inflation_rates')
+        for name, rate in (('Fine', '12.50'), ('Huge', '12345'), ('Broken', 'NaN')):
+            # Raw SQL, as the ORM now refuses to write (or read back) these.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'INSERT INTO estimator_inflationscenario (project_id, name, rate, created_at) VALUES (%s, %s, %s, %s)',
+                    [self.project.pk, name, rate, timezone.now()],
+                )
+        migration.drop_out_of_range_rates(apps, None)
+        self.assertEqual(list(self.project.inflation_scenarios.values_list('name', 'rate')), [('Fine', Decimal('12.50'))])
+        self.assertEqual(self.client.get(reverse('project_detail', args=[self.project.pk])).status_code, 200)
+
+    def test_upload_actuals_button_is_for_pm_and_developer_only(self):
+        url = reverse('project_detail', args=[self.project.pk])
+        upload_url = reverse('upload_actual_cost', args=[self.project.pk])
+        # A role that is a substring of 'pm,developer' must not pass as one of them.
+        for role, shown in (('pm', True), ('developer', True), ('qs', False), ('', False), ('dev', False)):
+            with self.subTest(role=role):
+                UserProfile.objects.filter(user=self.owner).update(role=role)
+                response = self.client.get(url)
+                self.assertIs(response.context['can_upload_actuals'], shown)
+                self.assertEqual(upload_url in response.content.decode(), shown)
+
+    def test_edit_actuals_writes_only_changed_rows(self):
+        items = make_items(self.project, *[('Concrete', f'Item {n}', '2', '12') for n in range(5)])
+        for item in items:
+            ActualItem.objects.create(project_item=item, quantity_actual=Decimal(2), rate_actual=Decimal(13))
+        long_ago = timezone.now() - timedelta(days=1)
+        ActualItem.objects.update(updated_at=long_ago)
+
+        data = {}
+        for item in items:
+            data[f'item_{item.pk}_qty'] = '2'
+            data[f'item_{item.pk}_rate'] = '13'
+        data[f'item_{items[0].pk}_rate'] = '15'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('edit_actuals', args=[self.project.pk]), data)
+
+        changed = ActualItem.objects.filter(updated_at__gt=long_ago)
+        self.assertEqual(list(changed.values_list('project_item_id', 'amount_actual')),
+                         [(items[0].pk, Decimal('30.00'))])
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.actual_cost, Decimal('134.00'))
+
+    def test_import_actuals_report(self):
+        first, second, _ = make_items(
+            self.project, ('Concrete', 'Grade 30', '2', '10'), ('Formwork', 'Slab soffit', '4', '5'),
+            ('Steel', 'Rebar', '1', '3'),
+        )
+        df = lazy.pandas().DataFrame([
+            {'Section': ' concrete', 'Description': 'GRADE  30', 'Quantity': 3, 'Rate (RM)': 11},
+            {'Section': 'Formwork', 'Description': 'Slab soffit', 'Quantity': None, 'Amount (RM)': 30},
+            {'Section': 'Concrete', 'Description': 'Grade 30', 'Quantity': 3, 'Rate (RM)': 12},
+            {'Section': 'Roofing', 'Description': 'Tiles', 'Quantity': 1, 'Rate (RM)': 1},
+            {'Section': 'Steel', 'Description': 'Rebar', 'Quantity': 'lots', 'Rate (RM)': 1},
+        ])
+        report = import_actuals(self.project, df)
+
+        self.assertEqual((report['rows'], report['matched'], report['duplicates']), (5, 2, 1))
+        self.assertEqual(report['unmatched'], [{'row': 5, 'section': 'Roofing', 'description': 'Tiles'}])
+        self.assertEqual([row['row'] for row in report['invalid']], [6])
+        # The last of the duplicate rows wins.
+        self.assertEqual(ActualItem.objects.get(project_item=first).amount_actual, Decimal('36.00'))
+        self.assertEqual(ActualItem.objects.get(project_item=second).rate_actual, Decimal('7.50'))
+        self.assertEqual(report['actual_cost'], Decimal('66.00'))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=TEST_CACHES, ALLOWED_HOSTS=['testserver'])
+class ForecastSourceTests(TestCase):
+    """Which price series forecasts train on and are compared with."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for year, quarter, rate in ((2024, 'Q4', 10), (2025, 'Q1', 11), (2025, 'Q2', 12)):
+            MaterialPrice.objects.create(quarter=quarter, year=year, section='Concrete', sn=1,
+                                         description='Cement', rate=Decimal(rate), unit='bag')
+        for n, (year, quarter) in enumerate(((2024, 'Q2'), (2024, 'Q3'), (2024, 'Q4'), (2025, 'Q1'), (2025, 'Q2'))):
+            MaterialPrice.objects.create(quarter=quarter, year=year, section='Concrete', sn=2,
+                                         description='Cement mortar', rate=Decimal(20 + n), unit='m3')
+
+    def test_training_series_prefers_the_item_description(self):
+        history = MaterialPrice.objects.filter(description__icontains='cement').order_by('year', 'quarter')
+        description, rows = ml_forecast.training_series(history, 'CEMENT')
+        self.assertEqual(description, 'Cement')
+        self.assertEqual([row['rate'] for row in rows], [Decimal(10), Decimal(11), Decimal(12)])
+
+        # Without an exact match the longest series wins, never a mix of both.
+        description, rows = ml_forecast.training_series(history, 'Cem')
+        self.assertEqual(description, 'Cement mortar')
+        self.assertEqual(len(rows), 5)
+
+    def test_latest_prices_and_history_counts(self):
+        prices = latest_prices([('material', 'Cement'), ('material', 'Cement mortar'), ('labour', 'Cement')])
+        self.assertEqual(prices[('material', 'Cement')]['rate'], Decimal(12))
+        self.assertEqual((prices[('material', 'Cement')]['year'], prices[('material', 'Cement')]['quarter']),
+                         (2025, 'Q2'))
+        self.assertEqual(prices[('material', 'Cement mortar')]['rate'], Decimal(24))
+        self.assertNotIn(('labour', 'Cement'), prices)
+
+        self.assertEqual(history_counts(MaterialPrice, ['Cement', 'Cement mortar', 'Sand']),
+                         {'cement': 3, 'cement mortar': 5})
+
+    def test_price_lookups_ignore_case_like_run_forecast(self):
+        # A newer quarter spelled differently is still the same series, on any collation.
+        MaterialPrice.objects.create(quarter='Q3', year=2025, section='Concrete', sn=1,
+                                     description='CEMENT', rate=Decimal(13), unit='bag')
+        prices = latest_prices([('material', 'cement'), ('material', 'Cement')])
+        self.assertEqual({pair: row['rate'] for pair, row in prices.items()},
+                         {('material', 'cement'): Decimal(13), ('material', 'Cement'): Decimal(13)})
+        self.assertEqual(prices[('material', 'Cement')]['quarter'], 'Q3')
+        self.assertEqual(history_counts(MaterialPrice, ['cement', 'CEMENT MORTAR']), {'cement': 4, 'cement mortar': 5})
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=TEST_CACHES, ALLOWED_HOSTS=['testserver'], EXPORT_WATERMARK_LAG=0)
+class ExportTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('exporter')
+        self.client.force_login(self.owner)
+
+    def test_export_all_workbook(self):
+        from openpyxl import load_workbook
+
+        for name, count in (('Alpha', 3), ('Beta', 2)):
+            project = Project.objects.create(name=name, uploaded_by=self.owner.userprofile, file='projects/x.xlsx')
+            make_items(project, *[('Concrete', f'{name} {n}', '1', '2') for n in range(count)])
+        response = self.client.get(reverse('export_all'))
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        self.assertEqual(workbook.sheetnames, ['Alpha', 'Beta'])
+        # Header plus one row per item.
+        self.assertEqual([len(list(workbook[name].rows)) for name in workbook.sheetnames], [4, 3])
+
+    def export(self, since=None):
+        response = self.client.get(reverse('export_dataset', args=['items', 'csv']), {'since': since} if since else {})
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        return [row['description'] for row in rows], response['X-Export-Watermark']
+
+    def test_export_dataset_since(self):
+        project = Project.objects.create(name='Sync', uploaded_by=self.owner.userprofile, file='projects/x.xlsx')
+        old, changed = make_items(project, ('Concrete', 'Old', '1', '2'), ('Concrete', 'Changed', '1', '2'))
+        ProjectItem.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+
+        descriptions, watermark = self.export()
+        self.assertEqual(descriptions, ['Old', 'Changed'])
+        self.assertEqual(self.export(watermark)[0], [])
+
+        # A row edited after the watermark is exported again, on its own.
+        changed.rate = Decimal(3)
+        changed.save()
+        self.assertEqual(self.export(watermark)[0], ['Changed'])
+        self.assertEqual(self.client.get(
+            reverse('export_dataset', args=['items', 'csv']), {'since': 'yesterday'}).status_code, 400)
+
+    def test_deletes_reach_the_incremental_feed(self):
+        project = Project.objects.create(name='Gone', uploaded_by=self.owner.userprofile, file='projects/x.xlsx')
+        kept, dropped = make_items(project, ('Concrete', 'Kept', '1', '2'), ('Concrete', 'Dropped', '1', '2'))
+        forecasts = Forecast.objects.bulk_create(
+            Forecast(project=project, material_description='Kept', model_type='linear', quarter='Q1', year=2025,
+                     forecasted_price=Decimal(2))
+            for _ in range(2)
+        )
+        deleted = [('items', dropped.pk)] + [('forecasts', forecast.pk) for forecast in forecasts]
+        _, watermark = self.export()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            dropped.delete()
+            # A savepoint that rolls back takes its tombstones with it.
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                kept.delete()
+                raise RuntimeError
+            # Queryset deletes, like run_forecast's, are recorded in the same batch.
+            Forecast.objects.filter(project=project).delete()
+        self.assertEqual(ExportTombstone.objects.count(), 3)
+
+        response = self.client.get(reverse('export_dataset', args=['deletions', 'csv']), {'since': watermark})
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(sorted((row['dataset'], int(row['object_id'])) for row in rows), sorted(deleted))
+        self.assertEqual(self.export(watermark)[0], [])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=TEST_CACHES, ALLOWED_HOSTS=['testserver'])
+class ReportCacheTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('reporter')
+        self.project = Project.objects.create(name='Cached', uploaded_by=self.owner.userprofile, file='projects/c.xlsx')
+        self.item, = make_items(self.project, ('Concrete', 'Grade 30', '2', '10'))
+        self.renders = 0
+
+        def render(project, out):
+            self.renders += 1
+            out.write(b'%PDF-fake')
+
+        patcher = mock.patch.dict(reports.RENDERERS, {'pdf': render})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_hit_invalidation_and_eviction(self):
+        first = reports.get_report(self.project, 'pdf')
+        self.assertEqual(reports.get_report(self.project, 'pdf').pk, first.pk)
+        self.assertEqual(self.renders, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.rate = Decimal(11)
+            self.item.save()
+        second = reports.get_report(self.project, 'pdf')
+        self.assertEqual(self.renders, 2)
+        self.assertNotEqual(second.content_hash, first.content_hash)
+        # The superseded version and its file are gone.
+        self.assertEqual(list(Report.objects.values_list('pk', flat=True)), [second.pk])
+        self.assertFalse(default_storage.exists(first.file_path))
+
+        self.assertEqual(reports.evict(max_bytes=0), 1)
+        self.assertFalse(Report.objects.exists())
+        self.assertFalse(default_storage.exists(second.file_path))
+
+    def test_admin_queues_report_pack(self):
+        admin = make_user('packer', role='admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        with mock.patch('subprocess.Popen') as popen:
+            self.client.post(reverse('admin:estimator_project_changelist'), {
+                'action': 'generate_report_pack', '_selected_action': [self.project.pk],
+            })
+        popen.assert_not_called()
+        batch = ReportBatch.objects.get()
+        self.assertEqual((batch.status, batch.project_ids), ('pending', [self.project.pk]))
+
+        # Each pending batch is handed to exactly one runner.
+        self.assertEqual([claimed.pk for claimed in reports.claim_pending()], [batch.pk])
+        self.assertEqual(list(reports.claim_pending()), [])
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'running')
+
+
+def png(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (400, 400), color).save(buffer, format='PNG')
+    return SimpleUploadedFile('avatar.png', buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=TEST_CACHES, ALLOWED_HOSTS=['testserver'])
+class AvatarTests(TestCase):
+    def setUp(self):
+        # Render in the test thread instead of the background executor.
+        self.schedule = mock.patch.object(
+            avatars, 'schedule', side_effect=lambda pk: avatars.generate(UserProfile.objects.get(pk=pk)),
+        ).start()
+        self.render = mock.patch.object(avatars, 'render', wraps=avatars.render).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def upload(self, user, color):
+        profile = user.userprofile
+        profile.avatar = png(color)
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        profile.refresh_from_db()
+        return profile
+
+    def test_thumbnails_only_rendered_for_new_avatars(self):
+        user = make_user('pictured')
+        profile = self.upload(user, 'red')
+        self.assertEqual(self.render.call_count, len(avatars.thumbnail_sizes()))
+        self.assertTrue(profile.avatar_hash)
+        self.assertTrue(default_storage.exists(avatars.thumbnail_path(profile.avatar_hash, 80)))
+
+        self.render.reset_mock()
+        self.schedule.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True), mock.patch.object(Image, 'open', wraps=Image.open) as decode:
+            with CaptureQueriesContext(connection) as login:
+                self.client.force_login(user)
+            # A login only stamps last_login; the profile is not saved at all.
+            self.assertFalse([q for q in login.captured_queries if 'estimator_userprofile' in q['sql']])
+            profile.company = 'ACME'
+            profile.save()
+            user.first_name = 'Pat'
+            user.save()
+        decode.assert_not_called()
+        self.schedule.assert_not_called()
+        self.render.assert_not_called()
+        profile.refresh_from_db()
+        self.assertTrue(profile.avatar_hash)
+
+        # The same image uploaded by someone else reuses the existing thumbnails.
+        other = self.upload(make_user('lookalike'), 'red')
+        self.render.assert_not_called()
+        self.assertEqual(other.avatar_hash, profile.avatar_hash)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=TEST_CACHES, ALLOWED_HOSTS=['testserver'])
+class RequestProfileTests(TestCase):
+    def test_profiles_stored_outside_media_and_served_to_staff_only(self):
+        profile_dir = tempfile.mkdtemp(prefix='estimator-profiles-')
+        self.addCleanup(shutil.rmtree, profile_dir, ignore_errors=True)
+        staff = make_user('staff', role='admin', is_staff=True)
+        with self.settings(PROFILE_STORAGE_DIR=profile_dir):
+            self.client.force_login(staff)
+            response = self.client.get(reverse('dashboard'), {'_profile': '1'})
+            profile_id = response['X-Profile-Id']
+            self.assertTrue((Path(profile_dir) / profiling.profile_path(profile_id, 'txt')).exists())
+            self.assertFalse(any(Path(MEDIA_ROOT).rglob(f'{profile_id}.*')))
+            self.assertEqual(self.client.get(response['X-Profile-Url']).status_code, 200)
+
+            self.client.force_login(make_user('visitor'))
+            self.assertNotEqual(self.client.get(response['X-Profile-Url']).status_code, 200)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=TEST_CACHES, ALLOWED_HOSTS=['testserver'])
+class FullTextSearchTests(TestCase):
+    """The SQLite FTS5 tables, kept in sync with projects and items by triggers."""
+
+    def setUp(self):
+        # InnoDB FULLTEXT indexes do not see uncommitted rows, so only SQLite can run these inside a TestCase.
+        if connection.vendor != 'sqlite' or search.ITEM_FTS_TABLE not in connection.introspection.table_names():
+            self.skipTest('SQLite FTS5 not available')
+        self.owner = make_user('searcher')
+
+    def make_project(self, name, *descriptions):
+        project = Project.objects.create(name=name, uploaded_by=self.owner.userprofile, file='projects/s.xlsx')
+        items = [
+            ProjectItem.objects.create(project=project, section='Concrete', description=description, quantity=1,
+                                       unit='m3', rate=1, amount=1)
+            for description in descriptions
+        ]
+        return project, items
+
+    def test_rows_created_after_migrating_are_indexed(self):
+        # Table rebuilds in later migrations (0019) used to drop the sync triggers.
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'estimator_%_fts_a_'")
+            self.assertEqual(len(cursor.fetchall()), 6)
+        project, (item,) = self.make_project('Riverside Hospital', 'Concrete slab grade 30')
+        projects = Project.objects.all()
+        self.assertEqual([hit['id'] for hit in search.search_projects('hospital', projects)], [project.pk])
+        self.assertEqual([hit['id'] for hit in search.search_items('concrete', projects)], [item.pk])
+        self.assertEqual(list(Project.objects.filter(search.project_filter('slab'))), [project])
+
+    def hits(self, query):
+        projects = Project.objects.all()
+        return (
+            [hit['name'] for hit in search.search_projects(query, projects)],
+            [hit['description'] for hit in search.search_items(query, projects)],
+        )
+
+    def test_updates_and_deletes_are_indexed(self):
+        project, (slab, beam) = self.make_project('Riverside Hospital', 'Concrete slab', 'Steel beam')
+        self.assertEqual(search.backend(), 'sqlite')
+
+        project.name = 'Harbour Clinic'
+        project.save()
+        slab.description = 'Precast plank'
+        slab.save()
+        self.assertEqual(self.hits('hospital'), ([], []))
+        self.assertEqual(self.hits('clinic'), (['Harbour Clinic'], []))
+        self.assertEqual(self.hits('slab'), ([], []))
+        self.assertEqual(self.hits('precast'), ([], ['Precast plank']))
+
+        beam.delete()
+        self.assertEqual(self.hits('steel'), ([], []))
+        project.delete()
+        self.assertEqual(self.hits('harbour precast'), ([], []))
+
+    def test_dashboard_search(self):
+        hospital, _ = self.make_project('Riverside Hospital', 'Concrete slab')
+        school, _ = self.make_project('Hillside School', 'Timber roof trusses')
+        self.client.force_login(self.owner)
+        for query, expected in (('hospital', [hospital]), ('truss', [school]), ('slab', [hospital]), ('gym', [])):
+            with self.subTest(query=query):
+                response = self.client.get(reverse('dashboard'), {'q': query})
+                self.assertEqual([p.pk for p in response.context['projects']], [p.pk for p in expected])
+
+    def test_missing_triggers_fall_back_to_icontains(self):
+        self.addCleanup(search.backend.cache_clear)
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER estimator_project_fts_ai")
+        search.backend.cache_clear()
+        with mock.patch.object(search.logger, 'warning') as warning:
+            self.assertIsNone(search.backend())
+        warning.assert_called_once()
+        project, (item,) = self.make_project('Riverside Hospital', 'Concrete slab')
+        self.assertEqual(self.hits('hospital'), (['Riverside Hospital'], []))
+        self.assertEqual(list(Project.objects.filter(search.project_filter('slab'))), [project])
+
+    def test_mysql_query_skips_unindexed_words(self):
+        with mock.patch.object(search, 'backend', return_value='mysql'), \
+                mock.patch.object(search, 'mysql_min_token_size', return_value=3):
+            self.assertEqual(search.match_expression('the RC slab of a tower'), '+slab* +tower*')
+            self.assertEqual(search.engine('the slab'), 'mysql')
+            # Nothing indexable left: use the icontains fallback rather than match nothing.
+            self.assertIsNone(search.engine('of a'))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=TEST_CACHES, ALLOWED_HOSTS=['testserver'])
+class CostTrendTests(TestCase):
+    """MonthlyCostRollup buckets and the trend chart endpoint built on them."""
+
+    def make_project(self, owner, uploaded, rate):
+        # upload_date is auto_now_add, so "upload" the project at the given time.
+        with mock.patch('django.utils.timezone.now', return_value=uploaded):
+            project = Project.objects.create(name=f'{owner.username} {uploaded:%Y-%m}',
+                                             uploaded_by=owner.userprofile, file='projects/r.xlsx')
+        make_items(project, ('Concrete', 'Grade 30', '2', rate))
+        ProjectSummary.rebuild(project)  # syncs the project's costs into its bucket
+        return project
+
+    def trends(self, user, **params):
+        self.client.force_login(user)
+        data = self.client.get(reverse('cost_trends_api'), params).json()
+        return data['labels'], data['projects'], data['datasets'][0]['data']
+
+    def test_rollups_and_trends(self):
+        qs, other, admin = make_user('trend-qs'), make_user('trend-other'), make_user('trend-admin', role='admin')
+        january = timezone.make_aware(datetime(2025, 1, 15))
+        march = timezone.make_aware(datetime(2025, 3, 3))
+        self.make_project(qs, january, '50')
+        late = self.make_project(qs, march, '10')
+        self.make_project(other, january, '25')
+
+        self.assertEqual(
+            list(MonthlyCostRollup.objects.filter(uploaded_by=qs.userprofile).values_list(
+                'month', 'project_count', 'estimated_cost')),
+            [(january.date().replace(day=1), 1, Decimal('100.00')), (march.date().replace(day=1), 1, Decimal('20.00'))],
+        )
+        # Empty months are filled in; QS users only see their own projects.
+        self.assertEqual(self.trends(qs), (['2025-01', '2025-02', '2025-03'], [1, 0, 1], [100.0, 0.0, 20.0]))
+        self.assertEqual(self.trends(admin), (['2025-01', '2025-02', '2025-03'], [2, 0, 1], [150.0, 0.0, 20.0]))
+        self.assertEqual(self.trends(admin, months=1), (['2025-03'], [1], [20.0]))
+
+        late.delete()
+        self.assertFalse(MonthlyCostRollup.objects.filter(month=march.date().replace(day=1)).exists())
+        self.assertEqual(self.trends(qs), (['2025-01'], [1], [100.0]))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=TEST_CACHES, ALLOWED_HOSTS=['testserver'])
+class RequestBudgetTests(TestCase):
+    def setUp(self):
+        self.user = make_user('budgeted')
+        self.logger = mock.patch.object(middleware, 'logger').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def get_dashboard(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('dashboard'))
+        return response, len(ctx.captured_queries)
+
+    def test_server_timing_counts_the_request_queries(self):
+        response, queries = self.get_dashboard()
+        timing = re.fullmatch(r'db;dur=[\d.]+;desc="(\d+) queries", total;dur=[\d.]+', response['Server-Timing'])
+        self.assertIsNotNone(timing, response['Server-Timing'])
+        self.assertEqual(int(timing.group(1)), queries)
+        self.logger.warning.assert_not_called()
+
+    @override_settings(PERF_BUDGETS={'default': {'queries': 100}, 'dashboard': {'queries': 1}})
+    def test_over_budget_requests_are_logged(self):
+        response, queries = self.get_dashboard()
+        self.logger.warning.assert_called_once()
+        record = json.loads(self.logger.warning.call_args.args[0])
+        self.assertEqual(
+            {key: record[key] for key in ('event', 'url_name', 'method', 'status', 'over', 'queries')},
+            {'event': 'perf_budget_exceeded', 'url_name': 'dashboard', 'method': 'GET', 'status': 200,
+             'over': ['queries'], 'queries': queries},
+        )
+
+
+class MetricsRegistryTests(TestCase):
+    def setUp(self):
+        # Metrics register themselves globally; keep the test ones out of /metrics/.
+        self.registry = metrics.Registry()
+        mock.patch.object(metrics, 'registry', self.registry).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_counter_and_histogram_text_format(self):
+        counter = metrics.Counter('test_rows_total', 'Rows.', ['kind'])
+        counter.labels(kind='a "quoted"\nvalue').inc(2)
+        counter.labels(kind='plain').inc()
+        histogram = metrics.Histogram('test_seconds', 'Time.', buckets=(1, 0.1, 0.5))
+        histogram.observe(0.3)
+        histogram.observe(5)
+        with mock.patch('time.perf_counter', side_effect=[10.0, 10.05]):
+            with histogram.time():
+                pass
+
+        self.assertEqual(self.registry.render().splitlines(), [
+            '# HELP test_rows_total Rows.',
+            '# TYPE test_rows_total counter',
+            'test_rows_total{kind="a \\"quoted\\"\\nvalue"} 2',
+            'test_rows_total{kind="plain"} 1',
+            '# HELP test_seconds Time.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{le="0.1"} 1',
+            'test_seconds_bucket{le="0.5"} 2',
+            'test_seconds_bucket{le="1"} 2',
+            'test_seconds_bucket{le="+Inf"} 3',
+            f'test_seconds_sum {0.3 + 5 + (10.05 - 10.0)}',
+            'test_seconds_count 3',
+        ])
+        with self.assertRaises(ValueError):
+            counter.inc()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=TEST_CACHES, ALLOWED_HOSTS=['testserver'])
+class MetricsViewTests(TestCase):
+    def test_staff_only_exposition(self):
+        self.client.force_login(make_user('metrics-staff', role='admin', is_staff=True))
+        before = metrics.EXPORT_BYTES.labels(format='csv').value
+        self.client.get(reverse('export_dataset', args=['items', 'csv'])).getvalue()
+        self.assertGreater(metrics.EXPORT_BYTES.labels(format='csv').value, before)
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn('# TYPE estimator_export_bytes_total counter', body)
+        self.assertIn(f'estimator_export_bytes_total{{format="csv"}} {metrics.EXPORT_BYTES.labels(format="csv").value}',
+                      body)
+
+        self.client.force_login(make_user('metrics-visitor'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=TEST_CACHES, ALLOWED_HOSTS=['testserver'], EXPORT_WATERMARK_LAG=0)
+class AsyncViewTests(TestCase):
+    """The async views, driven through the ASGI handler."""
+
+    def setUp(self):
+        self.owner = make_user('async-owner')
+        self.project = Project.objects.create(name='Async', uploaded_by=self.owner.userprofile, file='projects/x.xlsx')
+        make_items(self.project, ('Concrete', 'Cement', '2', '10'), ('Steel', 'Rebar', '1', '5'))
+        Forecast.objects.bulk_create([
+            Forecast(project=self.project, material_description='Cement', model_type=model_type,
+                     quarter=quarter, year=2025, forecasted_price=Decimal('11'))
+            for model_type in ('linear', 'random_forest') for quarter in ('Q1', 'Q2')
+        ])
+
+    async def test_forecast_status(self):
+        await self.async_client.aforce_login(self.owner)
+        response = await self.async_client.get(reverse('forecast_status', args=[self.project.pk]))
+        self.assertEqual(response.json(), {
+            'project': self.project.pk,
+            'total': 4,
+            'models': {'linear': 2, 'random_forest': 2},
+            'quarter': 'Q2 2025',
+            'results': reverse('view_forecast', args=[self.project.pk]),
+        })
+        missing = await self.async_client.get(reverse('forecast_status', args=[self.project.pk + 100]))
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_export_dataset_streams_from_aiterator(self):
+        await self.async_client.aforce_login(self.owner)
+        response = await self.async_client.get(reverse('export_dataset', args=['items', 'csv']))
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([(row['description'], row['amount']) for row in rows], [('Cement', '20.00'), ('Rebar', '5.00')])
+        self.assertTrue(response['X-Export-Watermark'])
+
+    async def test_report_batch_status_is_owner_or_staff_only(self):
+        batch = await ReportBatch.objects.acreate(
+            created_by=self.owner.userprofile, project_ids=[self.project.pk], formats=['pdf'], total=2, completed=1,
+        )
+        url = reverse('report_batch_status', args=[batch.pk])
+        await self.async_client.aforce_login(self.owner)
+        data = (await self.async_client.get(url)).json()
+        self.assertEqual((data['status'], data['progress'], data['download']), ('pending', 50, None))
+
+        await self.async_client.aforce_login(await sync_to_async(make_user)('async-other'))
+        self.assertEqual((await self.async_client.get(url)).status_code, 404)
+
+        await ReportBatch.objects.filter(pk=batch.pk).aupdate(status='done', completed=2)
+        await self.async_client.aforce_login(await sync_to_async(make_user)('async-staff', role='admin', is_staff=True))
+        data = (await self.async_client.get(url)).json()
+        self.assertEqual((data['progress'], data['download']), (100, reverse('report_batch_download', args=[batch.pk])))
+
+    async def test_report_batch_download_streams_asynchronously(self):
+        archive = await sync_to_async(default_storage.save)('reports/async-pack.zip', io.BytesIO(b'PK' * 5000))
+        self.addCleanup(default_storage.delete, archive)
+        batch = await ReportBatch.objects.acreate(
+            created_by=self.owner.userprofile, status='done', archive_path=archive,
+        )
+        await self.async_client.aforce_login(self.owner)
+        response = await self.async_client.get(reverse('report_batch_download', args=[batch.pk]))
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Length'], '10000')
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), b'PK' * 5000)
@@ -4,6 +4,11 @@ from . import views
 
 urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),  
+    path('search/', views.search_api, name='search_api'),
+    path('trends/', views.cost_trends_api, name='cost_trends_api'),
+    path('metrics/', views.metrics_view, name='metrics'),
+    path('profiles/', views.profile_list, name='profile_list'),
+    path('profiles/<slug:profile_id>/<str:fmt>/', views.profile_download, name='profile_download'),
     path('import-cidb/', views.import_cidb, name='import_cidb'),
     path('data-status/', views.data_status, name='data_status'),
     path('force-import/', views.force_import_data, name='force_import_data'),
@@ -11,16 +16,21 @@ urlpatterns = [
     path('upload/', views.upload_project, name='upload_project'),  # NEW: dedicated upload page
     path('upload-actual/<int:pk>/', views.upload_actual_cost, name='upload_actual_cost'),
     path('project/<int:pk>/', views.project_detail, name='project_detail'),
+    path('project/<int:pk>/breakdown/', views.project_breakdown_api, name='project_breakdown_api'),
     path('project/<int:pk>/edit/', views.project_edit, name='project_edit'),
     path('project/<int:pk>/actuals/', views.edit_actuals, name='edit_actuals'),
     path('project/<int:pk>/adjust-inflation/', views.adjust_inflation, name='adjust_inflation'),
     path('project/<int:pk>/forecast/', views.run_forecast_view, name='run_forecast_view'),
     path('project/<int:pk>/view-forecast/', views.view_forecast, name='view_forecast'),
+    path('project/<int:pk>/forecast/status/', views.forecast_status, name='forecast_status'),
     path('debug-export/', views.debug_export_forecast, name='debug_export'),
     path('project/<int:pk>/generate-report/', views.generate_report, name='generate_report'),
     path('export-report/<int:project_id>/<str:format>/', views.export_report, name='export_single'),
+    path('report-batch/<int:pk>/', views.report_batch_status, name='report_batch_status'),
+    path('report-batch/<int:pk>/download/', views.report_batch_download, name='report_batch_download'),
     path('export-forecast/', views.export_forecast, name='export_forecast'),
     path('export-all/', views.export_all, name='export_all'),
+    path('export/<str:dataset>/<str:fmt>/', views.export_dataset, name='export_dataset'),
     path('login/', views.login_user, name='login'),
     path('register/', views.register_user, name='register'),
     path('logout/', views.logout_user, name='logout'),
@@ -1,15 +1,24 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib import messages
 from django.core.management import call_command
 from django.db import transaction
-from django.db.models import Sum, F, Q
+from django.db.models import Sum, F, Q, Count, Value, DecimalField, Window
+from django.db.models.functions import Coalesce, Lower, Round, RowNumber
 from django.contrib.humanize.templatetags.humanize import intcomma
-from estimator.models import Project, Forecast, InflationRate, ProjectItem, ActualItem, UserProfile
+from estimator.models import (
+    Project, Forecast, InflationRate, InflationScenario, ProjectItem, ActualItem, UserProfile, ProjectSummary,
+    MonthlyCostRollup, ReportBatch
+)
 from django.contrib.auth.models import User
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, FileResponse, Http404
+from django.urls import reverse
+from asgiref.sync import sync_to_async
+from django.core.files.storage import default_storage
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.forms import PasswordResetForm
 from django.contrib.auth.tokens import default_token_generator
 from django.template.loader import render_to_string
@@ -19,20 +28,30 @@ from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
 from decimal import Decimal
 from django.forms import modelform_factory
-import pandas as pd
 import decimal
 import os
 import json
-import re
-from io import BytesIO
-from django.core.paginator import Paginator
+import base64
+import logging
+from datetime import timedelta, timezone as dt_timezone
+from django.core.paginator import Paginator, Page
 from pathlib import Path
 
 from .models import (
     UserProfile, Project, ProjectItem, MaterialPrice, Forecast, ActualItem, LabourRate
 )
-from .forms import ProjectUploadForm, ProjectEditForm
+from .forms import ProjectUploadForm, ProjectEditForm, InflationRateForm
 from .utils import qs_required, admin_or_qs_required
+from . import search as fulltext
+from . import dashboard_cache
+from . import invalidation
+from . import exports
+from . import reports
+from . import profiling
+from . import lazy
+from .metrics import ITEMS_MATCHED, BOQ_UPLOAD_DURATION, EXPORT_BYTES, registry as metrics_registry
+
+logger = logging.getLogger(__name__)
 
 
 # ----------------------------------------------------------------------
@@ -95,135 +114,232 @@ def profile(request):
     return render(request, 'estimator/profile.html', {'profile': profile})
 
 
+def visible_projects(profile):
+    """Projects a user may see: QS/contractors see their own uploads, everyone else sees all."""
+    if profile.role in ['qs', 'contractor']:
+        return Project.objects.filter(uploaded_by=profile)
+    return Project.objects.all()
+
+
 # ------------------------------------------------------------------
 # DASHBOARD - FIXED WITH SAFE PROFILE ACCESS
 # ------------------------------------------------------------------
+DASHBOARD_TEMPLATES = {
+    'admin': 'estimator/dashboard_admin.html',
+    'pm': 'estimator/dashboard_pm.html',
+    'qs': 'estimator/dashboard_user.html',
+    'contractor': 'estimator/dashboard_user.html',
+    'developer': 'estimator/dashboard_user.html',
+}
+DASHBOARD_PAGE_SIZE = 5
+
+
 @login_required
 def dashboard(request):
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
-    if created:
-        if request.user.is_staff and not profile.role:
-            profile.role = 'admin'
-            profile.save()
-    
-    role = profile.role
-    
-    template_map = {
-        'admin': 'estimator/dashboard_admin.html',
-        'pm': 'estimator/dashboard_pm.html', 
-        'qs': 'estimator/dashboard_user.html',
-        'contractor': 'estimator/dashboard_user.html',
-        'developer': 'estimator/dashboard_user.html',
+    project_filter = request.GET.get('project', 'all')
+    search = request.GET.get('q', '').strip()
+    page_number = request.GET.get('page')
+
+    cache_key = dashboard_cache.key(request.user.pk, project_filter, search, page_number)
+    data, generation = dashboard_cache.get(cache_key)
+    if data is None:
+        data = dashboard_data(request.user, project_filter, search, page_number)
+        if data is None:
+            return redirect('dashboard')
+        dashboard_cache.store(cache_key, data, generation)
+
+    profile = data['profile']
+    request.user.userprofile = profile  # spares the navbar a profile query
+
+    # Rebuild the page around the cached rows; count is known, so no COUNT query.
+    paginator = Paginator([], DASHBOARD_PAGE_SIZE)
+    paginator.count = data['project_count']
+    page_obj = Page(data['page_projects'], data['page_number'], paginator)
+
+    context = {
+        'profile': profile,
+        'projects': page_obj,
+        'page_obj': page_obj,
+        'total_projects': data['total_projects'],
+        'est_total': data['est_total'],
+        'cidb_total': data['cidb_total'],
+        'actual_total': data['actual_total'],
+        'total_variance': data['est_total'] - data['cidb_total'],
+        'forecast_total': Decimal('0'),
+        'can_upload': profile.role in ['qs', 'contractor'],
+        'search': search,
+        'chart_data': data['chart_data'],
+        'project_filter': data['project_filter'],
     }
-    
-    print(f"DEBUG: User {request.user.username} has role: {role}")
-    print(f"DEBUG: User is staff: {request.user.is_staff}")
-    print(f"DEBUG: Template being used: {template_map.get(role, 'estimator/dashboard_user.html')}")
+    if data['selected_project'] is not None:
+        context['selected_project'] = data['selected_project']
+
+    template_name = DASHBOARD_TEMPLATES.get(profile.role, 'estimator/dashboard_user.html')
+    logger.debug(
+        "Dashboard for %s (role=%s, staff=%s) using %s",
+        request.user.username, profile.role, request.user.is_staff, template_name,
+    )
+    return render(request, template_name, context)
 
-    project_filter = request.GET.get('project', 'all')
 
-    if role in ['qs', 'contractor']:
-        all_projects = Project.objects.filter(uploaded_by=profile).order_by('-upload_date')
-    else:
-        all_projects = Project.objects.all().order_by('-upload_date')
+def dashboard_data(user, project_filter, search, page_number):
+    """Everything the dashboard needs from the database, in a cacheable dict.
 
-    display_projects = all_projects
+    Returns None when ``project_filter`` names a project the user cannot see.
+    """
+    profile, created = UserProfile.objects.get_or_create(user=user)
+    if created:
+        if user.is_staff and not profile.role:
+            profile.role = 'admin'
+            profile.save()
 
-    search = request.GET.get('q', '').strip()
+    display_projects = visible_projects(profile).order_by('-upload_date')
     if search:
-        display_projects = display_projects.filter(
-            Q(name__icontains=search) | Q(estimate_items__description__icontains=search)
-        ).distinct()
+        display_projects = display_projects.filter(fulltext.project_filter(search))
 
-    est_total = Decimal('0')
-    cidb_total = Decimal('0')
-    actual_total = Decimal('0')
-    total_variance = Decimal('0')
-    total_projects = display_projects.count()
-
-    chart_labels = ['Cost Comparison']
-    chart_est = []
-    chart_cidb = []
-    chart_actual = []
+    ProjectSummary.refresh_stale(display_projects)
 
+    selected_project = None
     if project_filter == 'all':
-        for project in display_projects:
-            est_total += project.estimated_cost or Decimal('0')
-            cidb_total += project.cidb_cost or Decimal('0')
-            actual_total += project.actual_cost or Decimal('0')
-        
-        total_variance = est_total - cidb_total
-        
-        chart_est = [float(est_total)]
-        chart_cidb = [float(cidb_total)]
-        chart_actual = [float(actual_total)]
-        
+        zero = Value(Decimal('0'), output_field=DecimalField(max_digits=15, decimal_places=2))
+        totals = display_projects.aggregate(
+            total_projects=Count('pk'),
+            est_total=Coalesce(Sum('summary__estimated_cost'), zero),
+            cidb_total=Coalesce(Sum('summary__cidb_cost'), zero),
+            actual_total=Coalesce(Sum('summary__actual_cost'), zero),
+        )
+        total_projects = totals['total_projects']
+        est_total = totals['est_total']
+        cidb_total = totals['cidb_total']
+        actual_total = totals['actual_total']
     else:
         try:
-            selected_project = display_projects.get(pk=project_filter)
-            est_total = selected_project.estimated_cost or Decimal('0')
-            cidb_total = selected_project.cidb_cost or Decimal('0')
-            actual_total = selected_project.actual_cost or Decimal('0')
-            total_variance = est_total - cidb_total
-            total_projects = 1
-
-            chart_est = [float(est_total)]
-            chart_cidb = [float(cidb_total)]
-            chart_actual = [float(actual_total)]
-            
-        except Project.DoesNotExist:
-            project_filter = 'all'
-            return redirect('dashboard')
+            selected_project = display_projects.select_related('summary').get(pk=project_filter)
+        except (Project.DoesNotExist, ValueError):
+            return None
+        est_total = selected_project.summary.estimated_cost
+        cidb_total = selected_project.summary.cidb_cost
+        actual_total = selected_project.summary.actual_cost
+        total_projects = 1
 
     chart_data = {
-        'labels': chart_labels,
+        'labels': ['Cost Comparison'],
         'datasets': [
             {
                 'label': 'Estimated Cost',
-                'data': chart_est,
+                'data': [float(est_total)],
                 'backgroundColor': '#17a2b8',  # Blue
             },
             {
-                'label': 'CIDB Cost', 
-                'data': chart_cidb,
+                'label': 'CIDB Cost',
+                'data': [float(cidb_total)],
                 'backgroundColor': '#dc3545',  # Red
             },
             {
                 'label': 'Actual Cost',
-                'data': chart_actual, 
+                'data': [float(actual_total)],
                 'backgroundColor': '#198754',  # Green
             }
         ]
     }
 
-    print(f"Chart data: {chart_data}")
-    print(f"Estimated: {chart_est}, CIDB: {chart_cidb}, Actual: {chart_actual}")
-
-    paginator = Paginator(display_projects, 5)
-    page_number = request.GET.get('page')
+    paginator = Paginator(display_projects.select_related('uploaded_by__user'), DASHBOARD_PAGE_SIZE)
+    if project_filter == 'all':
+        paginator.count = total_projects  # already counted by the aggregate above
     page_obj = paginator.get_page(page_number)
 
-    context = {
+    return {
         'profile': profile,
-        'projects': page_obj,
-        'page_obj': page_obj,
+        'project_filter': project_filter,
+        'selected_project': selected_project,
         'total_projects': total_projects,
         'est_total': est_total,
         'cidb_total': cidb_total,
         'actual_total': actual_total,
-        'total_variance': total_variance,
-        'forecast_total': Decimal('0'),
-        'can_upload': role in ['qs', 'contractor'],
-        'search': search,
         'chart_data': json.dumps(chart_data),
-        'project_filter': project_filter,
+        'project_count': paginator.count,
+        'page_number': page_obj.number,
+        'page_projects': list(page_obj.object_list),
     }
 
-    if project_filter != 'all':
-        context['selected_project'] = selected_project
+@login_required
+def search_api(request):
+    """Ranked full-text search over visible project names and BoQ items: ?q=&limit="""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 20)), 200))
+    except ValueError:
+        limit = 20
+    projects = visible_projects(request.user.userprofile)
+    return JsonResponse({
+        'query': query,
+        'backend': fulltext.engine(query) or 'icontains',
+        'projects': fulltext.search_projects(query, projects, limit=limit),
+        'items': fulltext.search_items(query, projects, limit=limit),
+    })
 
-    template_name = template_map.get(role, 'estimator/dashboard_user.html')
-    return render(request, template_name, context)
+@login_required
+def cost_trends_api(request):
+    """Monthly estimated/CIDB/actual totals from the rollup table: ?months=N for the latest N"""
+    profile = request.user.userprofile
+    scope = profile if profile.role in ['qs', 'contractor'] else None
+    rows = list(MonthlyCostRollup.series(uploaded_by=scope))
+
+    # Fill empty months so the x axis stays linear.
+    by_month = {row['month']: row for row in rows}
+    months = []
+    if rows:
+        month, last = rows[0]['month'], rows[-1]['month']
+        while month <= last:
+            months.append(month)
+            month = (month + timedelta(days=32)).replace(day=1)
+    try:
+        limit = int(request.GET.get('months', 0))
+    except ValueError:
+        limit = 0
+    if limit > 0:
+        months = months[-limit:]
+
+    def series(field):
+        return [float(by_month[m][field]) if m in by_month else 0.0 for m in months]
+
+    return JsonResponse({
+        'labels': [m.strftime('%Y-%m') for m in months],
+        'projects': [by_month[m]['projects'] if m in by_month else 0 for m in months],
+        'datasets': [
+            {'label': 'Estimated Cost', 'data': series('estimated'), 'borderColor': '#17a2b8'},
+            {'label': 'CIDB Cost', 'data': series('cidb'), 'borderColor': '#dc3545'},
+            {'label': 'Actual Cost', 'data': series('actual'), 'borderColor': '#198754'},
+        ],
+    })
+
+@staff_member_required
+def metrics_view(request):
+    """Prometheus text exposition of the in-process metrics (staff only)"""
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@staff_member_required
+def profile_list(request):
+    """Stored request profiles, newest first, with their download links (staff only)"""
+    ids = reversed(profiling.stored_ids())
+    return JsonResponse({'profiles': [
+        {'id': profile_id, **{fmt: reverse('profile_download', args=[profile_id, fmt]) for fmt in profiling.PROFILE_FORMATS}}
+        for profile_id in ids
+    ]})
+
+
+@staff_member_required
+def profile_download(request, profile_id, fmt):
+    """One artifact of a stored request profile: pstats, collapsed or txt (staff only)"""
+    path = profiling.profile_path(profile_id, fmt)
+    storage = profiling.storage()
+    if fmt not in profiling.PROFILE_FORMATS or not storage.exists(path):
+        raise Http404("No such profile")
+    return FileResponse(
+        storage.open(path), as_attachment=fmt == 'pstats',
+        filename=f'{profile_id}.{fmt}', content_type=profiling.PROFILE_FORMATS[fmt],
+    )
 
 # ----------------------------------------------------------------------
 # CIDB IMPORT
@@ -296,6 +412,21 @@ def force_import_data(request):
 # ----------------------------------------------------------------------
 # PROJECT UPLOAD - NEW DEDICATED PAGE
 # ----------------------------------------------------------------------
+def latest_cidb_rates(pairs, chunk_size=100):
+    """{(section, description.casefold()): latest MaterialPrice rate} for BoQ (section, description)
+    pairs, matched case-insensitively on the description, in one query per ``chunk_size`` pairs."""
+    pairs = list(dict.fromkeys(pairs))
+    rates = {}
+    for start in range(0, len(pairs), chunk_size):
+        condition = Q()
+        for section, description in pairs[start:start + chunk_size]:
+            condition |= Q(section=section, description__iexact=description)
+        prices = MaterialPrice.objects.filter(condition).order_by('-year', '-quarter')
+        for section, description, rate in prices.values_list('section', 'description', 'rate'):
+            rates.setdefault((section, description.casefold()), rate)
+    return rates
+
+
 @login_required
 def upload_project(request):
     if request.user.userprofile.role not in ['qs', 'contractor']:
@@ -316,42 +447,57 @@ def upload_project(request):
             
             project.save()
 
-            try:
-                df = pd.read_excel(request.FILES['file'])
-                total_est = total_cidb = Decimal('0')
+            with BOQ_UPLOAD_DURATION.time():
+                try:
+                    df = lazy.pandas().read_excel(request.FILES['file'])
+                    total_est = total_cidb = Decimal('0')
+                    cidb_matched = 0
+                    items = []
+                    rows = [
+                        (str(row['Section']).strip(), str(row['Description']).strip(), row)
+                        for _, row in df.iterrows()
+                    ]
+                    cidb_rates = latest_cidb_rates((section, desc) for section, desc, _ in rows)
                 
-                for _, row in df.iterrows():
-                    desc = str(row['Description']).strip()
-                    section = str(row['Section']).strip()
-                    qty = Decimal(str(row['Quantity']))
-                    rate = Decimal(str(row['Rate (RM)']))
-                    amount = Decimal(str(row['Amount (RM)']))
-
-                    cidb = MaterialPrice.objects.filter(section=section, description__iexact=desc).order_by('-year', '-quarter').first()
-                    cidb_rate = cidb.rate * project.inflation_multiplier if cidb else Decimal('0')
-                    cidb_amount = qty * cidb_rate
-
-                    ProjectItem.objects.create(
-                        project=project, section=section, description=desc, quantity=qty, 
-                        unit=str(row['Unit']).strip(), rate=rate, amount=amount, 
-                        cidb_rate=cidb_rate, cidb_amount=cidb_amount
-                    )
-                    total_est += amount
-                    if cidb_amount:
-                        total_cidb += cidb_amount
-
-                project.estimated_cost = total_est
-                project.cidb_cost = total_cidb
-                project.actual_cost = Decimal('0')
-                project.save()
+                    for section, desc, row in rows:
+                        qty = Decimal(str(row['Quantity']))
+                        rate = Decimal(str(row['Rate (RM)']))
+                        amount = Decimal(str(row['Amount (RM)']))
+
+                        cidb = cidb_rates.get((section, desc.casefold()))
+                        cidb_rate = cidb * project.inflation_multiplier if cidb is not None else Decimal('0')
+                        cidb_matched += cidb is not None
+                        cidb_amount = qty * cidb_rate
+
+                        items.append(ProjectItem(
+                            project=project, section=section, description=desc, quantity=qty, 
+                            unit=str(row['Unit']).strip(), rate=rate, original_rate=rate, amount=amount, 
+                            cidb_rate=cidb_rate, cidb_amount=cidb_amount
+                        ))
+                        total_est += amount
+                        if cidb_amount:
+                            total_cidb += cidb_amount
+
+                    # One multi-row INSERT instead of a save (and its signals) per line;
+                    # the summary is invalidated once below, the dashboards by project.save().
+                    with transaction.atomic():
+                        ProjectItem.objects.bulk_create(items)
+                    ProjectSummary.invalidate(project.pk)
+
+                    project.estimated_cost = total_est
+                    project.cidb_cost = total_cidb
+                    project.actual_cost = Decimal('0')
+                    project.save()
+                    ITEMS_MATCHED.labels(stage='upload', result='matched').inc(cidb_matched)
+                    ITEMS_MATCHED.labels(stage='upload', result='unmatched').inc(len(df) - cidb_matched)
                 
-                messages.success(request, f"Project '{project.name}' uploaded successfully.")
-                return redirect('project_detail', pk=project.pk)
+                    messages.success(request, f"Project '{project.name}' uploaded successfully.")
+                    return redirect('project_detail', pk=project.pk)
                 
-            except Exception as e:
-                project.delete()
-                messages.error(request, f"Error processing Excel file: {e}")
-                return redirect('upload_project')
+                except Exception as e:
+                    project.delete()
+                    messages.error(request, f"Error processing Excel file: {e}")
+                    return redirect('upload_project')
     else:
         form = ProjectUploadForm()
     
@@ -385,8 +531,80 @@ def project_edit(request, pk):
 
 
 # ----------------------------------------------------------------------
-# ACTUAL COST UPLOAD
+# ACTUAL COST UPLOAD (line level)
 # ----------------------------------------------------------------------
+def _match_key(section, description):
+    return (' '.join(str(section).split()).casefold(), ' '.join(str(description).split()).casefold())
+
+
+def _optional_decimal(row, column):
+    value = row.get(column)
+    if value is None or lazy.pandas().isna(value) or str(value).strip() == '':
+        return None
+    return Decimal(str(value))
+
+
+def import_actuals(project, df):
+    """Hash-join uploaded actual-cost rows to the project's items on (section, description)
+    and bulk-upsert one ActualItem per matched line.
+
+    Each row needs Section and Description; Quantity, Rate (RM) and Amount (RM)
+    are optional and fall back to the estimate. Returns a report dict with the
+    matched count and the unmatched / invalid rows.
+    """
+    report = {'rows': len(df), 'matched': 0, 'duplicates': 0, 'unmatched': [], 'invalid': []}
+    missing = {'Section', 'Description'} - set(df.columns)
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(sorted(missing))}")
+
+    items_by_key = {
+        _match_key(item.section, item.description): item
+        for item in ProjectItem.objects.filter(project=project).only('id', 'section', 'description', 'quantity', 'rate')
+    }
+
+    actuals = {}
+    for row_number, row in enumerate(df.to_dict('records'), start=2):  # row 1 is the header
+        section, description = row.get('Section'), row.get('Description')
+        item = items_by_key.get(_match_key(section, description))
+        if item is None:
+            report['unmatched'].append({'row': row_number, 'section': section, 'description': description})
+            continue
+        try:
+            qty = _optional_decimal(row, 'Quantity')
+            rate = _optional_decimal(row, 'Rate (RM)')
+            amount = _optional_decimal(row, 'Amount (RM)')
+        except decimal.InvalidOperation:
+            report['invalid'].append({'row': row_number, 'section': section, 'description': description})
+            continue
+
+        actual = ActualItem(project_item=item, quantity_actual=qty, rate_actual=rate)
+        if amount is None:
+            amount = actual.compute_amount(item)
+        elif rate is None:
+            # Keep the rate consistent with the posted amount so the actuals form shows it.
+            base_qty = qty if qty is not None else item.quantity
+            actual.rate_actual = (amount / base_qty).quantize(Decimal('0.01')) if base_qty else None
+        actual.amount_actual = amount.quantize(Decimal('0.01'))
+
+        if item.id in actuals:
+            report['duplicates'] += 1
+        actuals[item.id] = actual
+
+    with transaction.atomic():
+        ActualItem.bulk_upsert(list(actuals.values()))
+        total = ActualItem.objects.filter(project_item__project=project)\
+                                  .aggregate(total=Sum('amount_actual'))['total']
+        project.actual_cost = total or Decimal('0')
+        project.save()
+        ProjectSummary.invalidate(project.pk)
+
+    report['matched'] = len(actuals)
+    report['actual_cost'] = project.actual_cost
+    ITEMS_MATCHED.labels(stage='actuals', result='matched').inc(report['matched'])
+    ITEMS_MATCHED.labels(stage='actuals', result='unmatched').inc(len(report['unmatched']))
+    return report
+
+
 @login_required
 def upload_actual_cost(request, pk):
     project = get_object_or_404(Project, pk=pk)
@@ -394,17 +612,22 @@ def upload_actual_cost(request, pk):
         messages.error(request, "Only PM/Developer can upload actual cost.")
         return redirect('project_detail', pk=pk)
 
+    report = None
     if request.method == 'POST':
         file = request.FILES.get('file')
-        if file:
-            project.actual_file = file
-            df = pd.read_excel(file)
-            total = df['Amount (RM)'].sum()
-            project.actual_cost = Decimal(str(total))
-            project.save()
-            messages.success(request, f"Actual cost: RM {total:,.2f}")
-        return redirect('project_detail', pk=pk)
-    return render(request, 'estimator/upload_actual.html', {'project': project})
+        if not file:
+            messages.error(request, "Please choose an Excel file to upload.")
+            return redirect('upload_actual_cost', pk=pk)
+        try:
+            report = import_actuals(project, lazy.pandas().read_excel(file))
+        except Exception as e:
+            messages.error(request, f"Error processing Excel file: {e}")
+            return redirect('upload_actual_cost', pk=pk)
+        messages.success(
+            request,
+            f"Matched {report['matched']} of {report['rows']} line(s). Actual cost: RM {report['actual_cost']:,.2f}"
+        )
+    return render(request, 'estimator/upload_actual.html', {'project': project, 'report': report})
 
 
 # ----------------------------------------------------------------------
@@ -416,15 +639,11 @@ def edit_actuals(request, pk):
     project = get_object_or_404(Project, pk=pk)
     items = ProjectItem.objects.filter(project=project)
 
-    actuals_qs = ActualItem.objects.filter(project_item__project=project)
-    actuals_dict = {a.project_item_id: a for a in actuals_qs}
-
     if request.method == 'POST':
-        for item in items:
-            qty_key = f'item_{item.id}_qty'
-            rate_key = f'item_{item.id}_rate'
-            qty_str = request.POST.get(qty_key, '').strip()
-            rate_str = request.POST.get(rate_key, '').strip()
+        changed = []
+        for item in items.select_related('actual'):
+            qty_str = request.POST.get(f'item_{item.id}_qty', '').strip()
+            rate_str = request.POST.get(f'item_{item.id}_rate', '').strip()
 
             try:
                 qty = Decimal(qty_str) if qty_str else None
@@ -433,25 +652,30 @@ def edit_actuals(request, pk):
                 messages.error(request, f"Invalid number for item {item.description}.")
                 continue
 
-            ActualItem.objects.update_or_create(
-                project_item=item,
-                defaults={
-                    'quantity_actual': qty,
-                    'rate_actual': rate,
-                }
-            )
-
-        total = Decimal('0')
-        for actual in ActualItem.objects.filter(project_item__project=project):
-            actual.save()  
-            total += actual.amount_actual or 0
+            current = getattr(item, 'actual', None)
+            actual = ActualItem(project_item=item, quantity_actual=qty, rate_actual=rate)
+            actual.amount_actual = actual.compute_amount(item)
+            if current is not None and (
+                (current.quantity_actual, current.rate_actual, current.amount_actual)
+                == (actual.quantity_actual, actual.rate_actual, actual.amount_actual)
+            ):
+                continue
+            changed.append(actual)
 
-        project.actual_cost = total
-        project.save()
+        with transaction.atomic():
+            ActualItem.bulk_upsert(changed)
+            total = ActualItem.objects.filter(project_item__project=project)\
+                                      .aggregate(total=Sum('amount_actual'))['total']
+            project.actual_cost = total or Decimal('0')
+            project.save()
+            ProjectSummary.invalidate(project.pk)
 
-        messages.success(request, "Actual costs updated.")
+        messages.success(request, f"Actual costs updated ({len(changed)} line(s) changed).")
         return redirect('project_detail', pk=pk)
 
+    actuals_qs = ActualItem.objects.filter(project_item__project=project)
+    actuals_dict = {a.project_item_id: a for a in actuals_qs}
+
     context = {
         'project': project,
         'items': items,
@@ -460,87 +684,266 @@ def edit_actuals(request, pk):
     return render(request, 'estimator/edit_actuals.html', context)
 
 
+# ----------------------------------------------------------------------
+# INFLATION (set-based)
+# ----------------------------------------------------------------------
+def _set_item_rates(project, factor):
+    """Rewrite every item's rate/amount as original_rate * factor in one UPDATE,
+    then rebuild the project's summary (and estimated cost) from one aggregate."""
+    base_rate = Coalesce('original_rate', 'rate')
+    new_rate = Round(base_rate * factor, 2)
+    ProjectItem.objects.filter(project=project).update(
+        original_rate=base_rate,
+        rate=new_rate,
+        amount=Round(F('quantity') * new_rate, 2),
+        updated_at=timezone.now(),
+    )
+    ProjectSummary.rebuild(project)
+
+
+# _set_item_rates rebuilds the summary after these InflationRate writes; letting their signals
+# mark it stale again would only force a second rebuild (and report re-render) on the next read.
+@transaction.atomic
+def apply_inflation_rate(project, rate):
+    with invalidation.suppress(('summary', project.pk)):
+        InflationRate.objects.filter(project=project).delete()
+        InflationRate.objects.create(project=project, rate=rate, applied=True, applied_at=timezone.now())
+    _set_item_rates(project, 1 + rate / 100)
+
+
+@transaction.atomic
+def revert_inflation_rate(project):
+    with invalidation.suppress(('summary', project.pk)):
+        InflationRate.objects.filter(project=project).delete()
+    _set_item_rates(project, Decimal('1'))
+
+
+def inflation_scenarios(project, summary):
+    """Price every named scenario off the un-inflated total; no item rows are touched."""
+    scenarios = []
+    for scenario in project.inflation_scenarios.all():
+        scenario_total = (summary.original_estimated_cost * (1 + scenario.rate / 100)).quantize(Decimal('0.01'))
+        scenarios.append({
+            'scenario': scenario,
+            'total_est': scenario_total,
+            'variance': scenario_total - summary.cidb_cost,
+            'change': scenario_total - summary.estimated_cost,
+        })
+    return scenarios
+
+
+# ----------------------------------------------------------------------
+# BREAKDOWN (shared by project_detail and the JSON API)
+# ----------------------------------------------------------------------
+BREAKDOWN_PAGE_SIZE = 200
+BREAKDOWN_MAX_PAGE_SIZE = 1000
+BREAKDOWN_SORTS = {
+    'section': 'section',
+    'amount': 'est_cost',
+    'variance': 'variance',
+}
+
+
+def breakdown_queryset(project, section=None):
+    """ProjectItems annotated with the per-line costs shown in the breakdown tables."""
+    items = ProjectItem.objects.filter(project=project).with_costs().select_related('actual')
+    if section:
+        items = items.filter(section=section)
+    return items
+
+
+def breakdown_totals(summary, section=None):
+    """Breakdown totals read from the cached ProjectSummary, optionally for one section."""
+    if section:
+        row = summary.section(section) or {}
+        return {
+            'total_est': row.get('estimated', Decimal('0')),
+            'original_total_est': row.get('original_estimated', Decimal('0')),
+            'total_cidb': row.get('cidb', Decimal('0')),
+            'total_variance': row.get('variance', Decimal('0')),
+            'actual_total': row.get('actual', Decimal('0')),
+            'item_count': row.get('item_count', 0),
+        }
+    return {
+        'total_est': summary.estimated_cost,
+        'original_total_est': summary.original_estimated_cost,
+        'total_cidb': summary.cidb_cost,
+        'total_variance': summary.estimated_cost - summary.cidb_cost,
+        'actual_total': summary.actual_cost,
+        'item_count': summary.item_count,
+    }
+
+
+def breakdown_page(items, sort='section', cursor=None, limit=BREAKDOWN_PAGE_SIZE):
+    """Keyset-paginate annotated breakdown items.
+
+    ``sort`` is a key of BREAKDOWN_SORTS, optionally prefixed with ``-`` for
+    descending order. The cursor encodes the sort value and id of the last row
+    of the previous page, so later pages never re-read and discard the earlier
+    ones as OFFSET does. Only the ``section`` order can come from an index;
+    ``amount`` and ``variance`` order on the computed ``with_costs``
+    annotations, so each page still scans and sorts the project's (or
+    section's) items.
+    Returns ``(rows, next_cursor)``.
+    """
+    descending = sort.startswith('-')
+    key = BREAKDOWN_SORTS[sort.lstrip('-')]
+
+    if cursor:
+        last_value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if key != 'section':
+            last_value = Decimal(last_value)
+        op = 'lt' if descending else 'gt'
+        items = items.filter(
+            Q(**{f'{key}__{op}': last_value}) | Q(**{key: last_value, f'id__{op}': last_id})
+        )
+
+    prefix = '-' if descending else ''
+    rows = list(items.order_by(f'{prefix}{key}', f'{prefix}id')[:limit + 1])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        token = json.dumps([str(getattr(last, key)), last.id])
+        next_cursor = base64.urlsafe_b64encode(token.encode()).decode()
+    return rows, next_cursor
+
+
+def breakdown_row(item):
+    actual = getattr(item, 'actual', None)
+    return {
+        'id': item.id,
+        'section': item.section,
+        'description': item.description,
+        'quantity': item.quantity,
+        'unit': item.unit,
+        'rate': item.rate,
+        'original_rate': item.original_rate or item.rate,
+        'est_cost': item.est_cost,
+        'original_est_cost': item.original_est_cost,
+        'cidb_cost': item.cidb_cost,
+        'variance': item.variance,
+        'actual': {
+            'quantity': actual.quantity_actual,
+            'rate': actual.rate_actual,
+            'amount': actual.amount_actual,
+        } if actual else None,
+    }
+
+
+@login_required
+def project_breakdown_api(request, pk):
+    """JSON breakdown for one project: ?section=&sort=[-]section|amount|variance&cursor=&limit="""
+    project = get_object_or_404(Project, pk=pk)
+
+    sort = request.GET.get('sort', 'section')
+    if sort.lstrip('-') not in BREAKDOWN_SORTS:
+        return JsonResponse({'error': f"Unsupported sort '{sort}'."}, status=400)
+    try:
+        limit = min(int(request.GET.get('limit', BREAKDOWN_PAGE_SIZE)), BREAKDOWN_MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit.'}, status=400)
+
+    section = request.GET.get('section') or None
+    items = breakdown_queryset(project, section=section)
+    cursor = request.GET.get('cursor')
+    try:
+        rows, next_cursor = breakdown_page(items, sort=sort, cursor=cursor, limit=limit)
+    except (ValueError, TypeError, decimal.InvalidOperation):
+        return JsonResponse({'error': 'Invalid cursor.'}, status=400)
+
+    data = {
+        'project': project.pk,
+        'results': [breakdown_row(item) for item in rows],
+        'next_cursor': next_cursor,
+    }
+    # Totals and the section list only change with the filter, so send them with the first page.
+    if not cursor:
+        summary = ProjectSummary.for_project(project)
+        data['totals'] = breakdown_totals(summary, section)
+        data['sections'] = [row['section'] for row in summary.sections]
+    return JsonResponse(data)
+
+
+def clean_inflation_rate(value):
+    """``value`` as a Decimal percentage if it fits the rate columns, else None (NaN, overflow, garbage)."""
+    form = InflationRateForm({'rate': value})
+    return form.cleaned_data['rate'] if form.is_valid() else None
+
+
 # ----------------------------------------------------------------------
 # PROJECT DETAIL - UPDATED WITH INFLATION
 # ----------------------------------------------------------------------
 @login_required
 def project_detail(request, pk):
     project = get_object_or_404(Project, pk=pk)
-    items = ProjectItem.objects.filter(project=project).order_by('section')
 
     inflation = InflationRate.objects.filter(project=project, applied=True).first()
 
     if request.method == 'POST':
         if 'apply_inflation' in request.POST:
-            rate = Decimal(request.POST['inflation_rate'])
-            InflationRate.objects.filter(project=project).delete()
-            InflationRate.objects.create(project=project, rate=rate, applied=True,
-                                         applied_at=timezone.now())
-            total_est = Decimal('0')
-            for item in items:
-                if item.original_rate:  
-                    new_rate = item.original_rate * (1 + rate/100)
-                else:
-                    new_rate = item.rate * (1 + rate/100)
-                    item.original_rate = item.rate  
-                
-                item.rate = new_rate
-                item.amount = item.quantity * new_rate
-                item.save()
-                total_est += item.amount
-            
-            project.estimated_cost = total_est
-            project.save()
-            
+            rate = clean_inflation_rate(request.POST.get('inflation_rate'))
+            if rate is None:
+                messages.error(request, "Invalid inflation rate.")
+                return redirect('project_detail', pk=pk)
+            apply_inflation_rate(project, rate)
             messages.success(request, f"Inflation of {rate}% applied successfully.")
             return redirect('project_detail', pk=pk)
 
         if 'revert_inflation' in request.POST:
-            InflationRate.objects.filter(project=project).delete()
-            total_est = Decimal('0')
-            for item in items:
-                if item.original_rate:
-                    item.rate = item.original_rate
-                    item.amount = item.quantity * item.rate
-                    item.save()
-                    total_est += item.amount
-            
-            project.estimated_cost = total_est
-            project.save()
-            
+            revert_inflation_rate(project)
             messages.success(request, "Inflation reverted successfully.")
             return redirect('project_detail', pk=pk)
 
-    breakdown = []
-    total_est = total_cidb = total_variance = decimal.Decimal('0')
-    original_total_est = decimal.Decimal('0')
+        if 'add_scenario' in request.POST:
+            name = request.POST.get('scenario_name', '').strip()
+            rate = clean_inflation_rate(request.POST.get('scenario_rate'))
+            if not name or rate is None:
+                messages.error(request, "Scenario needs a name and a valid inflation rate.")
+            else:
+                InflationScenario.objects.update_or_create(project=project, name=name, defaults={'rate': rate})
+                messages.success(request, f"Scenario '{name}' ({rate}%) saved.")
+            return redirect('project_detail', pk=pk)
 
-    for itm in items:
-        est = decimal.Decimal(itm.quantity) * decimal.Decimal(itm.rate)
-        original_est = decimal.Decimal(itm.quantity) * decimal.Decimal(itm.original_rate or itm.rate)
-        cidb = decimal.Decimal(itm.quantity) * decimal.Decimal(itm.cidb_rate or 0)
-        var = est - cidb
+        if 'delete_scenario' in request.POST:
+            InflationScenario.objects.filter(project=project, pk=request.POST.get('scenario_id')).delete()
+            messages.success(request, "Scenario removed.")
+            return redirect('project_detail', pk=pk)
 
-        try:
-            actual = itm.actual
-        except ActualItem.DoesNotExist:
-            actual = None
+        if 'apply_scenario' in request.POST:
+            scenario = get_object_or_404(InflationScenario, project=project, pk=request.POST.get('scenario_id'))
+            if clean_inflation_rate(scenario.rate) is None:
+                messages.error(request, "Invalid inflation rate.")
+                return redirect('project_detail', pk=pk)
+            apply_inflation_rate(project, scenario.rate)
+            messages.success(request, f"Scenario '{scenario.name}' ({scenario.rate}%) applied to items.")
+            return redirect('project_detail', pk=pk)
 
-        breakdown.append({
+    # Only the first screen is rendered; the page fetches the rest from project_breakdown_api.
+    summary = ProjectSummary.for_project(project)
+    totals = breakdown_totals(summary)
+    total_est = totals['total_est']
+    original_total_est = totals['original_total_est']
+    total_cidb = totals['total_cidb']
+    total_variance = totals['total_variance']
+
+    rows, next_cursor = breakdown_page(breakdown_queryset(project))
+    breakdown = [
+        {
             'item': itm,
-            'est_cost': est,
-            'original_est_cost': original_est,
-            'cidb_cost': cidb,
-            'variance': var,
-            'actual': actual,
-        })
-
-        total_est += est
-        original_total_est += original_est
-        total_cidb += cidb
-        total_variance += var
+            'est_cost': itm.est_cost,
+            'original_est_cost': itm.original_est_cost,
+            'cidb_cost': itm.cidb_cost,
+            'variance': itm.variance,
+            'actual': getattr(itm, 'actual', None),
+        }
+        for itm in rows
+    ]
 
-    actual_total = project.actual_cost or decimal.Decimal('0')
+    actual_total = totals['actual_total']
 
     breakdown_chart_data = {
         'labels': ['Costs'],
@@ -569,6 +972,8 @@ def project_detail(request, pk):
     context = {
         'project': project,
         'breakdown': breakdown,
+        'breakdown_next_cursor': next_cursor,
+        'item_count': totals['item_count'],
         'total_est': total_est,
         'original_total_est': original_total_est,
         'total_cidb': total_cidb,
@@ -577,6 +982,9 @@ def project_detail(request, pk):
         'inflation_rate': inflation.rate if inflation else None,
         'inflation_applied': inflation.applied_at if inflation else None,
         'inflation_applied_at': inflation.applied_at if inflation else None,
+        'summary': summary,
+        'scenarios': inflation_scenarios(project, summary),
+        'can_upload_actuals': request.user.userprofile.role in ('pm', 'developer'),
         'breakdown_chart_data': json.dumps(breakdown_chart_data),
         'inflation_chart_data': json.dumps(inflation_chart_data),
         'actuals_chart_data': json.dumps(actuals_chart_data),
@@ -602,13 +1010,12 @@ def adjust_inflation(request, pk):
 
         ProjectItem.objects.filter(project=project).update(
             rate=F('rate') * factor,
-            amount=F('amount') * factor
+            amount=F('amount') * factor,
+            updated_at=timezone.now(),
         )
-        agg = ProjectItem.objects.filter(project=project)\
-                                 .aggregate(est=Sum('amount'), cidb=Sum('cidb_amount'))
-        project.estimated_cost = agg['est'] or decimal.Decimal('0')
-        project.cidb_cost = agg['cidb'] or decimal.Decimal('0')
-        project.save()
+        ProjectSummary.rebuild(project)
+        # update() skips the model signals.
+        dashboard_cache.invalidate_on_commit()
 
         messages.success(request, f"Inflation factor {factor} applied.")
         return redirect('project_detail', pk=pk)
@@ -633,28 +1040,79 @@ def run_forecast_view(request, pk):
 # ------------------------------------------------------------------
 # VIEW FORECAST RESULTS
 # ------------------------------------------------------------------
+def latest_prices(series):
+    """Latest CIDB price per (source_kind, source_description) pair: {pair: {'rate', 'quarter', 'year'}}.
+
+    One query per price table; a window over the descriptions keeps only each
+    one's newest row in SQL. Descriptions are matched with LOWER() on both
+    sides, like run_forecast's ``iexact`` lookups, so the result doesn't
+    depend on the database collation.
+    """
+    wanted = {}
+    for kind, description in series:
+        if kind:
+            wanted.setdefault(kind, {}).setdefault(description.lower(), set()).add(description)
+
+    latest = {}
+    for kind, model in (('material', MaterialPrice), ('labour', LabourRate)):
+        if not wanted.get(kind):
+            continue
+        rows = (
+            model.objects.annotate(description_key=Lower('description'))
+            .filter(description_key__in=wanted[kind])
+            .annotate(recency=Window(
+                RowNumber(), partition_by=[F('description_key')], order_by=[F('year').desc(), F('quarter').desc()],
+            ))
+            .filter(recency=1)
+            .values('description_key', 'rate', 'quarter', 'year')
+        )
+        for row in rows:
+            for description in wanted[kind].get(row.pop('description_key'), ()):
+                latest[(kind, description)] = row
+    return latest
+
+
+def history_counts(model, descriptions):
+    """{description.casefold(): price rows} for ``descriptions``: one grouped COUNT per table.
+
+    Matching is on the whole description, case-insensitively (LOWER() on both
+    sides, as run_forecast's ``iexact``): the series run_forecast trains on first.
+    """
+    counts = {}
+    rows = (
+        model.objects.annotate(description_key=Lower('description'))
+        .filter(description_key__in={description.lower() for description in descriptions})
+        .values('description_key').annotate(records=Count('pk')).order_by()
+    )
+    for row in rows:
+        key = row['description_key'].casefold()
+        counts[key] = counts.get(key, 0) + row['records']
+    return counts
+
+
 @login_required
 def view_forecast(request, pk):
     project = get_object_or_404(Project, pk=pk)
-    
-    linear_forecasts = Forecast.objects.filter(project=project, model_type='linear').order_by('material_description')
-    rf_forecasts = Forecast.objects.filter(project=project, model_type='random_forest').order_by('material_description')
-    
+
+    forecasts = list(
+        Forecast.objects.filter(project=project, model_type__in=['linear', 'random_forest'])
+        .order_by('material_description')
+    )
+    linear_forecasts = [f for f in forecasts if f.model_type == 'linear']
+    rf_forecasts = [f for f in forecasts if f.model_type == 'random_forest']
+
     total_quarters = MaterialPrice.objects.values('quarter', 'year').distinct().count()
-    project_items = ProjectItem.objects.filter(project=project)
-    
+    project_items = list(ProjectItem.objects.filter(project=project).only('section', 'description'))
+    descriptions = [item.description for item in project_items]
+    material_records = history_counts(MaterialPrice, descriptions)
+    labour_records = history_counts(LabourRate, descriptions)
+
     forecast_analysis = []
     for item in project_items:
-        material_historical_count = MaterialPrice.objects.filter(
-            description__icontains=item.description
-        ).count()
-        
-        labour_historical_count = LabourRate.objects.filter(
-            description__icontains=item.description
-        ).count()
-        
+        material_historical_count = material_records.get(item.description.casefold(), 0)
+        labour_historical_count = labour_records.get(item.description.casefold(), 0)
         total_historical_records = material_historical_count + labour_historical_count
-        
+
         forecast_analysis.append({
             'material': item.description,
             'section': item.section,
@@ -665,78 +1123,26 @@ def view_forecast(request, pk):
             'data_source': 'Material' if material_historical_count > labour_historical_count else 'Labour',
             'status': '✅ Ready' if total_historical_records >= 2 else '❌ Need more data'
         })
-    
-    linear_forecast_data = []
-    rf_forecast_data = []
-    
-    for forecast in linear_forecasts:
-        current_material = MaterialPrice.objects.filter(
-            description__iexact=forecast.material_description.replace('MATERIAL: ', '').replace('LABOUR: ', '')
-        ).order_by('-year', '-quarter').first()
-        
-        current_labour = LabourRate.objects.filter(
-            description__iexact=forecast.material_description.replace('MATERIAL: ', '').replace('LABOUR: ', '')
-        ).order_by('-year', '-quarter').first()
-        
-        if current_material:
-            current_rate = current_material.rate
-            current_quarter = f"{current_material.quarter} {current_material.year}"
-            data_source = 'Material'
-        elif current_labour:
-            current_rate = current_labour.rate
-            current_quarter = f"{current_labour.quarter} {current_labour.year}"
-            data_source = 'Labour'
-        else:
-            current_rate = None
-            change = None
-            current_quarter = "N/A"
-            data_source = "Unknown"
-            
-        if current_rate:
-            change = ((forecast.forecasted_price - current_rate) / current_rate) * 100
-        else:
-            change = None
-            
-        linear_forecast_data.append({
-            'material': forecast.material_description,
-            'model_type': forecast.get_model_type_display(),
-            'current_quarter': current_quarter,
-            'current_price': current_rate,
-            'forecast_quarter': f"{forecast.quarter} {forecast.year}",
-            'forecast_price': forecast.forecasted_price,
-            'change_percent': change,
-            'data_source': data_source,
-        })
-    
-    for forecast in rf_forecasts:
-        current_material = MaterialPrice.objects.filter(
-            description__iexact=forecast.material_description.replace('MATERIAL: ', '').replace('LABOUR: ', '')
-        ).order_by('-year', '-quarter').first()
-        
-        current_labour = LabourRate.objects.filter(
-            description__iexact=forecast.material_description.replace('MATERIAL: ', '').replace('LABOUR: ', '')
-        ).order_by('-year', '-quarter').first()
-        
-        if current_material:
-            current_rate = current_material.rate
-            current_quarter = f"{current_material.quarter} {current_material.year}"
-            data_source = 'Material'
-        elif current_labour:
-            current_rate = current_labour.rate
-            current_quarter = f"{current_labour.quarter} {current_labour.year}"
-            data_source = 'Labour'
+
+    prices = latest_prices((f.source_kind, f.source_description) for f in forecasts)
+
+    def forecast_row(forecast):
+        current = prices.get((forecast.source_kind, forecast.source_description))
+        if current:
+            current_rate = current['rate']
+            current_quarter = f"{current['quarter']} {current['year']}"
+            data_source = forecast.get_source_kind_display()
         else:
             current_rate = None
-            change = None
             current_quarter = "N/A"
             data_source = "Unknown"
-            
+
         if current_rate:
             change = ((forecast.forecasted_price - current_rate) / current_rate) * 100
         else:
             change = None
-            
-        rf_forecast_data.append({
+
+        return {
             'material': forecast.material_description,
             'model_type': forecast.get_model_type_display(),
             'current_quarter': current_quarter,
@@ -745,20 +1151,40 @@ def view_forecast(request, pk):
             'forecast_price': forecast.forecasted_price,
             'change_percent': change,
             'data_source': data_source,
-        })
-    
+        }
+
     context = {
         'project': project,
-        'linear_forecast_data': linear_forecast_data,
-        'rf_forecast_data': rf_forecast_data,
-        'linear_count': linear_forecasts.count(),
-        'rf_count': rf_forecasts.count(),
+        'linear_forecast_data': [forecast_row(f) for f in linear_forecasts],
+        'rf_forecast_data': [forecast_row(f) for f in rf_forecasts],
+        'linear_count': len(linear_forecasts),
+        'rf_count': len(rf_forecasts),
         'total_quarters': total_quarters,
         'forecast_analysis': forecast_analysis,
         'has_sufficient_data': total_quarters >= 2,
     }
     return render(request, 'estimator/view_forecast.html', context)
 
+
+
+@login_required
+async def forecast_status(request, pk):
+    """Forecast counts per model and the quarter forecast for; cheap enough to poll while a forecast runs"""
+    project = await aget_object_or_404(Project, pk=pk)
+    forecasts = Forecast.objects.filter(project=project)
+    models = {
+        row['model_type']: row['count']
+        async for row in forecasts.values('model_type').annotate(count=Count('pk')).order_by()
+    }
+    latest = await forecasts.order_by('-year', '-quarter').values('quarter', 'year').afirst()
+    return JsonResponse({
+        'project': project.pk,
+        'total': sum(models.values()),
+        'models': models,
+        'quarter': f"{latest['quarter']} {latest['year']}" if latest else None,
+        'results': reverse('view_forecast', args=[project.pk]),
+    })
+
 # ----------------------------------------------------------------------
 # EXPORT FORECAST TO EXCEL
 # ----------------------------------------------------------------------
@@ -768,55 +1194,25 @@ def export_forecast(request):
     
     if profile.role in ['qs', 'contractor']:
         projects = Project.objects.filter(uploaded_by=profile)
-        linear_forecasts = Forecast.objects.filter(project__in=projects, model_type='linear')
-        rf_forecasts = Forecast.objects.filter(project__in=projects, model_type='random_forest')
+        forecasts = Forecast.objects.filter(project__in=projects)
     elif profile.role in ['pm', 'developer', 'admin']:
-        linear_forecasts = Forecast.objects.filter(model_type='linear')
-        rf_forecasts = Forecast.objects.filter(model_type='random_forest')
+        forecasts = Forecast.objects.all()
     else:
         messages.error(request, "Access denied.")
         return redirect('dashboard')
 
-    if not linear_forecasts.exists() and not rf_forecasts.exists():
+    forecasts = forecasts.order_by('pk')
+    if not forecasts.filter(model_type__in=['linear', 'random_forest']).exists():
         messages.warning(request, "No forecast data available to export.")
         return redirect('dashboard')
 
-    buffer = BytesIO()
-    
-    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-        linear_data = []
-        for f in linear_forecasts:
-            linear_data.append({
-                'Project': f.project.name if f.project else 'N/A',
-                'Material/Labour': f.material_description,
-                'Model': f.get_model_type_display(),
-                'Quarter': f.quarter,
-                'Year': f.year,
-                'Forecasted Price (RM)': f.forecasted_price,
-            })
-        
-        if linear_data:
-            linear_df = pd.DataFrame(linear_data)
-            linear_df.to_excel(writer, sheet_name='Linear_Regression', index=False)
-        
-        rf_data = []
-        for f in rf_forecasts:
-            rf_data.append({
-                'Project': f.project.name if f.project else 'N/A',
-                'Material/Labour': f.material_description,
-                'Model': f.get_model_type_display(),
-                'Quarter': f.quarter,
-                'Year': f.year,
-                'Forecasted Price (RM)': f.forecasted_price,
-            })
-        
-        if rf_data:
-            rf_df = pd.DataFrame(rf_data)
-            rf_df.to_excel(writer, sheet_name='Random_Forest', index=False)
-    
-    response = HttpResponse(buffer.getvalue(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="forecast_data.xlsx"'
-    return response
+    prices = latest_prices(forecasts.values_list('source_kind', 'source_description').distinct().order_by())
+
+    def write(workbook):
+        exports.write_forecast_sheet(workbook, 'Linear_Regression', forecasts.filter(model_type='linear'), prices)
+        exports.write_forecast_sheet(workbook, 'Random_Forest', forecasts.filter(model_type='random_forest'), prices)
+
+    return exports.xlsx_response('forecast_data.xlsx', write)
 
 
 @login_required
@@ -843,42 +1239,68 @@ def export_all(request):
         messages.error(request, "Only Excel export supported for all projects.")
         return redirect('dashboard')
 
-    profile = request.user.userprofile
-    role = profile.role
-    if role in ['qs', 'contractor']:
-        projects = Project.objects.filter(uploaded_by=profile)
-    else:
-        projects = Project.objects.all()
-
-    buffer = BytesIO()
-    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-        for project in projects:
-            items = project.estimate_items.all()
-            data = [
-                {
-                    'Section': i.section,
-                    'Description': i.description,
-                    'Qty': i.quantity,
-                    'Unit': i.unit,
-                    'Rate (RM)': i.rate,
-                    'Amount (RM)': i.amount,
-                    'CIDB Rate': i.cidb_rate or '',
-                    'CIDB Amount': i.cidb_amount or '',
-                    'Variance': (i.amount - (i.cidb_amount or 0)) if i.cidb_amount else ''
-                } for i in items
-            ]
-            df = pd.DataFrame(data)
-            
-            sheet_name = re.sub(r'[\\/*?:[\]]', '', project.name)
-            sheet_name = sheet_name[:31]  
-            
-            if not sheet_name.strip():
-                sheet_name = f"Project_{project.pk}"
-                
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
+    projects = visible_projects(request.user.userprofile).order_by('pk')
+    items = ProjectItem.objects.filter(project__in=projects).order_by('project_id', 'pk')
+
+    return exports.xlsx_response(
+        'all_projects.xlsx', lambda workbook: exports.write_project_sheets(workbook, projects, items)
+    )
 
-    response = HttpResponse(buffer.getvalue(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="all_projects.xlsx"'
+@login_required
+async def export_dataset(request, dataset, fmt):
+    """Flat CSV/Parquet dump of one dataset for analytics: ?since=<timestamp> returns only rows
+    inserted or changed after it.
+
+    The response carries X-Export-Watermark, the upper bound of ``updated_at`` applied to the
+    streamed query, to pass as ``since`` next time. The bound trails the clock by
+    EXPORT_WATERMARK_LAG seconds, so rows saved by transactions still in flight are picked
+    up by the next sync rather than skipped.
+    Async so that, under ASGI, a long CSV download streams from ``aiterator()`` without holding a thread.
+    """
+    if dataset not in exports.DATASETS or fmt not in ('csv', 'parquet'):
+        return JsonResponse({'error': 'Unknown dataset or format.', 'datasets': list(exports.DATASETS)}, status=404)
+    since = None
+    if request.GET.get('since'):
+        try:
+            since = parse_datetime(request.GET['since'])
+        except ValueError:
+            pass
+        if since is None:
+            return JsonResponse({'error': 'since must be an ISO 8601 timestamp (X-Export-Watermark).'}, status=400)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since, dt_timezone.utc)
+
+    model, project_lookup, columns = exports.DATASETS[dataset]
+    watermark = timezone.now() - timedelta(seconds=getattr(settings, 'EXPORT_WATERMARK_LAG', 60))
+    rows = model.objects.filter(updated_at__lte=watermark)
+    if since is not None:
+        rows = rows.filter(updated_at__gt=since)
+    user = await request.auser()
+    profile = await UserProfile.objects.aget(user=user)
+    if project_lookup and profile.role in ['qs', 'contractor']:
+        rows = rows.filter(**{f'{project_lookup}__in': visible_projects(profile)})
+    rows = rows.order_by('updated_at', 'pk')
+
+    stamp = '%Y%m%dT%H%M%S'
+    filename = f"{dataset}_{since.strftime(stamp) if since else 'all'}_{watermark.strftime(stamp)}.{fmt}"
+    if fmt == 'csv':
+        if exports.is_asgi(request):
+            # values_list() runs its query as soon as aiterator() asks for the first chunk, outside
+            # sync_to_async, which trips the async-safety check; values() defers it properly.
+            dicts = rows.values(*columns).aiterator(chunk_size=exports.ITERATOR_CHUNK_SIZE)
+            stream = (tuple(row.values()) async for row in dicts)
+        else:
+            # Under WSGI the body is iterated by the server thread, outside the event loop.
+            stream = rows.values_list(*columns).iterator(chunk_size=exports.ITERATOR_CHUNK_SIZE)
+        response = exports.csv_response(filename, columns, stream)
+    else:
+        try:
+            response = await sync_to_async(exports.parquet_response)(
+                filename, model, columns, rows.values_list(*columns).iterator(chunk_size=exports.ITERATOR_CHUNK_SIZE),
+            )
+        except ImportError:
+            return JsonResponse({'error': 'Parquet export needs the pyarrow package.'}, status=501)
+    response['X-Export-Watermark'] = watermark.astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
     return response
 
 # ----------------------------------------------------------------------
@@ -892,115 +1314,52 @@ def generate_report(request, pk):
 @login_required
 def export_report(request, project_id, format):
     project = get_object_or_404(Project, pk=project_id)
-    items = project.estimate_items.all()
-
-    if format == 'excel':
-        data = [{'Section': i.section, 'Description': i.description, 'Qty': i.quantity, 'Unit': i.unit,
-                 'Rate (RM)': i.rate, 'Amount (RM)': i.amount, 'CIDB Rate': i.cidb_rate or '',
-                 'CIDB Amount': i.cidb_amount or '', 'Variance': (i.amount - (i.cidb_amount or 0)) if i.cidb_amount else ''} for i in items]
-        df = pd.DataFrame(data)
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = f'attachment; filename="{project.name}_report.xlsx"'
-        df.to_excel(response, index=False)
-        return response
-
-    elif format == 'pdf':
-        from reportlab.lib.pagesizes import letter, landscape
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib import colors
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import inch
-        from reportlab.pdfbase import pdfmetrics
-        from reportlab.pdfbase.ttfonts import TTFont
-
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{project.name}_report.pdf"'
-        
-        doc = SimpleDocTemplate(response, pagesize=landscape(letter))
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            spaceAfter=30,
-            alignment=1,  
+
+    if format in reports.REPORT_FORMATS:
+        report = reports.get_report(project, format, generated_by=request.user.userprofile)
+        EXPORT_BYTES.labels(format=format).inc(report.size)
+        content_type, extension = reports.REPORT_FORMATS[format]
+        return FileResponse(
+            reports.open_report(report), as_attachment=True,
+            filename=f"{project.name}_report.{extension}", content_type=content_type,
         )
-        
-        elements.append(Paragraph(f"Project Report: {project.name}", title_style))
-        elements.append(Spacer(1, 0.2*inch))
-        
-        summary_data = [
-            [Paragraph(f"<b>Estimated Cost:</b> RM {project.estimated_cost:,.2f}", styles['Normal']),
-             Paragraph(f"<b>CIDB Benchmark:</b> RM {project.cidb_cost:,.2f}", styles['Normal'])],
-            [Paragraph(f"<b>Variance:</b> RM {project.variance():,.2f}", styles['Normal']),
-             Paragraph(f"<b>Upload Date:</b> {project.upload_date.strftime('%d/%m/%Y')}", styles['Normal'])]
-        ]
-        
-        if project.actual_cost:
-            summary_data.append([
-                Paragraph(f"<b>Actual Cost:</b> RM {project.actual_cost:,.2f}", styles['Normal']),
-                Paragraph(f"<b>Profitability:</b> {project.profitability()}%", styles['Normal'])
-            ])
-        
-        summary_table = Table(summary_data, colWidths=[3.5*inch, 3.5*inch])
-        summary_table.setStyle(TableStyle([
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 10),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 10),
-        ]))
-        elements.append(summary_table)
-        elements.append(Spacer(1, 0.3*inch))
-        
-        table_data = [['Section', 'Description', 'Qty', 'Unit', 'Rate (RM)', 'Amount (RM)', 
-                      'CIDB Rate', 'CIDB Amount', 'Variance']]
-        
-        for i in items:
-            section_text = i.section[:15] + '...' if len(i.section) > 15 else i.section
-            desc_text = i.description[:20] + '...' if len(i.description) > 20 else i.description
-            
-            table_data.append([
-                section_text,
-                desc_text,
-                f"{i.quantity:,.3f}",
-                i.unit,
-                f"{i.rate:,.2f}",
-                f"{i.amount:,.2f}",
-                f"{i.cidb_rate:,.2f}" if i.cidb_rate else '-',
-                f"{i.cidb_amount:,.2f}" if i.cidb_amount else '-',
-                f"{(i.amount - (i.cidb_amount or 0)):,.2f}" if i.cidb_amount else '-',
-            ])
-        
-        col_widths = [0.8*inch, 1.5*inch, 0.5*inch, 0.5*inch, 0.7*inch, 0.8*inch, 0.7*inch, 0.8*inch, 0.7*inch]
-        t = Table(table_data, colWidths=col_widths, repeatRows=1)
-        
-        t.setStyle(TableStyle([
-            # Header
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 7),  
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-            
-            # Data rows
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 6),  
-            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8f9fa')),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-            ('ALIGN', (0, 1), (-1, -1), 'CENTER'),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-            
-            # Grid and text wrapping
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#dee2e6')),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('WORDWRAP', (0, 0), (-1, -1), True),  
-        ]))
-        
-        elements.append(t)
-        doc.build(elements)
-        return response
 
     messages.error(request, "Unsupported format")
     return redirect('dashboard')
+
+
+def visible_batch(request, pk):
+    batch = get_object_or_404(ReportBatch, pk=pk)
+    if not request.user.is_staff and batch.created_by_id != request.user.userprofile.pk:
+        raise Http404("No such report batch")
+    return batch
+
+
+@login_required
+async def report_batch_status(request, pk):
+    """Progress of a bulk report pack; ``download`` is set once the ZIP is ready"""
+    user = await request.auser()
+    batch = await aget_object_or_404(ReportBatch.objects.select_related('created_by'), pk=pk)
+    if not user.is_staff and (batch.created_by is None or batch.created_by.user_id != user.pk):
+        raise Http404("No such report batch")
+    return JsonResponse({
+        'id': batch.pk,
+        'status': batch.status,
+        'completed': batch.completed,
+        'total': batch.total,
+        'progress': batch.progress(),
+        'error': batch.error,
+        'download': reverse('report_batch_download', args=[batch.pk]) if batch.status == 'done' else None,
+    })
+
+
+@login_required
+def report_batch_download(request, pk):
+    batch = visible_batch(request, pk)
+    if batch.status != 'done' or not batch.archive_path:
+        return JsonResponse({'error': 'Report pack is not ready.', 'status': batch.status}, status=409)
+    EXPORT_BYTES.labels(format='zip').inc(default_storage.size(batch.archive_path))
+    return FileResponse(
+        default_storage.open(batch.archive_path, 'rb'), as_attachment=True,
+        filename=f"report_pack_{batch.pk}.zip", content_type='application/zip',
+    )